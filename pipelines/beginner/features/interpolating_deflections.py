@@ -17,6 +17,25 @@ import autolens as al
 # The 'pixel_scale_interpolation_grid' is an input parameter of the pipeline, meaning we can run the pipeline
 # with different interpolation grids using different runners.
 
+# Rather than tuning the interpolation pixel scale by hand for every lens, a runner can choose it from a target maximum
+# deflection angle error, using a mass profile representative of the lens and the tool
+# 'autolens_workspace/tools/interpolation/interpolator.py':
+
+# pixel_scale_interpolation_grid = interpolator.pixel_scale_interpolation_grid_from(
+#     grid=al.grid.from_mask(mask=mask),
+#     deflections_func=interpolator.deflections_func_from_mass_profile(
+#         mass_profile=mass_profile, pixel_scales=mask.pixel_scales
+#     ),
+#     max_error=0.01,
+#     centre=mass_profile.centre,
+#     inner_radius=0.1,
+# )
+
+# This is the largest pixel scale whose interpolated deflection angles are within max_error of the exact deflection
+# angles, ignoring points within inner_radius of the centre of a cuspy mass profile (whose deflection angles are
+# discontinuous there). It is None, for which no interpolation is used, if no pixel scale meets max_error with fewer
+# interpolation points than the grid.
+
 # Phase names are tagged, ensuring phases using different interpolation grids have a unique output path.
 
 # We'll perform a basic analysis which fits a lensed source galaxy using a parametric light profile where
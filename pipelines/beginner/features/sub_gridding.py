@@ -12,6 +12,12 @@ import autolens as al
 
 # Phase names are tagged, ensuring phases using different sub-sizes have a unique output path.
 
+# A uniform sub-grid oversamples every pixel in the mask, even though oversampling only changes the intensities of
+# pixels where the light profiles are steep (e.g. the centre of the lens galaxy and the source's arcs). The tool
+# 'autolens_workspace/tools/imaging/adaptive_sub_grid.py' evaluates an image at a sub-size of 1 and only refines the
+# pixels whose intensities change, which you can use to check the sub_size a lens needs before choosing the sub_size
+# passed to this pipeline.
+
 # We'll perform a basic analysis which fits a lensed source galaxy using a parametric light profile where
 # the lens's light is omitted. This pipeline uses two phases:
 
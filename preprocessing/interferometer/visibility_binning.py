@@ -0,0 +1,76 @@
+import autofit as af
+import autolens as al
+import autolens.plot as aplt
+import os
+
+from tools.interferometer import binning
+
+# This tool compresses an interferometer dataset by binning its visibilities onto a lattice of cells in the uv-plane,
+# replacing the visibilities in every cell with their inverse-variance weighted mean and propagating the noise-map.
+
+# The run-time of an interferometer fit scales with the number of visibilities, thus the early phases of a pipeline
+# (e.g. the source pipelines of 'pipelines/advanced/interferometer') can be run on the binned dataset, with only the
+# final phases fitting every visibility.
+
+# Setup the path to the autolens_workspace, using a relative directory name.
+workspace_path = "{}/../../".format(os.path.dirname(os.path.realpath(__file__)))
+
+# The 'dataset label' is the name of the dataset folder and 'dataset_name' the folder the dataset is stored in. The
+# binned dataset is output to the folder 'dataset_name' + '__binned'.
+dataset_label = "interferometer"
+dataset_name = "lens_sie__source_sersic"
+
+# Create the path where the dataset will be loaded from, which in this case is
+# '/autolens_workspace/dataset/interferometer/lens_sie__source_sersic/'
+dataset_path = af.path_util.make_and_return_path_from_path_and_folder_names(
+    path=workspace_path, folder_names=["dataset", dataset_label, dataset_name]
+)
+
+interferometer = al.interferometer.from_fits(
+    visibilities_path=dataset_path + "visibilities.fits",
+    noise_map_path=dataset_path + "noise_map.fits",
+    uv_wavelengths_path=dataset_path + "uv_wavelengths.fits",
+)
+
+# The radius (arc-seconds) of the real-space mask the binned dataset is fitted with. Emission within this radius
+# has its phase shifted by at most 'max_phase_error' radians by binning, which sets the size of the uv-cells. A larger
+# phase error gives more compression but decorrelates emission at the edge of the mask more.
+real_space_radius = 3.0
+max_phase_error = 0.1
+
+cell_size = binning.cell_size_from(
+    real_space_radius=real_space_radius, max_phase_error=max_phase_error
+)
+
+print("uv-cell size (wavelengths) = " + str(cell_size) + "\n")
+
+binned = binning.binned_visibilities_from(
+    visibilities=interferometer.visibilities,
+    noise_map=interferometer.noise_map,
+    uv_wavelengths=interferometer.uv_wavelengths,
+    cell_size=cell_size,
+)
+
+# The report gives the compression and the amplitude of emission at the edge of the mask after binning, relative to
+# before (1.0 is no loss of information).
+print(binned.report_from(real_space_radius=real_space_radius))
+
+binned_interferometer = al.interferometer(
+    visibilities=al.visibilities.manual_1d(visibilities=binned.visibilities),
+    noise_map=al.visibilities.manual_1d(visibilities=binned.noise_map),
+    uv_wavelengths=binned.uv_wavelengths,
+)
+
+aplt.interferometer.subplot_interferometer(interferometer=binned_interferometer)
+
+binned_dataset_path = af.path_util.make_and_return_path_from_path_and_folder_names(
+    path=workspace_path,
+    folder_names=["dataset", dataset_label, dataset_name + "__binned"],
+)
+
+binned_interferometer.output_to_fits(
+    visibilities_path=binned_dataset_path + "visibilities.fits",
+    noise_map_path=binned_dataset_path + "noise_map.fits",
+    uv_wavelengths_path=binned_dataset_path + "uv_wavelengths.fits",
+    overwrite=True,
+)
@@ -0,0 +1,271 @@
+"""
+Benchmark every stage of the profiling scripts in 'profiling/imaging' and 'profiling/interferometer' and output the
+run-times as JSON and CSV files, so that the speed of each stage can be tracked across releases.
+
+A profiling script takes part in the benchmark if it defines:
+
+    - data_resolutions: the list of data resolutions (e.g. 'lsst', 'euclid', 'hst', 'hst_up', 'ao') it is run at.
+    - stages_from_data_resolution(data_resolution): a function which sets up the dataset and returns the ordered
+      'Stages' of the calculation.
+
+Every stage is called 'warm_up' times before it is timed, so that numba's JIT compilation is not included in its
+run-time, and then timed 'repeats' times. The benchmark is run from the autolens_workspace folder as follows:
+
+    python -m profiling.benchmark --repeats 10 --warm_up 1 --data_resolutions lsst euclid hst
+"""
+
+import argparse
+import datetime
+import importlib
+import os
+import pkgutil
+import platform
+
+import numpy as np
+
+from profiling import profiling_util
+
+workspace_path = "{}/../".format(os.path.dirname(os.path.realpath(__file__)))
+
+packages = ["profiling.imaging", "profiling.interferometer"]
+
+
+class Stages(object):
+    def __init__(self):
+        """The ordered stages of a profiling script, where each stage is a function that takes no arguments.
+
+        A stage can use the value returned by an earlier stage via its name, for example:
+
+            stages.add(name="traced_grid", func=lambda: tracer.traced_grids_of_planes_from_grid(grid=grid)[-1])
+            stages.add(name="mapper", func=lambda: pixelization.mapper_from_grid_and_sparse_grid(
+                grid=stages["traced_grid"], ...))
+
+        The functions are only called when the stages are run, thus the values of earlier stages are available to
+        the stages which follow them.
+        """
+        self.names = []
+        self.funcs = {}
+        self.values = {}
+
+    def add(self, name, func):
+
+        if name in self.funcs:
+            raise ValueError(
+                "A stage with the name {} has already been added".format(name)
+            )
+
+        self.names.append(name)
+        self.funcs[name] = func
+
+    def run(self, name):
+        self.values[name] = self.funcs[name]()
+        return self.values[name]
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+
+def timings_from_stages(script, data_resolution, stages, repeats, warm_up, registry):
+    """Run every stage of a profiling script in order, first calling it 'warm_up' times and then timing it 'repeats'
+    times, and add the timings of every stage to the registry labelled by the script and data resolution.
+    """
+
+    labels = {"script": script, "data_resolution": data_resolution}
+
+    for name in stages:
+
+        for i in range(warm_up):
+            with profiling_util.Timer(
+                name=name if i == 0 else None,
+                registry=registry,
+                labels=labels,
+                compile=True,
+            ):
+                stages.run(name=name)
+
+        for i in range(repeats):
+            with profiling_util.Timer(name=name, registry=registry, labels=labels):
+                stages.run(name=name)
+
+        stage_timings = registry.stage_timings_from_name(name=name, labels=labels)
+
+        print(
+            "{} ({}) {}: median = {:.6f}s, p95 = {:.6f}s".format(
+                script, data_resolution, name, stage_timings.median, stage_timings.p95
+            )
+        )
+
+
+def scripts_from_packages(packages):
+    """Discover the profiling scripts in a list of packages which can be benchmarked, which are those defining
+    'data_resolutions' and 'stages_from_data_resolution'."""
+
+    scripts = []
+
+    for package_name in packages:
+
+        package = importlib.import_module(package_name)
+
+        for module_info in pkgutil.iter_modules(package.__path__):
+
+            if module_info.ispkg:
+                continue
+
+            module = importlib.import_module(
+                "{}.{}".format(package_name, module_info.name)
+            )
+
+            if hasattr(module, "stages_from_data_resolution") and hasattr(
+                module, "data_resolutions"
+            ):
+                scripts.append(module)
+
+    return scripts
+
+
+def script_name_from_module(module):
+
+    if module.__name__ == "__main__":
+        file_path = os.path.realpath(module.__file__)
+        return "{}.{}".format(
+            os.path.basename(os.path.dirname(file_path)),
+            os.path.splitext(os.path.basename(file_path))[0],
+        )
+
+    return module.__name__.replace("profiling.", "", 1)
+
+
+def timings_from_script(module, repeats, warm_up, registry, data_resolutions=None):
+
+    for data_resolution in module.data_resolutions:
+
+        if data_resolutions is not None and data_resolution not in data_resolutions:
+            continue
+
+        stages = module.stages_from_data_resolution(data_resolution=data_resolution)
+
+        timings_from_stages(
+            script=script_name_from_module(module=module),
+            data_resolution=data_resolution,
+            stages=stages,
+            repeats=repeats,
+            warm_up=warm_up,
+            registry=registry,
+        )
+
+
+def metadata_from_run(repeats, warm_up):
+
+    try:
+        import autolens as al
+
+        autolens_version = al.__version__
+    except (ImportError, AttributeError):
+        autolens_version = None
+
+    return {
+        "date": datetime.datetime.now().isoformat(),
+        "node": platform.node(),
+        "python_version": platform.python_version(),
+        "numpy_version": np.__version__,
+        "autolens_version": autolens_version,
+        "repeats": repeats,
+        "warm_up": warm_up,
+    }
+
+
+def run_script(module, repeats=10, warm_up=1, data_resolutions=None, output_path=None):
+    """Benchmark a single profiling script, for example from within that script using:
+
+    if __name__ == "__main__":
+        benchmark.run_script(module=sys.modules[__name__])
+    """
+    return run(
+        modules=[module],
+        repeats=repeats,
+        warm_up=warm_up,
+        data_resolutions=data_resolutions,
+        output_path=output_path,
+    )
+
+
+def run(modules, repeats=10, warm_up=1, data_resolutions=None, output_path=None):
+
+    registry = profiling_util.TimingRegistry()
+
+    for module in modules:
+        timings_from_script(
+            module=module,
+            repeats=repeats,
+            warm_up=warm_up,
+            registry=registry,
+            data_resolutions=data_resolutions,
+        )
+
+    if output_path is None:
+        output_path = os.path.join(workspace_path, "output", "profiling")
+
+    os.makedirs(output_path, exist_ok=True)
+
+    file_name = "benchmark__{}".format(
+        datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    )
+
+    registry.output_to_json(
+        file_path=os.path.join(output_path, file_name + ".json"),
+        metadata=metadata_from_run(repeats=repeats, warm_up=warm_up),
+    )
+    registry.output_to_csv(file_path=os.path.join(output_path, file_name + ".csv"))
+
+    return registry
+
+
+def main(args=None):
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the stages of the PyAutoLens profiling scripts."
+    )
+    parser.add_argument(
+        "--scripts",
+        nargs="+",
+        default=None,
+        help="The scripts to benchmark (e.g. imaging.inversion_rectangular_fit), default is every script.",
+    )
+    parser.add_argument(
+        "--data_resolutions",
+        nargs="+",
+        default=None,
+        help="The data resolutions to benchmark (e.g. lsst euclid hst hst_up ao), default is every resolution.",
+    )
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--warm_up", type=int, default=1)
+    parser.add_argument("--output_path", default=None)
+
+    args = parser.parse_args(args=args)
+
+    modules = scripts_from_packages(packages=packages)
+
+    if args.scripts is not None:
+        modules = [
+            module
+            for module in modules
+            if script_name_from_module(module=module) in args.scripts
+        ]
+
+    run(
+        modules=modules,
+        repeats=args.repeats,
+        warm_up=args.warm_up,
+        data_resolutions=args.data_resolutions,
+        output_path=args.output_path,
+    )
+
+
+if __name__ == "__main__":
+    main()
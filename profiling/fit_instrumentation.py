@@ -0,0 +1,351 @@
+"""
+Opt-in instrumentation of the stages of a PyAutoLens fit (traced grids, mapper, blurred mapping matrix, data vector,
+curvature matrix, regularization matrix, reconstruction, etc.), which records the run-time (and optionally the peak
+memory) of every stage of every likelihood evaluation and streams them to a 'stage_timings.jsonl' file in an output
+folder.
+
+Whilst the instrumentation is active, the functions and methods of each stage are wrapped with a timer, and every
+call of an evaluation target (by default 'al.fit') is treated as one likelihood evaluation. For a phase, the
+evaluation target is the 'fit' method of its Analysis class, for example:
+
+    with fit_instrumentation.FitInstrumentation(
+        output_path=phase_output_path,
+        evaluation_targets=[(al.PhaseImaging.Analysis, "fit")],
+        masked_dataset=masked_imaging,
+    ):
+        phase.run(dataset=imaging, mask=mask)
+
+Every line of the output file is the JSON dictionary of one likelihood evaluation, giving the total time and the time,
+peak memory (if traced) and number of calls of every stage. The functions are restored when the instrumentation exits.
+"""
+
+import functools
+import json
+import os
+import time
+import tracemalloc
+
+import autolens as al
+import numpy as np
+
+from profiling import profiling_util
+
+
+def default_stage_targets():
+    """The (owner, attribute, stage name) of every stage of the fit which is instrumented by default."""
+
+    stage_targets = [
+        (al.Tracer, "traced_grids_of_planes_from_grid", "traced_grids"),
+        (al.Tracer, "traced_sparse_grids_of_planes_from_grid", "traced_sparse_grids"),
+        (al.pix.Rectangular, "mapper_from_grid_and_sparse_grid", "mapper"),
+        (al.pix.VoronoiMagnification, "mapper_from_grid_and_sparse_grid", "mapper"),
+        (al.pix.VoronoiBrightnessImage, "mapper_from_grid_and_sparse_grid", "mapper"),
+        (al.pix.VoronoiBrightnessImage, "sparse_grid_from_grid", "sparse_grid"),
+        (
+            al.util.inversion,
+            "data_vector_from_blurred_mapping_matrix_and_data",
+            "data_vector",
+        ),
+        (
+            al.util.inversion,
+            "data_vector_from_transformed_mapping_matrix_and_data",
+            "data_vector",
+        ),
+        (
+            al.util.inversion,
+            "curvature_matrix_from_blurred_mapping_matrix",
+            "curvature_matrix",
+        ),
+        (
+            al.util.inversion,
+            "curvature_matrix_from_transformed_mapping_matrix",
+            "curvature_matrix",
+        ),
+        (
+            al.util.regularization,
+            "constant_regularization_matrix_from_pixel_neighbors",
+            "regularization_matrix",
+        ),
+        (
+            al.util.regularization,
+            "weighted_regularization_matrix_from_pixel_neighbors",
+            "regularization_matrix",
+        ),
+        (np.linalg, "solve", "reconstruction"),
+        (
+            al.util.inversion,
+            "mapped_reconstructed_data_from_mapping_matrix_and_reconstruction",
+            "mapped_reconstruction",
+        ),
+    ]
+
+    return [
+        (owner, attribute, stage)
+        for owner, attribute, stage in stage_targets
+        if hasattr(owner, attribute)
+    ]
+
+
+def stage_targets_from_masked_dataset(masked_dataset):
+    """The stages of a masked dataset's convolver (imaging) or transformer (interferometer), whose classes are only
+    known once the masked dataset is created."""
+
+    stage_targets = []
+
+    if hasattr(masked_dataset, "convolver"):
+
+        convolver_class = type(masked_dataset.convolver)
+
+        stage_targets += [
+            (convolver_class, "convolve_mapping_matrix", "blurred_mapping_matrix"),
+            (
+                convolver_class,
+                "convolved_image_from_image_and_blurring_image",
+                "psf_convolution",
+            ),
+        ]
+
+    if hasattr(masked_dataset, "transformer"):
+
+        transformer_class = type(masked_dataset.transformer)
+
+        stage_targets += [
+            (
+                transformer_class,
+                "transformed_mapping_matrices_from_mapping_matrix",
+                "transformed_mapping_matrices",
+            ),
+            (transformer_class, "visibilities_from_image", "visibilities"),
+        ]
+
+    return [
+        (owner, attribute, stage)
+        for owner, attribute, stage in stage_targets
+        if hasattr(owner, attribute)
+    ]
+
+
+class Evaluation(object):
+    def __init__(self, index):
+        """The stage timings of a single likelihood evaluation."""
+        self.index = index
+        self.time_ns = None
+        self.stages = {}
+
+    def add_stage(self, name, time_ns, peak_memory):
+
+        if name not in self.stages:
+            self.stages[name] = {"time": 0.0, "peak_memory": None, "calls": 0}
+
+        stage = self.stages[name]
+        stage["time"] += time_ns * 1.0e-9
+        stage["calls"] += 1
+
+        if peak_memory is not None:
+            if stage["peak_memory"] is None or peak_memory > stage["peak_memory"]:
+                stage["peak_memory"] = peak_memory
+
+    def as_dict(self):
+        return {
+            "evaluation": self.index,
+            "time": self.time_ns * 1.0e-9,
+            "stages": self.stages,
+        }
+
+
+class FitInstrumentation(object):
+    def __init__(
+        self,
+        output_path,
+        evaluation_targets=None,
+        stage_targets=None,
+        masked_dataset=None,
+        trace_memory=False,
+        file_name="stage_timings.jsonl",
+    ):
+        """Instrument the stages of every likelihood evaluation of a fit, streaming their timings to a JSON lines
+        file in the output path.
+
+        Parameters
+        ----------
+        output_path : str
+            The folder the timings are output to (e.g. a phase's output folder).
+        evaluation_targets : [(object, str)]
+            The (owner, attribute) of the functions or methods whose every call is one likelihood evaluation,
+            which defaults to 'al.fit'.
+        stage_targets : [(object, str, str)]
+            The (owner, attribute, stage name) of the stages which are timed, which defaults to the stages given by
+            'default_stage_targets'.
+        masked_dataset : MaskedImaging or MaskedInterferometer
+            If input, the stages of its convolver or transformer are also timed.
+        trace_memory : bool
+            If True, the peak memory of every stage is traced using tracemalloc. The peak memory is only traced for
+            the outermost stage when stages are nested. Tracing slows every allocation, inflating the timings, thus
+            memory and timings should be recorded in separate runs.
+        file_name : str
+            The name of the file the timings are output to.
+        """
+        self.output_path = output_path
+        self.file_path = os.path.join(output_path, file_name)
+
+        self.evaluation_targets = (
+            evaluation_targets if evaluation_targets is not None else [(al, "fit")]
+        )
+
+        self.stage_targets = list(
+            stage_targets if stage_targets is not None else default_stage_targets()
+        )
+
+        if masked_dataset is not None:
+            self.stage_targets += stage_targets_from_masked_dataset(
+                masked_dataset=masked_dataset
+            )
+
+        self.trace_memory = trace_memory
+
+        self.registry = profiling_util.TimingRegistry()
+
+        self.total_evaluations = 0
+        self._evaluation = None
+        self._stage_depth = 0
+        self._originals = []
+        self._file = None
+        self._started_tracemalloc = False
+
+    def _wrap_evaluation(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+
+            if self._evaluation is not None:
+                return func(*args, **kwargs)
+
+            self._evaluation = Evaluation(index=self.total_evaluations)
+
+            start = time.perf_counter_ns()
+
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._evaluation.time_ns = time.perf_counter_ns() - start
+                self._output_evaluation(evaluation=self._evaluation)
+                self._evaluation = None
+                self.total_evaluations += 1
+
+        return wrapper
+
+    def _wrap_stage(self, func, stage):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+
+            if self._evaluation is None:
+                return func(*args, **kwargs)
+
+            self._stage_depth += 1
+
+            timer = profiling_util.Timer(
+                name=stage,
+                registry=self.registry,
+                trace_memory=self.trace_memory and self._stage_depth == 1,
+            )
+
+            try:
+                with timer:
+                    return func(*args, **kwargs)
+            finally:
+                self._stage_depth -= 1
+                if self._evaluation is not None:
+                    self._evaluation.add_stage(
+                        name=stage,
+                        time_ns=timer.time_ns,
+                        peak_memory=timer.peak_memory,
+                    )
+
+        return wrapper
+
+    def _patch(self, owner, attribute, wrapper):
+        """Replace an attribute of a module or class with its wrapped function, storing the original so it can be
+        restored. For classes, staticmethods, classmethods and properties are wrapped via their underlying function.
+        """
+        if isinstance(owner, type):
+
+            original = next(
+                cls.__dict__[attribute]
+                for cls in owner.__mro__
+                if attribute in cls.__dict__
+            )
+
+            if isinstance(original, (staticmethod, classmethod)):
+                patched = type(original)(wrapper(original.__func__))
+            elif isinstance(original, property):
+                patched = property(wrapper(original.fget), original.fset, original.fdel)
+            else:
+                patched = wrapper(original)
+
+            if attribute not in owner.__dict__:
+                original = None
+
+        else:
+
+            original = getattr(owner, attribute)
+            patched = wrapper(original)
+
+        self._originals.append((owner, attribute, original))
+
+        setattr(owner, attribute, patched)
+
+    def _output_evaluation(self, evaluation):
+        self._file.write(json.dumps(evaluation.as_dict()) + "\n")
+        self._file.flush()
+
+    def __enter__(self):
+
+        os.makedirs(self.output_path, exist_ok=True)
+
+        self._file = open(self.file_path, "a")
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+        for owner, attribute, stage in self.stage_targets:
+            self._patch(
+                owner=owner,
+                attribute=attribute,
+                wrapper=lambda func, stage=stage: self._wrap_stage(
+                    func=func, stage=stage
+                ),
+            )
+
+        for owner, attribute in self.evaluation_targets:
+            self._patch(
+                owner=owner,
+                attribute=attribute,
+                wrapper=lambda func: self._wrap_evaluation(func=func),
+            )
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+
+        for owner, attribute, original in reversed(self._originals):
+            if original is None:
+                delattr(owner, attribute)
+            else:
+                setattr(owner, attribute, original)
+
+        self._originals = []
+
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+        self._file.close()
+        self._file = None
+
+        return False
+
+    def summary(self):
+        """The median run-time of every stage over all likelihood evaluations, in seconds."""
+        return {
+            stage_timings.name: stage_timings.median for stage_timings in self.registry
+        }
@@ -1,25 +1,26 @@
-import time
+import sys
 
 import autolens as al
 
+from profiling import benchmark
 from profiling.imaging.simulator import simulate_util
+from tools.imaging import convolver
+from tools.inversion import cholesky_util
+from tools.inversion import interpolation_util
+from tools.inversion import regularization_scan
+from tools.inversion import regularization_util
+from tools.inversion import sparse_util
 
 import numpy as np
 
 repeats = 10
 
-print("Number of repeats = " + str(repeats))
-print()
-
 sub_size = 4
 radius = 3.6
 psf_shape_2d = (11, 11)
 pixelization_shape_2d = (20, 20)
 
-print("sub grid size = " + str(sub_size))
-print("circular mask radius = " + str(radius) + "\n")
-print("psf shape = " + str(psf_shape_2d) + "\n")
-print("pixelization shape = " + str(pixelization_shape_2d) + "\n")
+data_resolutions = ["lsst", "euclid", "hst", "hst_up"]  # , 'ao']
 
 lens_galaxy = al.Galaxy(
     redshift=0.5,
@@ -36,7 +37,8 @@ source_galaxy = al.Galaxy(
     regularization=al.reg.Constant(coefficient=1.0),
 )
 
-for data_resolution in ["lsst", "euclid", "hst", "hst_up"]:  # , 'ao']:
+
+def stages_from_data_resolution(data_resolution):
 
     imaging = simulate_util.load_test_imaging(
         data_type="lens_sie__source_smooth",
@@ -53,107 +55,225 @@ for data_resolution in ["lsst", "euclid", "hst", "hst_up"]:  # , 'ao']:
 
     masked_imaging = al.masked.imaging(imaging=imaging, mask=mask)
 
-    print(
-        "Rectangular Inversion fit run times for image type " + data_resolution + "\n"
-    )
     print("Number of points = " + str(masked_imaging.grid.sub_shape_1d) + "\n")
 
-    start_overall = time.time()
-
     tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
 
-    start = time.time()
-    for i in range(repeats):
-        traced_grid = tracer.traced_grids_of_planes_from_grid(grid=masked_imaging.grid)[
-            -1
-        ]
-    diff = time.time() - start
-    print("Time to Setup Traced Grids = {}".format(diff / repeats))
+    # The cache persists across the repeats of each stage, as it would across the likelihood evaluations of a
+    # phase whose pixelization grid is fixed.
+    regularization_cache = regularization_util.ConstantRegularizationCache()
+
+    stages = benchmark.Stages()
 
-    start = time.time()
-    for i in range(repeats):
-        traced_sparse_grid = tracer.traced_sparse_grids_of_planes_from_grid(
+    stages.add(
+        name="traced_grid",
+        func=lambda: tracer.traced_grids_of_planes_from_grid(grid=masked_imaging.grid)[
+            -1
+        ],
+    )
+    stages.add(
+        name="traced_sparse_grid",
+        func=lambda: tracer.traced_sparse_grids_of_planes_from_grid(
             grid=masked_imaging.grid
-        )[-1]
-
-    diff = time.time() - start
-    print("Time to Setup Pixelization Grid = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        mapper = pixelization.mapper_from_grid_and_sparse_grid(
-            grid=traced_grid, sparse_grid=traced_sparse_grid, inversion_uses_border=True
-        )
-    diff = time.time() - start
-    print("Time to create mapper (Border Relocation) = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        mapping_matrix = mapper.mapping_matrix
-    diff = time.time() - start
-    print("Time to compute mapping matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        blurred_mapping_matrix = masked_imaging.convolver.convolve_mapping_matrix(
-            mapping_matrix=mapping_matrix
-        )
-    diff = time.time() - start
-    print("Time to compute blurred mapping matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        data_vector = al.util.inversion.data_vector_from_blurred_mapping_matrix_and_data(
-            blurred_mapping_matrix=blurred_mapping_matrix,
+        )[-1],
+    )
+    stages.add(
+        name="mapper",
+        func=lambda: pixelization.mapper_from_grid_and_sparse_grid(
+            grid=stages["traced_grid"],
+            sparse_grid=stages["traced_sparse_grid"],
+            inversion_uses_border=True,
+        ),
+    )
+    stages.add(name="mapping_matrix", func=lambda: stages["mapper"].mapping_matrix)
+    stages.add(
+        name="blurred_mapping_matrix",
+        func=lambda: masked_imaging.convolver.convolve_mapping_matrix(
+            mapping_matrix=stages["mapping_matrix"]
+        ),
+    )
+    stages.add(
+        name="fft_convolver",
+        func=lambda: convolver.ConvolverFFT.from_masked_imaging(
+            masked_imaging=masked_imaging
+        ),
+    )
+    stages.add(
+        name="fft_blurred_mapping_matrix",
+        func=lambda: stages["fft_convolver"].convolve_mapping_matrix(
+            mapping_matrix=stages["mapping_matrix"]
+        ),
+    )
+    stages.add(
+        name="separable_convolver",
+        func=lambda: convolver.ConvolverSeparable.from_masked_imaging(
+            masked_imaging=masked_imaging
+        ),
+    )
+    stages.add(
+        name="separable_blurred_mapping_matrix",
+        func=lambda: stages["separable_convolver"].convolve_mapping_matrix(
+            mapping_matrix=stages["mapping_matrix"]
+        ),
+    )
+    stages.add(
+        name="data_vector",
+        func=lambda: al.util.inversion.data_vector_from_blurred_mapping_matrix_and_data(
+            blurred_mapping_matrix=stages["blurred_mapping_matrix"],
             image=masked_imaging.image,
             noise_map=masked_imaging.noise_map,
-        )
-    diff = time.time() - start
-    print("Time to compute data vector = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        curvature_matrix = al.util.inversion.curvature_matrix_from_blurred_mapping_matrix(
-            blurred_mapping_matrix=blurred_mapping_matrix,
+        ),
+    )
+    stages.add(
+        name="curvature_matrix",
+        func=lambda: al.util.inversion.curvature_matrix_from_blurred_mapping_matrix(
+            blurred_mapping_matrix=stages["blurred_mapping_matrix"],
             noise_map=masked_imaging.noise_map,
-        )
-    diff = time.time() - start
-    print("Time to compute curvature matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        regularization_matrix = al.util.regularization.constant_regularization_matrix_from_pixel_neighbors(
+        ),
+    )
+    stages.add(
+        name="sparse_blurring_matrix",
+        func=lambda: sparse_util.sparse_blurring_matrix_from(
+            mask=mask, kernel=imaging.psf.in_2d
+        ),
+    )
+    stages.add(
+        name="sparse_mapping_matrix",
+        func=lambda: sparse_util.sparse_mapping_matrix_from_mapper(
+            mapper=stages["mapper"]
+        ),
+    )
+    stages.add(
+        name="bilinear_sparse_mapping_matrix",
+        func=lambda: interpolation_util.interpolated_sparse_mapping_matrix_from_mapper(
+            mapper=stages["mapper"], method="bilinear"
+        ),
+    )
+    stages.add(
+        name="sparse_blurred_mapping_matrix",
+        func=lambda: sparse_util.sparse_blurred_mapping_matrix_from(
+            blurring_matrix=stages["sparse_blurring_matrix"],
+            mapping_matrix=stages["sparse_mapping_matrix"],
+        ),
+    )
+    stages.add(
+        name="sparse_data_vector",
+        func=lambda: sparse_util.data_vector_from_sparse_blurred_mapping_matrix_and_data(
+            blurred_mapping_matrix=stages["sparse_blurred_mapping_matrix"],
+            image=masked_imaging.image,
+            noise_map=masked_imaging.noise_map,
+        ),
+    )
+    stages.add(
+        name="sparse_curvature_matrix",
+        func=lambda: sparse_util.curvature_matrix_from_sparse_blurred_mapping_matrix(
+            blurred_mapping_matrix=stages["sparse_blurred_mapping_matrix"],
+            noise_map=masked_imaging.noise_map,
+        ),
+    )
+    stages.add(
+        name="regularization_matrix",
+        func=lambda: al.util.regularization.constant_regularization_matrix_from_pixel_neighbors(
             coefficient=1.0,
-            pixel_neighbors=mapper.pixelization_grid.pixel_neighbors,
-            pixel_neighbors_size=mapper.pixelization_grid.pixel_neighbors_size,
-        )
-    diff = time.time() - start
-    print("Time to compute reguarization matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        curvature_reg_matrix = np.add(curvature_matrix, regularization_matrix)
-    diff = time.time() - start
-    print("Time to compute curvature reguarization Matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        reconstruction = np.linalg.solve(curvature_reg_matrix, data_vector)
-    diff = time.time() - start
-    print("Time to peform reconstruction = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        al.util.inversion.mapped_reconstructed_data_from_mapping_matrix_and_reconstruction(
-            mapping_matrix=blurred_mapping_matrix, reconstruction=reconstruction
-        )
-    diff = time.time() - start
-    print("Time to compute mapped reconstruction = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        al.fit(masked_dataset=masked_imaging, tracer=tracer)
-    diff = time.time() - start
-    print("Time to perform complete fit = {}".format(diff / repeats))
+            pixel_neighbors=stages["mapper"].pixelization_grid.pixel_neighbors,
+            pixel_neighbors_size=stages["mapper"].pixelization_grid.pixel_neighbors_size,
+        ),
+    )
+    stages.add(
+        name="regularization_pattern",
+        func=lambda: regularization_util.RegularizationPattern.from_pixelization_grid(
+            pixelization_grid=stages["mapper"].pixelization_grid
+        ),
+    )
+    stages.add(
+        name="sparse_regularization_matrix",
+        func=lambda: stages[
+            "regularization_pattern"
+        ].constant_regularization_matrix_from(coefficient=1.0),
+    )
+    stages.add(
+        name="cached_regularization_matrix",
+        func=lambda: regularization_cache.regularization_matrix_from_mapper(
+            coefficient=1.0, mapper=stages["mapper"]
+        ),
+    )
+    stages.add(
+        name="sparse_curvature_reg_matrix",
+        func=lambda: regularization_util.curvature_reg_matrix_from(
+            curvature_matrix=stages["curvature_matrix"],
+            regularization_matrix=stages["sparse_regularization_matrix"],
+        ),
+    )
+    stages.add(
+        name="curvature_reg_matrix",
+        func=lambda: np.add(
+            stages["curvature_matrix"], stages["regularization_matrix"]
+        ),
+    )
+    stages.add(
+        name="reconstruction",
+        func=lambda: np.linalg.solve(
+            stages["curvature_reg_matrix"], stages["data_vector"]
+        ),
+    )
+    stages.add(
+        name="cholesky_inversion",
+        func=lambda: cholesky_util.CholeskyInversion(
+            curvature_matrix=stages["curvature_matrix"],
+            regularization_matrix=stages["regularization_matrix"],
+            data_vector=stages["data_vector"],
+        ),
+    )
+    stages.add(
+        name="log_det_curvature_reg_matrix",
+        func=lambda: stages["cholesky_inversion"].log_det_curvature_reg_matrix_term,
+    )
+    stages.add(
+        name="log_det_regularization_matrix",
+        func=lambda: stages["cholesky_inversion"].log_det_regularization_matrix_term,
+    )
+    stages.add(
+        name="regularization_scan",
+        func=lambda: regularization_scan.RegularizationScan.from_mapper(
+            curvature_matrix=stages["curvature_matrix"],
+            data_vector=stages["data_vector"],
+            mapper=stages["mapper"],
+            data_chi_squared=np.sum(
+                (masked_imaging.image / masked_imaging.noise_map) ** 2.0
+            ),
+        ),
+    )
+    stages.add(
+        name="regularization_scan_log_evidences",
+        func=lambda: stages["regularization_scan"].log_evidences_from(
+            coefficients=np.logspace(-3.0, 3.0, 100),
+            noise_normalization=np.sum(
+                np.log(2 * np.pi * masked_imaging.noise_map ** 2.0)
+            ),
+        ),
+    )
+    stages.add(
+        name="mapped_reconstruction",
+        func=lambda: al.util.inversion.mapped_reconstructed_data_from_mapping_matrix_and_reconstruction(
+            mapping_matrix=stages["blurred_mapping_matrix"],
+            reconstruction=stages["reconstruction"],
+        ),
+    )
+    stages.add(
+        name="fit", func=lambda: al.fit(masked_dataset=masked_imaging, tracer=tracer)
+    )
 
+    return stages
+
+
+if __name__ == "__main__":
+
+    print("Number of repeats = " + str(repeats))
     print()
+
+    print("sub grid size = " + str(sub_size))
+    print("circular mask radius = " + str(radius) + "\n")
+    print("psf shape = " + str(psf_shape_2d) + "\n")
+    print("pixelization shape = " + str(pixelization_shape_2d) + "\n")
+
+    benchmark.run_script(module=sys.modules[__name__], repeats=repeats)
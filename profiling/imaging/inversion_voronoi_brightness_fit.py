@@ -1,25 +1,21 @@
-import time
+import sys
 
 import autolens as al
 
+from profiling import benchmark
 from profiling.imaging.simulator import simulate_util
+from tools.pixelization import clustering
 
 import numpy as np
 
 repeats = 10
 
-print("Number of repeats = " + str(repeats))
-print()
-
 sub_size = 4
 radius = 3.6
 psf_shape_2d = (11, 11)
 pixels = 500
 
-print("sub grid size = " + str(sub_size))
-print("circular mask radius = " + str(radius) + "\n")
-print("psf shape = " + str(psf_shape_2d) + "\n")
-print("pixels = " + str(pixels) + "\n")
+data_resolutions = ["lsst", "euclid", "hst", "hst_up"]  # , 'ao']
 
 lens_galaxy = al.Galaxy(
     redshift=0.5,
@@ -30,7 +26,8 @@ lens_galaxy = al.Galaxy(
 
 pixelization = al.pix.VoronoiBrightnessImage(pixels=pixels)
 
-for data_resolution in ["lsst", "euclid", "hst", "hst_up"]:  # , 'ao']:
+
+def stages_from_data_resolution(data_resolution):
 
     imaging = simulate_util.load_test_imaging(
         data_type="lens_sie__source_smooth",
@@ -55,117 +52,154 @@ for data_resolution in ["lsst", "euclid", "hst", "hst_up"]:  # , 'ao']:
         hyper_galaxy_image=masked_imaging.image,
     )
 
-    print(
-        "Rectangular Inversion fit run times for image type " + data_resolution + "\n"
-    )
     print("Number of points = " + str(masked_imaging.grid.sub_shape_1d) + "\n")
 
-    start_overall = time.time()
-
     tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
 
-    start = time.time()
-    for i in range(repeats):
-        cluster_weight_map = pixelization.weight_map_from_hyper_image(
-            hyper_image=masked_imaging.image
-        )
-    diff = time.time() - start
-    print("Time to Setup Cluster Weight Map = {}".format(diff / repeats))
+    # The clustering engines persist across the repeats of each stage, thus after the warm up the 'cached_clustering'
+    # stage times the reuse of the cached sparse grid.
+    mini_batch_clustering = clustering.SparseGridClustering(
+        pixelization=pixelization, method="mini_batch"
+    )
+    stratified_clustering = clustering.SparseGridClustering(
+        pixelization=pixelization, method="stratified"
+    )
 
-    for i in range(repeats):
-        sparse_grid = pixelization.sparse_grid_from_grid(
-            grid=masked_imaging.grid, hyper_image=masked_imaging.image
-        )
-    diff = time.time() - start
-    print("Time to perform KMeans clustering = {}".format(diff / repeats))
+    stages = benchmark.Stages()
 
-    start = time.time()
-    for i in range(repeats):
-        traced_grid = tracer.traced_grids_of_planes_from_grid(grid=masked_imaging.grid)[
+    stages.add(
+        name="cluster_weight_map",
+        func=lambda: pixelization.weight_map_from_hyper_image(
+            hyper_image=masked_imaging.image
+        ),
+    )
+    stages.add(
+        name="kmeans_clustering",
+        func=lambda: pixelization.sparse_grid_from_grid(
+            grid=masked_imaging.grid, hyper_image=masked_imaging.image
+        ),
+    )
+    stages.add(
+        name="mini_batch_kmeans_clustering",
+        func=lambda: mini_batch_clustering.centres_and_labels_from(
+            grid_1d=clustering.grid_1d_from(grid=masked_imaging.grid),
+            weight_map=stages["cluster_weight_map"],
+        ),
+    )
+    stages.add(
+        name="stratified_clustering",
+        func=lambda: stratified_clustering.centres_and_labels_from(
+            grid_1d=clustering.grid_1d_from(grid=masked_imaging.grid),
+            weight_map=stages["cluster_weight_map"],
+        ),
+    )
+    stages.add(
+        name="cached_clustering",
+        func=lambda: mini_batch_clustering.sparse_grid_from_grid(
+            grid=masked_imaging.grid, hyper_image=masked_imaging.image
+        ),
+    )
+    stages.add(
+        name="traced_grid",
+        func=lambda: tracer.traced_grids_of_planes_from_grid(grid=masked_imaging.grid)[
             -1
-        ]
-    diff = time.time() - start
-    print("Time to Setup Traced Grid = {}".format(diff / repeats))
-
-    traced_sparse_grid = tracer.traced_sparse_grids_of_planes_from_grid(
-        grid=masked_imaging.grid
-    )[-1]
-
-    start = time.time()
-    for i in range(repeats):
-        mapper = pixelization.mapper_from_grid_and_sparse_grid(
-            grid=traced_grid, sparse_grid=traced_sparse_grid, inversion_uses_border=True
-        )
-    diff = time.time() - start
-    print("Time to create mapper (Border Relocation) = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        mapping_matrix = mapper.mapping_matrix
-    diff = time.time() - start
-    print("Time to compute mapping matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        blurred_mapping_matrix = masked_imaging.convolver.convolve_mapping_matrix(
-            mapping_matrix=mapping_matrix
-        )
-    diff = time.time() - start
-    print("Time to compute blurred mapping matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        data_vector = al.util.inversion.data_vector_from_blurred_mapping_matrix_and_data(
-            blurred_mapping_matrix=blurred_mapping_matrix,
+        ],
+    )
+    stages.add(
+        name="traced_sparse_grid",
+        func=lambda: tracer.traced_sparse_grids_of_planes_from_grid(
+            grid=masked_imaging.grid
+        )[-1],
+    )
+    stages.add(
+        name="mapper",
+        func=lambda: pixelization.mapper_from_grid_and_sparse_grid(
+            grid=stages["traced_grid"],
+            sparse_grid=stages["traced_sparse_grid"],
+            inversion_uses_border=True,
+        ),
+    )
+    stages.add(
+        name="clustered_traced_sparse_grid",
+        func=lambda: tracer.traced_sparse_grids_of_planes_from_grid(
+            grid=masked_imaging.grid,
+            preload_sparse_grids_of_planes=mini_batch_clustering.sparse_grids_of_planes_from_tracer(
+                tracer=tracer, grid=masked_imaging.grid
+            ),
+        )[-1],
+    )
+    stages.add(
+        name="clustered_mapper",
+        func=lambda: pixelization.mapper_from_grid_and_sparse_grid(
+            grid=stages["traced_grid"],
+            sparse_grid=stages["clustered_traced_sparse_grid"],
+            inversion_uses_border=True,
+        ),
+    )
+    stages.add(name="mapping_matrix", func=lambda: stages["mapper"].mapping_matrix)
+    stages.add(
+        name="blurred_mapping_matrix",
+        func=lambda: masked_imaging.convolver.convolve_mapping_matrix(
+            mapping_matrix=stages["mapping_matrix"]
+        ),
+    )
+    stages.add(
+        name="data_vector",
+        func=lambda: al.util.inversion.data_vector_from_blurred_mapping_matrix_and_data(
+            blurred_mapping_matrix=stages["blurred_mapping_matrix"],
             image=masked_imaging.image,
             noise_map=masked_imaging.noise_map,
-        )
-    diff = time.time() - start
-    print("Time to compute data vector = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        curvature_matrix = al.util.inversion.curvature_matrix_from_blurred_mapping_matrix(
-            blurred_mapping_matrix=blurred_mapping_matrix,
+        ),
+    )
+    stages.add(
+        name="curvature_matrix",
+        func=lambda: al.util.inversion.curvature_matrix_from_blurred_mapping_matrix(
+            blurred_mapping_matrix=stages["blurred_mapping_matrix"],
             noise_map=masked_imaging.noise_map,
-        )
-    diff = time.time() - start
-    print("Time to compute curvature matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        regularization_matrix = al.util.regularization.constant_regularization_matrix_from_pixel_neighbors(
+        ),
+    )
+    stages.add(
+        name="regularization_matrix",
+        func=lambda: al.util.regularization.constant_regularization_matrix_from_pixel_neighbors(
             coefficient=1.0,
-            pixel_neighbors=mapper.pixelization_grid.pixel_neighbors,
-            pixel_neighbors_size=mapper.pixelization_grid.pixel_neighbors_size,
-        )
-    diff = time.time() - start
-    print("Time to compute reguarization matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        curvature_reg_matrix = np.add(curvature_matrix, regularization_matrix)
-    diff = time.time() - start
-    print("Time to compute curvature reguarization Matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        reconstruction = np.linalg.solve(curvature_reg_matrix, data_vector)
-    diff = time.time() - start
-    print("Time to peform reconstruction = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        al.util.inversion.mapped_reconstructed_data_from_mapping_matrix_and_reconstruction(
-            mapping_matrix=blurred_mapping_matrix, reconstruction=reconstruction
-        )
-    diff = time.time() - start
-    print("Time to compute mapped reconstruction = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        al.fit(masked_dataset=masked_imaging, tracer=tracer)
-    diff = time.time() - start
-    print("Time to perform complete fit = {}".format(diff / repeats))
+            pixel_neighbors=stages["mapper"].pixelization_grid.pixel_neighbors,
+            pixel_neighbors_size=stages["mapper"].pixelization_grid.pixel_neighbors_size,
+        ),
+    )
+    stages.add(
+        name="curvature_reg_matrix",
+        func=lambda: np.add(
+            stages["curvature_matrix"], stages["regularization_matrix"]
+        ),
+    )
+    stages.add(
+        name="reconstruction",
+        func=lambda: np.linalg.solve(
+            stages["curvature_reg_matrix"], stages["data_vector"]
+        ),
+    )
+    stages.add(
+        name="mapped_reconstruction",
+        func=lambda: al.util.inversion.mapped_reconstructed_data_from_mapping_matrix_and_reconstruction(
+            mapping_matrix=stages["blurred_mapping_matrix"],
+            reconstruction=stages["reconstruction"],
+        ),
+    )
+    stages.add(
+        name="fit", func=lambda: al.fit(masked_dataset=masked_imaging, tracer=tracer)
+    )
+
+    return stages
 
+
+if __name__ == "__main__":
+
+    print("Number of repeats = " + str(repeats))
     print()
+
+    print("sub grid size = " + str(sub_size))
+    print("circular mask radius = " + str(radius) + "\n")
+    print("psf shape = " + str(psf_shape_2d) + "\n")
+    print("pixels = " + str(pixels) + "\n")
+
+    benchmark.run_script(module=sys.modules[__name__], repeats=repeats)
@@ -1,21 +1,20 @@
-import autolens as al
+import sys
 
-import time
+import autolens as al
 
+from profiling import benchmark
 from profiling.imaging.simulator import simulate_util
+from tools.imaging import adaptive_sub_grid
+from tools.imaging import convolver
+from tools.lensing import deflection_cache
 
 repeats = 10
 
-print("Number of repeats = " + str(repeats))
-print()
-
 sub_size = 4
 radius = 3.0
 psf_shape_2d = (21, 21)
 
-print("sub grid size = " + str(sub_size))
-print("circular mask radius = " + str(radius) + "\n")
-print("psf shape = " + str(psf_shape_2d) + "\n")
+data_resolutions = ["lsst", "euclid", "hst", "hst_up", "ao"]
 
 lens_galaxy = al.Galaxy(
     redshift=0.5,
@@ -44,7 +43,8 @@ source_galaxy = al.Galaxy(
     ),
 )
 
-for data_resolution in ["lsst", "euclid", "hst", "hst_up", "ao"]:
+
+def stages_from_data_resolution(data_resolution):
 
     imaging = simulate_util.load_test_imaging(
         data_type="lens_sie__source_smooth",
@@ -61,39 +61,95 @@ for data_resolution in ["lsst", "euclid", "hst", "hst_up", "ao"]:
 
     masked_imaging = al.masked.imaging(imaging=imaging, mask=mask)
 
-    print("Light profile fit run times for image type " + data_resolution + "\n")
     print("Number of points = " + str(masked_imaging.grid.sub_shape_1d) + "\n")
 
-    start_overall = time.time()
-
-    start = time.time()
-    for i in range(repeats):
-        tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
-        profile_image = tracer.profile_image_from_grid(grid=masked_imaging.grid)
-    diff = time.time() - start
-    print("Time to create profile image = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        blurring_profile_image = tracer.profile_image_from_grid(
-            grid=masked_imaging.blurring_grid
-        )
-    diff = time.time() - start
-    print("Time to create blurring profile image = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        blurred_profile_image = masked_imaging.convolver.convolved_image_from_image_and_blurring_image(
-            image=profile_image, blurring_image=blurring_profile_image
-        )
-    diff = time.time() - start
-    print("Time to perform PSF Convolution = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
-        al.fit(masked_dataset=masked_imaging, tracer=tracer)
-    diff = time.time() - start
-    print("Time to perform complete fit = {}".format(diff / repeats))
+    tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
+
+    # The cache persists across the repeats of each stage, as it would across the likelihood evaluations of a phase
+    # whose lens mass is fixed.
+    deflections = deflection_cache.DeflectionCache()
+
+    stages = benchmark.Stages()
 
+    stages.add(
+        name="profile_image",
+        func=lambda: al.Tracer.from_galaxies(
+            galaxies=[lens_galaxy, source_galaxy]
+        ).profile_image_from_grid(grid=masked_imaging.grid),
+    )
+    stages.add(
+        name="adaptive_sub_grid",
+        func=lambda: adaptive_sub_grid.AdaptiveSubGrid.from_mask(mask=mask),
+    )
+    stages.add(
+        name="adaptive_profile_image",
+        func=lambda: stages["adaptive_sub_grid"].image_from_tracer(tracer=tracer),
+    )
+    stages.add(
+        name="blurring_profile_image",
+        func=lambda: tracer.profile_image_from_grid(grid=masked_imaging.blurring_grid),
+    )
+    stages.add(
+        name="cached_traced_grids",
+        func=lambda: deflections.traced_grids_of_planes_from_tracer_and_grid(
+            tracer=tracer, grid=masked_imaging.grid
+        ),
+    )
+    stages.add(
+        name="psf_convolution",
+        func=lambda: masked_imaging.convolver.convolved_image_from_image_and_blurring_image(
+            image=stages["profile_image"],
+            blurring_image=stages["blurring_profile_image"],
+        ),
+    )
+    stages.add(
+        name="fft_convolver",
+        func=lambda: convolver.ConvolverFFT.from_masked_imaging(
+            masked_imaging=masked_imaging, method="fft"
+        ),
+    )
+    stages.add(
+        name="fft_psf_convolution",
+        func=lambda: stages[
+            "fft_convolver"
+        ].convolved_image_from_image_and_blurring_image(
+            image=stages["profile_image"],
+            blurring_image=stages["blurring_profile_image"],
+        ),
+    )
+    stages.add(
+        name="separable_convolver",
+        func=lambda: convolver.ConvolverSeparable.from_masked_imaging(
+            masked_imaging=masked_imaging
+        ),
+    )
+    stages.add(
+        name="separable_psf_convolution",
+        func=lambda: stages[
+            "separable_convolver"
+        ].convolved_image_from_image_and_blurring_image(
+            image=stages["profile_image"],
+            blurring_image=stages["blurring_profile_image"],
+        ),
+    )
+    stages.add(
+        name="fit",
+        func=lambda: al.fit(
+            masked_dataset=masked_imaging,
+            tracer=al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy]),
+        ),
+    )
+
+    return stages
+
+
+if __name__ == "__main__":
+
+    print("Number of repeats = " + str(repeats))
     print()
+
+    print("sub grid size = " + str(sub_size))
+    print("circular mask radius = " + str(radius) + "\n")
+    print("psf shape = " + str(psf_shape_2d) + "\n")
+
+    benchmark.run_script(module=sys.modules[__name__], repeats=repeats)
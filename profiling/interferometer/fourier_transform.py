@@ -1,7 +1,11 @@
+import sys
+
 import autolens as al
 
+from profiling import benchmark
+from tools.interferometer import transformers
+
 import numpy as np
-import time
 
 repeats = 1
 
@@ -9,54 +13,90 @@ visibilities = 1000
 shape_2d = (100, 100)
 image_pixels = shape_2d[0] * shape_2d[1]
 source_pixels = 1000
+chunk_size = 100
+
+data_resolutions = ["sma"]
+
+
+def stages_from_data_resolution(data_resolution):
+
+    uv_wavelengths = np.ones(shape=(visibilities, 2))
+    grid = al.grid.uniform(shape_2d=shape_2d, pixel_scales=0.05)
+    image = al.array.ones(shape_2d=shape_2d, pixel_scales=0.05)
+
+    transformer = al.transformer(
+        uv_wavelengths=uv_wavelengths, grid_radians=grid, preload_transform=False
+    )
+
+    transformer_preload = transformers.transformer_from_memory_limit(
+        uv_wavelengths=uv_wavelengths, grid_radians=grid, preload_transform=True
+    )
+
+    transformer_chunked = transformers.TransformerChunked(
+        uv_wavelengths=uv_wavelengths, grid_radians=grid, chunk_size=chunk_size
+    )
+
+    transformer_nufft = transformers.TransformerNUFFT(
+        uv_wavelengths=uv_wavelengths, grid_radians=grid
+    )
+
+    stages = benchmark.Stages()
+
+    stages.add(
+        name="real_visibilities",
+        func=lambda: transformer.real_visibilities_from_image(image=image),
+    )
+    stages.add(
+        name="imag_visibilities",
+        func=lambda: transformer.imag_visibilities_from_image(image=image),
+    )
+    stages.add(
+        name="real_visibilities_preload",
+        func=lambda: transformer_preload.real_visibilities_from_image(image=image),
+    )
+    stages.add(
+        name="imag_visibilities_preload",
+        func=lambda: transformer_preload.imag_visibilities_from_image(image=image),
+    )
+    stages.add(
+        name="real_visibilities_chunked",
+        func=lambda: transformer_chunked.real_visibilities_from_image(image=image),
+    )
+    stages.add(
+        name="imag_visibilities_chunked",
+        func=lambda: transformer_chunked.imag_visibilities_from_image(image=image),
+    )
+    stages.add(
+        name="real_visibilities_nufft",
+        func=lambda: transformer_nufft.real_visibilities_from_image(image=image),
+    )
+    stages.add(
+        name="imag_visibilities_nufft",
+        func=lambda: transformer_nufft.imag_visibilities_from_image(image=image),
+    )
+
+    return stages
+
+
+if __name__ == "__main__":
+
+    print("Data Memory Use (GB) = " + str(8 * visibilities * 8e-9))
+    print(
+        "PreLoad Memory Use (GB) = "
+        + str(
+            transformers.preload_memory_from(
+                total_visibilities=visibilities, image_pixels=image_pixels
+            )
+        )
+    )
+    print(
+        "Mapping Matrix Memory Use (GB) = "
+        + str(
+            transformers.transformed_mapping_matrices_memory_from(
+                total_visibilities=visibilities, source_pixels=source_pixels
+            )
+        )
+    )
+    print()
 
-shape_data = 8 * visibilities
-shape_preloads = visibilities * image_pixels * 2
-shape_mapping_matrix = visibilities * source_pixels
-
-total_shape = shape_data + shape_preloads + shape_mapping_matrix
-
-print("Data Memory Use (GB) = " + str(shape_data * 8e-9))
-print("PreLoad Memory Use (GB) = " + str(shape_preloads * 8e-9))
-print("Mapping Matrix Memory Use (GB) = " + str(shape_mapping_matrix * 8e-9))
-print("Total Memory Use (GB) = " + str(total_shape * 8e-9))
-print()
-
-# Only delete this if the memory use looks... Okay
-# stop
-
-uv_wavelengths = np.ones(shape=(visibilities, 2))
-grid = al.grid.uniform(shape_2d=shape_2d, pixel_scales=0.05)
-image = al.array.ones(shape_2d=shape_2d, pixel_scales=0.05)
-
-transformer = al.transformer(
-    uv_wavelengths=uv_wavelengths, grid_radians=grid, preload_transform=False
-)
-
-start = time.time()
-for i in range(repeats):
-    transformer.real_visibilities_from_image(image=image)
-diff = time.time() - start
-print("Real Visibilities Time = {}".format(diff / repeats))
-
-start = time.time()
-for i in range(repeats):
-    transformer.imag_visibilities_from_image(image=image)
-diff = time.time() - start
-print("Imaginary Visibilities Time = {}".format(diff / repeats))
-
-transformer = al.transformer(
-    uv_wavelengths=uv_wavelengths, grid_radians=grid, preload_transform=True
-)
-
-start = time.time()
-for i in range(repeats):
-    transformer.real_visibilities_from_image(image=image)
-diff = time.time() - start
-print("Real Visibilities PreLoad Time = {}".format(diff / repeats))
-
-start = time.time()
-for i in range(repeats):
-    transformer.imag_visibilities_from_image(image=image)
-diff = time.time() - start
-print("Imaginary Visibilities PreLoad Time = {}".format(diff / repeats))
+    benchmark.run_script(module=sys.modules[__name__], repeats=repeats)
@@ -1,7 +1,11 @@
+import sys
+
 import autolens as al
 
+from profiling import benchmark
+from tools.interferometer import transformers
+
 import numpy as np
-import time
 
 repeats = 5
 
@@ -14,29 +18,7 @@ real_space_radius = 3.0
 
 image_pixels = real_space_shape_2d[0] * real_space_shape_2d[1]
 
-shape_data = 8 * total_visibilities
-shape_preloads = total_visibilities * image_pixels * 2
-
-total_shape = shape_data + shape_preloads
-
-print("Data Memory Use (GB) = " + str(shape_data * 8e-9))
-print("PreLoad Memory Use (GB) = " + str(shape_preloads * 8e-9))
-print("Total Memory Use (GB) = " + str(total_shape * 8e-9))
-print()
-
-# Only delete this if the memory use looks... Okay
-# stop
-
-visibilities = al.visibilities.ones(shape_1d=(total_visibilities,))
-uv_wavelengths = np.ones(shape=(total_visibilities, 2))
-noise_map = al.visibilities.ones(shape_1d=(total_visibilities,))
-
-interferometer = al.interferometer(
-    visibilities=visibilities, noise_map=noise_map, uv_wavelengths=uv_wavelengths
-)
-
-print("Real space sub grid size = " + str(real_space_sub_size))
-print("Real space circular mask radius = " + str(real_space_radius) + "\n")
+data_resolutions = ["sma"]
 
 lens_galaxy = al.Galaxy(
     redshift=0.5,
@@ -57,58 +39,89 @@ source_galaxy = al.Galaxy(
     ),
 )
 
-real_space_mask = al.mask.circular(
-    shape_2d=real_space_shape_2d,
-    pixel_scales=real_space_pixel_scales,
-    sub_size=real_space_sub_size,
-    radius=real_space_radius,
-)
 
-masked_interferometer = al.masked.interferometer(
-    interferometer=interferometer,
-    real_space_mask=real_space_mask,
-    visibilities_mask=np.full(fill_value=False, shape=total_visibilities),
-)
+def stages_from_data_resolution(data_resolution):
 
-print("Number of points = " + str(masked_interferometer.grid.sub_shape_1d) + "\n")
-print(
-    "Number of visibilities = "
-    + str(masked_interferometer.visibilities.shape_1d)
-    + "\n"
-)
+    visibilities = al.visibilities.ones(shape_1d=(total_visibilities,))
+    uv_wavelengths = np.ones(shape=(total_visibilities, 2))
+    noise_map = al.visibilities.ones(shape_1d=(total_visibilities,))
 
-start_overall = time.time()
+    interferometer = al.interferometer(
+        visibilities=visibilities, noise_map=noise_map, uv_wavelengths=uv_wavelengths
+    )
+
+    real_space_mask = al.mask.circular(
+        shape_2d=real_space_shape_2d,
+        pixel_scales=real_space_pixel_scales,
+        sub_size=real_space_sub_size,
+        radius=real_space_radius,
+    )
 
-tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
+    masked_interferometer = al.masked.interferometer(
+        interferometer=interferometer,
+        real_space_mask=real_space_mask,
+        visibilities_mask=np.full(fill_value=False, shape=total_visibilities),
+    )
 
-start = time.time()
-for i in range(repeats):
-    traced_grid = tracer.traced_grids_of_planes_from_grid(
-        grid=masked_interferometer.grid
-    )[-1]
-diff = time.time() - start
-print("Time to Setup Traced Grid = {}".format(diff / repeats))
+    print("Number of points = " + str(masked_interferometer.grid.sub_shape_1d) + "\n")
+    print(
+        "Number of visibilities = "
+        + str(masked_interferometer.visibilities.shape_1d)
+        + "\n"
+    )
 
-start = time.time()
-for i in range(repeats):
     tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
-    profile_image = tracer.profile_image_from_grid(grid=masked_interferometer.grid)
-diff = time.time() - start
-print("Time to create profile image = {}".format(diff / repeats))
-
-start = time.time()
-for i in range(repeats):
-    visibilities = tracer.profile_visibilities_from_grid_and_transformer(
-        grid=masked_interferometer.grid, transformer=masked_interferometer.transformer
+
+    stages = benchmark.Stages()
+
+    stages.add(
+        name="traced_grid",
+        func=lambda: tracer.traced_grids_of_planes_from_grid(
+            grid=masked_interferometer.grid
+        )[-1],
+    )
+    stages.add(
+        name="profile_image",
+        func=lambda: al.Tracer.from_galaxies(
+            galaxies=[lens_galaxy, source_galaxy]
+        ).profile_image_from_grid(grid=masked_interferometer.grid),
+    )
+    stages.add(
+        name="profile_visibilities",
+        func=lambda: tracer.profile_visibilities_from_grid_and_transformer(
+            grid=masked_interferometer.grid,
+            transformer=masked_interferometer.transformer,
+        ),
+    )
+    stages.add(
+        name="fit",
+        func=lambda: al.fit(
+            masked_dataset=masked_interferometer,
+            tracer=al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy]),
+        ),
     )
-diff = time.time() - start
-print("Time to create profile visibilities = {}".format(diff / repeats))
 
-start = time.time()
-for i in range(repeats):
-    tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
-    al.fit(masked_dataset=masked_interferometer, tracer=tracer)
-diff = time.time() - start
-print("Time to perform complete fit = {}".format(diff / repeats))
+    return stages
+
+
+if __name__ == "__main__":
+
+    print("Data Memory Use (GB) = " + str(8 * total_visibilities * 8e-9))
+    print(
+        "PreLoad Memory Use (GB) = "
+        + str(
+            transformers.preload_memory_from(
+                total_visibilities=total_visibilities, image_pixels=image_pixels
+            )
+        )
+    )
+    print()
+
+    transformers.check_preload_memory(
+        total_visibilities=total_visibilities, image_pixels=image_pixels
+    )
+
+    print("Real space sub grid size = " + str(real_space_sub_size))
+    print("Real space circular mask radius = " + str(real_space_radius) + "\n")
 
-print()
+    benchmark.run_script(module=sys.modules[__name__], repeats=repeats)
@@ -1,37 +1,366 @@
+import cProfile
+import csv
+import functools
+import io
+import json
+import pstats
 import time
+import tracemalloc
 
+import numpy as np
 
-def tick_toc_x1(func):
-    def wrapper():
-        start = time.time()
-        for _ in range(1):
-            func()
+csv_fieldnames = [
+    "name",
+    "repeats",
+    "compile_time",
+    "median",
+    "p95",
+    "mean",
+    "min",
+    "max",
+    "peak_memory",
+]
 
-        diff = time.time() - start
-        print("{}: {}".format(func.__name__, diff / 1.0))
 
-    return wrapper
+class StageTimings(object):
+    def __init__(self, name, labels=None):
+        """The timings of a named stage of a calculation, which are aggregated over every call of that stage.
 
+        The first call of a stage which uses numba functions includes their JIT compilation, which is stored
+        separately as the 'compile_time' so that it does not contaminate the steady-state timings.
 
-def tick_toc_x10(func):
-    def wrapper():
-        start = time.time()
-        for _ in range(10):
-            func()
+        Parameters
+        ----------
+        name : str
+            The name of the stage (e.g. 'curvature_matrix').
+        labels : dict
+            Additional labels describing the stage (e.g. {'data_resolution': 'hst'}), which are included when the
+            timings are output.
+        """
+        self.name = name
+        self.labels = labels or {}
+        self.times_ns = []
+        self.compile_time_ns = None
+        self.peak_memory = None
 
-        diff = time.time() - start
-        print("{}: {}".format(func.__name__, diff / 10.0))
+    def add_time(self, time_ns, compile=False):
 
-    return wrapper
+        if compile:
+            self.compile_time_ns = time_ns
+        else:
+            self.times_ns.append(time_ns)
 
+    def add_peak_memory(self, peak_memory):
 
-def tick_toc_x20(func):
-    def wrapper():
-        start = time.time()
-        for _ in range(10):
-            func()
+        if self.peak_memory is None or peak_memory > self.peak_memory:
+            self.peak_memory = peak_memory
 
-        diff = time.time() - start
-        print("{}: {}".format(func.__name__, diff / 20.0))
+    @property
+    def repeats(self):
+        return len(self.times_ns)
 
-    return wrapper
+    @property
+    def times(self):
+        """The steady-state run-time of every call in seconds."""
+        return np.asarray(self.times_ns, dtype="float") * 1.0e-9
+
+    @property
+    def compile_time(self):
+        if self.compile_time_ns is None:
+            return None
+        return self.compile_time_ns * 1.0e-9
+
+    def _statistic(self, func):
+        if len(self.times_ns) == 0:
+            return None
+        return float(func(self.times))
+
+    @property
+    def median(self):
+        return self._statistic(func=np.median)
+
+    @property
+    def p95(self):
+        return self._statistic(func=lambda times: np.percentile(times, 95.0))
+
+    @property
+    def mean(self):
+        return self._statistic(func=np.mean)
+
+    @property
+    def min(self):
+        return self._statistic(func=np.min)
+
+    @property
+    def max(self):
+        return self._statistic(func=np.max)
+
+    def as_dict(self):
+        return {
+            **self.labels,
+            "name": self.name,
+            "repeats": self.repeats,
+            "compile_time": self.compile_time,
+            "median": self.median,
+            "p95": self.p95,
+            "mean": self.mean,
+            "min": self.min,
+            "max": self.max,
+            "peak_memory": self.peak_memory,
+        }
+
+
+class TimingRegistry(object):
+    def __init__(self):
+        """A registry of the 'StageTimings' of every named stage timed by a 'Timer' or the 'timed' decorator, which
+        aggregates their timings so they can be output together as JSON or CSV."""
+        self.stage_timings = {}
+
+    def stage_timings_from_name(self, name, labels=None):
+
+        key = (name, tuple(sorted((labels or {}).items())))
+
+        if key not in self.stage_timings:
+            self.stage_timings[key] = StageTimings(name=name, labels=labels)
+
+        return self.stage_timings[key]
+
+    def add_time(self, name, time_ns, compile=False, labels=None):
+        self.stage_timings_from_name(name=name, labels=labels).add_time(
+            time_ns=time_ns, compile=compile
+        )
+
+    def add_peak_memory(self, name, peak_memory, labels=None):
+        self.stage_timings_from_name(name=name, labels=labels).add_peak_memory(
+            peak_memory=peak_memory
+        )
+
+    def __iter__(self):
+        return iter(self.stage_timings.values())
+
+    def __len__(self):
+        return len(self.stage_timings)
+
+    def clear(self):
+        self.stage_timings = {}
+
+    def as_dicts(self):
+        return [stage_timings.as_dict() for stage_timings in self]
+
+    def output_to_json(self, file_path, metadata=None):
+
+        with open(file_path, "w") as f:
+            json.dump(
+                {"metadata": metadata or {}, "results": self.as_dicts()}, f, indent=4
+            )
+
+    def output_to_csv(self, file_path):
+
+        label_fieldnames = []
+
+        for stage_timings in self:
+            for label in stage_timings.labels:
+                if label not in label_fieldnames:
+                    label_fieldnames.append(label)
+
+        with open(file_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=label_fieldnames + csv_fieldnames)
+            writer.writeheader()
+            for stage_timings_dict in self.as_dicts():
+                writer.writerow(stage_timings_dict)
+
+
+registry = TimingRegistry()
+
+
+class Timer(object):
+    def __init__(
+        self,
+        name=None,
+        registry=registry,
+        labels=None,
+        compile=False,
+        profile=False,
+        trace_memory=False,
+    ):
+        """Time a block of code using a nanosecond clock, for example:
+
+            with profiling_util.Timer(name="curvature_matrix") as timer:
+                curvature_matrix = ...
+
+            print(timer.time)
+
+        If a name is input, the time is added to the registry under that name.
+
+        Parameters
+        ----------
+        name : str or None
+            The name of the stage the time is added to in the registry.
+        registry : TimingRegistry or None
+            The registry the time is added to.
+        labels : dict
+            Additional labels describing the stage, which are used with the name to group its timings.
+        compile : bool
+            If True, the time is stored as the stage's compile time (e.g. the first call of a numba function) as
+            opposed to a steady-state time.
+        profile : bool
+            If True, the block is profiled with cProfile and the stats are available as 'profile_stats'.
+        trace_memory : bool
+            If True, the peak memory allocated by the block is traced with tracemalloc and stored as 'peak_memory'
+            (in bytes). Memory allocated by numba functions is not visible to tracemalloc.
+        """
+        self.name = name
+        self.registry = registry
+        self.labels = labels
+        self.compile = compile
+        self.profile = profile
+        self.trace_memory = trace_memory
+
+        self.time_ns = None
+        self.peak_memory = None
+        self.profile_stats = None
+
+        self._profiler = None
+        self._start = None
+        self._start_memory = None
+        self._started_tracemalloc = False
+
+    @property
+    def time(self):
+        """The time taken by the block in seconds."""
+        return self.time_ns * 1.0e-9
+
+    def __enter__(self):
+
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            elif hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            self._start_memory = tracemalloc.get_traced_memory()[0]
+
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+        self._start = time.perf_counter_ns()
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+
+        self.time_ns = time.perf_counter_ns() - self._start
+
+        if self.profile:
+            self._profiler.disable()
+            self.profile_stats = pstats.Stats(self._profiler)
+
+        if self.trace_memory:
+            self.peak_memory = tracemalloc.get_traced_memory()[1] - self._start_memory
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+
+        if self.name is not None and self.registry is not None:
+
+            self.registry.add_time(
+                name=self.name,
+                time_ns=self.time_ns,
+                compile=self.compile,
+                labels=self.labels,
+            )
+
+            if self.peak_memory is not None:
+                self.registry.add_peak_memory(
+                    name=self.name, peak_memory=self.peak_memory, labels=self.labels
+                )
+
+        return False
+
+    def profile_summary(self, sort="cumulative", lines=20):
+
+        if self.profile_stats is None:
+            return ""
+
+        stream = io.StringIO()
+        self.profile_stats.stream = stream
+        self.profile_stats.sort_stats(sort).print_stats(lines)
+        return stream.getvalue()
+
+
+def timed(
+    repeats=1,
+    warm_up=0,
+    name=None,
+    registry=registry,
+    labels=None,
+    trace_memory=False,
+    output=True,
+):
+    """Decorator which times a function, replacing the function with one that calls it 'warm_up' times followed by
+    'repeats' times and returns the value of the final call.
+
+    The first warm-up call is stored as the compile time of the stage, so functions using numba can be timed
+    with 'warm_up=1' to separate their JIT compilation from their steady-state run-time:
+
+        @profiling_util.timed(repeats=10, warm_up=1)
+        def curvature_matrix():
+            ...
+
+    Parameters
+    ----------
+    repeats : int
+        The number of times the function is called and timed after its warm-up.
+    warm_up : int
+        The number of times the function is called before it is timed.
+    name : str or None
+        The name of the stage in the registry, which defaults to the function's name.
+    registry : TimingRegistry
+        The registry the timings are added to.
+    labels : dict
+        Additional labels describing the stage.
+    trace_memory : bool
+        If True, the peak memory of the timed calls is traced with tracemalloc.
+    output : bool
+        If True, the median run-time of the function is printed.
+    """
+
+    def decorator(func):
+
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+
+            value = None
+
+            for i in range(warm_up):
+                with Timer(
+                    name=stage_name if i == 0 else None,
+                    registry=registry,
+                    labels=labels,
+                    compile=True,
+                ):
+                    value = func(*args, **kwargs)
+
+            for i in range(repeats):
+                with Timer(
+                    name=stage_name,
+                    registry=registry,
+                    labels=labels,
+                    trace_memory=trace_memory,
+                ):
+                    value = func(*args, **kwargs)
+
+            if output:
+                stage_timings = registry.stage_timings_from_name(
+                    name=stage_name, labels=labels
+                )
+                print("{}: {}".format(stage_name, stage_timings.median))
+
+            return value
+
+        return wrapper
+
+    return decorator
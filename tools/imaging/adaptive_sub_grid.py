@@ -0,0 +1,253 @@
+"""
+Evaluate a light profile image with an adaptive sub-grid, which only sub-samples the pixels where sub-sampling changes
+their value.
+
+A masked imaging dataset evaluates light profiles on a uniform sub-grid (sub_size=2 in the pipelines, 4 in profiling),
+thus every pixel of the mask pays for sub-sampling that only matters where the image is steep or strongly curved
+(e.g. the centre of the lens galaxy and the lensed source's arcs). 'AdaptiveSubGrid' instead:
+
+1) Evaluates the image at sub_size=1 in the mask and a one pixel border around it.
+2) Estimates the error of every pixel's sub_size=1 value from the discrete Laplacian of this image (the error of a
+   pixel's centre value relative to its mean over the pixel is ~ pixel_scale^2 / 24 x the Laplacian), and flags the
+   pixels whose estimated error, or that of a neighboring pixel, exceeds the tolerance.
+3) Re-evaluates the flagged pixels at the next sub_size (2, 4, 8, 16), and keeps refining only those pixels whose
+   value changed by more than the tolerance.
+
+This gives (up to the tolerance) the image of the highest sub_size for close to the cost of sub_size=1, where every
+pixel's value is the mean over its sub-pixels as in the library's binned images.
+"""
+
+import autolens as al
+import numpy as np
+from scipy import ndimage
+
+
+def pixel_centres_from(mask, pixel_scales, origin=(0.0, 0.0)):
+    """The (y,x) centres of the unmasked pixels of a mask, in the 1D ordering of its unmasked pixels."""
+
+    mask = np.asarray(mask, dtype="bool")
+
+    rows, columns = np.nonzero(~mask)
+
+    return np.stack(
+        (
+            origin[0] + (0.5 * (mask.shape[0] - 1) - rows) * pixel_scales[0],
+            origin[1] + (columns - 0.5 * (mask.shape[1] - 1)) * pixel_scales[1],
+        ),
+        axis=1,
+    )
+
+
+def sub_grid_from(pixel_centres, pixel_scales, sub_size):
+    """The (y,x) sub-grid of the input pixel centres, ordered such that the sub-pixels of every pixel are contiguous
+    and ordered from its top-left sub-pixel, as for the library's sub-grids.
+
+    Parameters
+    ----------
+    pixel_centres : ndarray
+        The (y,x) centres of the pixels, shape (pixels, 2).
+    pixel_scales : (float, float)
+        The (y,x) size of every pixel.
+    sub_size : int
+        The size of the sub-grid of every pixel.
+    """
+
+    offsets = (np.arange(sub_size) + 0.5) / sub_size - 0.5
+
+    y_offsets, x_offsets = np.meshgrid(
+        -offsets * pixel_scales[0], offsets * pixel_scales[1], indexing="ij"
+    )
+
+    offsets = np.stack((y_offsets.ravel(), x_offsets.ravel()), axis=1)
+
+    return (pixel_centres[:, None, :] + offsets[None, :, :]).reshape(-1, 2)
+
+
+def grid_from_coordinates(coordinates, pixel_scales):
+    """A library grid (with sub_size=1) of an ndarray of (y,x) coordinates, which light and mass profiles (and
+    galaxies and tracers) can be evaluated on. Its shape_2d is (points, 1), as the coordinates are irregular.
+    """
+
+    return al.grid.manual_1d(
+        grid=coordinates,
+        shape_2d=(coordinates.shape[0], 1),
+        pixel_scales=pixel_scales,
+        sub_size=1,
+    )
+
+
+class AdaptiveSubGrid(object):
+    def __init__(
+        self,
+        mask,
+        pixel_scales,
+        origin=(0.0, 0.0),
+        sub_sizes=(1, 2, 4, 8, 16),
+        tolerance=1e-4,
+    ):
+        """Evaluate images on a sub-grid which is iteratively refined in the pixels where refinement changes their
+        value.
+
+        Parameters
+        ----------
+        mask : ndarray
+            The 2D mask of the image, where False entries are unmasked.
+        pixel_scales : (float, float)
+            The (y,x) size of every pixel.
+        origin : (float, float)
+            The (y,x) centre of the mask.
+        sub_sizes : (int,)
+            The sub-sizes each refinement evaluates pixels at, starting from the sub-size every pixel is evaluated at.
+        tolerance : float
+            The change in a pixel's value (relative to the maximum absolute value of the sub_size=1 image) above
+            which it is refined to the next sub-size.
+        """
+
+        self.mask = np.asarray(mask, dtype="bool")
+        self.pixel_scales = pixel_scales
+        self.origin = origin
+        self.sub_sizes = sub_sizes
+        self.tolerance = tolerance
+
+        # The border pixels are only evaluated so that the Laplacian of every unmasked pixel has all its neighbors.
+
+        self.border_mask = ~ndimage.binary_dilation(
+            ~self.mask, structure=np.ones(shape=(3, 3), dtype="bool")
+        )
+
+        self.pixel_centres = pixel_centres_from(
+            mask=self.mask, pixel_scales=pixel_scales, origin=origin
+        )
+        self.border_pixel_centres = pixel_centres_from(
+            mask=self.border_mask, pixel_scales=pixel_scales, origin=origin
+        )
+
+        self.pixels = self.pixel_centres.shape[0]
+
+        self.sub_size_for_pixel = None
+        self.evaluations = 0
+
+    @classmethod
+    def from_mask(cls, mask, sub_sizes=(1, 2, 4, 8, 16), tolerance=1e-4):
+        """Setup the adaptive sub-grid of a mask, using its pixel scales and origin."""
+
+        return AdaptiveSubGrid(
+            mask=mask,
+            pixel_scales=mask.pixel_scales,
+            origin=mask.origin,
+            sub_sizes=sub_sizes,
+            tolerance=tolerance,
+        )
+
+    @property
+    def uniform_evaluations(self):
+        """The number of evaluations of a uniform sub-grid of the highest sub-size."""
+        return self.pixels * self.sub_sizes[-1] ** 2
+
+    def image_from_sub_size(self, func, pixel_centres, sub_size):
+        """The binned image of the input pixels, evaluated by func on a uniform sub-grid of the input sub-size."""
+
+        self.evaluations += pixel_centres.shape[0] * sub_size**2
+
+        sub_image = np.asarray(
+            func(
+                sub_grid_from(
+                    pixel_centres=pixel_centres,
+                    pixel_scales=self.pixel_scales,
+                    sub_size=sub_size,
+                )
+            )
+        )
+
+        return np.mean(sub_image.reshape(-1, sub_size**2), axis=1)
+
+    def laplacian_errors_from(self, border_image):
+        """The estimated error of every unmasked pixel's value at sub_size=1, from the 5 point Laplacian of the
+        image in the mask and its border."""
+
+        image_2d = np.zeros(shape=self.mask.shape)
+        image_2d[~self.border_mask] = border_image
+
+        laplacian = ndimage.convolve(
+            image_2d,
+            np.array([[0.0, 1.0, 0.0], [1.0, -4.0, 1.0], [0.0, 1.0, 0.0]]),
+            mode="nearest",
+        )
+
+        return np.abs(laplacian[~self.mask]) / 24.0
+
+    def image_from_func(self, func):
+        """The 1D image of the unmasked pixels, where every pixel is the mean of func over its adaptive sub-grid.
+
+        Parameters
+        ----------
+        func : callable
+            A function which returns the values (e.g. light profile intensities) of an ndarray of (y,x) coordinates
+            of shape (points, 2). Library profiles must be evaluated on these coordinates as a library grid, see
+            'grid_from_coordinates' and 'image_from_tracer'.
+        """
+
+        self.evaluations = 0
+
+        border_image = self.image_from_sub_size(
+            func=func,
+            pixel_centres=self.border_pixel_centres,
+            sub_size=self.sub_sizes[0],
+        )
+
+        is_pixel = ~self.mask[~self.border_mask]
+        image = border_image[is_pixel]
+
+        tolerance = self.tolerance * np.max(np.abs(image))
+
+        self.sub_size_for_pixel = np.full(
+            fill_value=self.sub_sizes[0], shape=self.pixels, dtype="int"
+        )
+
+        # Features narrower than a pixel can be missed by the Laplacian of their own pixel, thus the neighbors of
+        # every pixel with a large error are also refined.
+
+        refine_2d = np.zeros(shape=self.mask.shape, dtype="bool")
+        refine_2d[~self.mask] = (
+            self.laplacian_errors_from(border_image=border_image) > tolerance
+        )
+        refine_2d = ndimage.binary_dilation(
+            refine_2d, structure=np.ones(shape=(3, 3), dtype="bool")
+        )
+
+        refine_indexes = np.nonzero(refine_2d[~self.mask])[0]
+
+        for sub_size in self.sub_sizes[1:]:
+
+            if refine_indexes.shape[0] == 0:
+                break
+
+            refined_image = self.image_from_sub_size(
+                func=func,
+                pixel_centres=self.pixel_centres[refine_indexes],
+                sub_size=sub_size,
+            )
+
+            changed = np.abs(refined_image - image[refine_indexes]) > tolerance
+
+            image[refine_indexes] = refined_image
+            self.sub_size_for_pixel[refine_indexes] = sub_size
+
+            refine_indexes = refine_indexes[changed]
+
+        return image
+
+    def image_from_tracer(self, tracer):
+        """The 1D image of the unmasked pixels of a tracer (or galaxy, or light profile), evaluated on the adaptive
+        sub-grid, whose coordinates of every refinement are passed to it as a library grid.
+        """
+
+        return self.image_from_func(
+            func=lambda coordinates: np.asarray(
+                tracer.profile_image_from_grid(
+                    grid=grid_from_coordinates(
+                        coordinates=coordinates, pixel_scales=self.pixel_scales
+                    )
+                )
+            ).ravel()
+        )
@@ -0,0 +1,379 @@
+"""
+Convolve masked images and mapping matrices with a PSF via FFTs or separable 1D passes, for PSFs too large for
+real-space convolution.
+
+The convolver of a masked imaging dataset convolves in real-space, thus its run-time scales with the area of the PSF
+kernel. For high resolution (e.g. HST, AO) data with 21x21 - 41x41 kernels this dominates a fit. 'ConvolverFFT'
+instead embeds the masked image (and its blurring image) in the bounding box of the mask, multiplies its real FFT with
+a cached real FFT of the zero-padded kernel and extracts the unmasked pixels, whose cost does not depend on the
+kernel size.
+
+Real-space convolution remains faster for small kernels or masks which only fill a small fraction of their bounding
+box, thus the convolver chooses between the two from their estimated costs. The real-space convolution is performed
+with the sparse blurring matrices of 'tools/inversion/sparse_util.py'. Both give the same result as the library's
+convolver, where only light blurred into unmasked pixels is kept.
+
+'ConvolverSeparable' instead decomposes the kernel via an SVD into a few separable rank-1 terms, each of which is
+applied as a 1D convolution along the y axis followed by one along the x axis. This reduces the cost per pixel from
+O(kernel_size^2) to O(rank x kernel_size), with a truncation error that is reported and set by the rank.
+"""
+
+import numpy as np
+from scipy import fft
+from scipy import linalg
+from scipy import ndimage
+
+from tools.inversion import sparse_util
+
+
+def blurring_mask_from(mask, kernel_shape_2d):
+    """The mask of pixels outside the input mask whose light is blurred into it by a kernel of the input shape, where
+    (as for the mask) False entries are unmasked."""
+
+    unmasked = ndimage.binary_dilation(
+        ~np.asarray(mask, dtype="bool"),
+        structure=np.ones(shape=kernel_shape_2d, dtype="bool"),
+    )
+
+    return ~(unmasked & np.asarray(mask, dtype="bool"))
+
+
+def direct_cost_from(unmasked_pixels, kernel):
+    """The estimated cost of convolving an image in real-space, one operation per pixel per non-zero kernel value."""
+    return unmasked_pixels * np.count_nonzero(kernel)
+
+
+def fft_cost_from(fft_shape_2d):
+    """The estimated cost of convolving an image via real FFTs of the input shape."""
+    fft_pixels = fft_shape_2d[0] * fft_shape_2d[1]
+    return fft_pixels * np.log2(fft_pixels)
+
+
+class AbstractConvolver(object):
+    def __init__(self, mask, kernel, chunk_size=100):
+        """Convolve the images and mapping matrices of a masked imaging dataset with a PSF kernel, by embedding them in
+        the bounding box of the mask and its blurring mask.
+
+        Parameters
+        ----------
+        mask : ndarray
+            The 2D mask, where True entries are masked and unmasked pixels are indexed in row-major order.
+        kernel : ndarray
+            The 2D PSF kernel, whose central pixel is at index (shape[0] // 2, shape[1] // 2).
+        chunk_size : int
+            The number of mapping matrix columns convolved in every batch, which sets their memory use.
+        """
+        self.mask = np.asarray(mask, dtype="bool")
+        self.kernel = np.asarray(kernel, dtype="float64")
+        self.chunk_size = chunk_size
+
+        self.blurring_mask = blurring_mask_from(
+            mask=self.mask, kernel_shape_2d=self.kernel.shape
+        )
+
+        self.image_pixels_2d = np.nonzero(~self.mask)
+        self.blurring_pixels_2d = np.nonzero(~self.blurring_mask)
+
+        # The bounding box of the unmasked and blurring pixels, which every image is embedded in.
+
+        region_y, region_x = np.nonzero(~(self.mask & self.blurring_mask))
+
+        self.region_origin = (np.min(region_y), np.min(region_x))
+        self.region_shape_2d = (
+            np.max(region_y) - self.region_origin[0] + 1,
+            np.max(region_x) - self.region_origin[1] + 1,
+        )
+
+    def region_images_from(self, images, pixels_2d):
+        """Embed 1D images of shape (total_images, pixels) in the bounding box of the mask."""
+
+        region_images = np.zeros(shape=(images.shape[0],) + self.region_shape_2d)
+        region_images[
+            :,
+            pixels_2d[0] - self.region_origin[0],
+            pixels_2d[1] - self.region_origin[1],
+        ] = images
+
+        return region_images
+
+    def convolved_images_from(self, region_images):
+        """Convolve images embedded in the bounding box of the mask with the kernel, and return the values of the
+        convolved images in the unmasked pixels, shape (total_images, unmasked_pixels).
+        """
+        raise NotImplementedError()
+
+    def convolved_image_from_image_and_blurring_image(self, image, blurring_image):
+        """Convolve a 1D image of the unmasked pixels, including the light blurred into them from the 1D blurring
+        image of the pixels in the blurring mask."""
+
+        region_images = self.region_images_from(
+            images=np.asarray(image, dtype="float64")[None, :],
+            pixels_2d=self.image_pixels_2d,
+        ) + self.region_images_from(
+            images=np.asarray(blurring_image, dtype="float64")[None, :],
+            pixels_2d=self.blurring_pixels_2d,
+        )
+
+        return self.convolved_images_from(region_images=region_images)[0]
+
+    def convolve_mapping_matrix(self, mapping_matrix):
+        """Convolve every column of a mapping matrix of shape (unmasked_pixels, source_pixels), where light blurred
+        outside the mask is discarded."""
+
+        mapping_matrix = np.asarray(mapping_matrix, dtype="float64")
+
+        blurred_mapping_matrix = np.zeros(shape=mapping_matrix.shape)
+
+        for start in range(0, mapping_matrix.shape[1], self.chunk_size):
+
+            end = min(start + self.chunk_size, mapping_matrix.shape[1])
+
+            region_images = self.region_images_from(
+                images=mapping_matrix[:, start:end].T, pixels_2d=self.image_pixels_2d
+            )
+
+            blurred_mapping_matrix[:, start:end] = self.convolved_images_from(
+                region_images=region_images
+            ).T
+
+        return blurred_mapping_matrix
+
+
+class ConvolverFFT(AbstractConvolver):
+    def __init__(
+        self, mask, kernel, method="auto", fft_cost_factor=2.0, chunk_size=100
+    ):
+        """Convolve the images and mapping matrices of a masked imaging dataset with a PSF kernel, either in real-space
+        or via FFTs.
+
+        Parameters
+        ----------
+        mask : ndarray
+            The 2D mask, where True entries are masked and unmasked pixels are indexed in row-major order.
+        kernel : ndarray
+            The 2D PSF kernel, whose central pixel is at index (shape[0] // 2, shape[1] // 2).
+        method : str
+            'direct' for real-space convolution, 'fft' for FFT convolution or 'auto' to choose the cheaper of the two.
+        fft_cost_factor : float
+            The factor the estimated FFT cost is multiplied by when choosing the method, which accounts for the FFTs
+            having more work per operation than real-space convolution.
+        chunk_size : int
+            The number of mapping matrix columns convolved in every batch of FFTs, which sets their memory use.
+        """
+
+        super(ConvolverFFT, self).__init__(
+            mask=mask, kernel=kernel, chunk_size=chunk_size
+        )
+
+        self.fft_shape_2d = tuple(
+            fft.next_fast_len(region_size + kernel_size - 1, real=True)
+            for region_size, kernel_size in zip(self.region_shape_2d, self.kernel.shape)
+        )
+
+        if method == "auto":
+            if direct_cost_from(
+                unmasked_pixels=self.image_pixels_2d[0].shape[0], kernel=self.kernel
+            ) > fft_cost_factor * fft_cost_from(fft_shape_2d=self.fft_shape_2d):
+                method = "fft"
+            else:
+                method = "direct"
+
+        if method not in ["direct", "fft"]:
+            raise ValueError(
+                "The convolution method {} is not 'auto', 'direct' or 'fft'".format(
+                    method
+                )
+            )
+
+        self.method = method
+
+        if method == "fft":
+            self.kernel_fft = fft.rfft2(self.kernel, s=self.fft_shape_2d)
+        else:
+            self.blurring_matrix, self.blurring_region_matrix = self.blurring_matrices
+
+    @classmethod
+    def from_masked_imaging(cls, masked_imaging, method="auto", chunk_size=100):
+        return ConvolverFFT(
+            mask=masked_imaging.mask,
+            kernel=masked_imaging.psf.in_2d,
+            method=method,
+            chunk_size=chunk_size,
+        )
+
+    @property
+    def blurring_matrices(self):
+        """The sparse matrices which convolve the 1D unmasked image and 1D blurring image into the unmasked pixels."""
+
+        region_mask = self.mask & self.blurring_mask
+
+        blurring_matrix = sparse_util.sparse_blurring_matrix_from(
+            mask=region_mask, kernel=self.kernel
+        )
+
+        region_is_image = ~self.mask[~region_mask]
+
+        blurring_matrix = blurring_matrix[region_is_image]
+
+        return (
+            blurring_matrix[:, region_is_image].tocsr(),
+            blurring_matrix[:, ~region_is_image].tocsr(),
+        )
+
+    def convolved_images_from(self, region_images):
+
+        convolved_images = fft.irfft2(
+            fft.rfft2(region_images, s=self.fft_shape_2d, workers=-1) * self.kernel_fft,
+            s=self.fft_shape_2d,
+            workers=-1,
+        )
+
+        return convolved_images[
+            :,
+            self.image_pixels_2d[0] - self.region_origin[0] + self.kernel.shape[0] // 2,
+            self.image_pixels_2d[1] - self.region_origin[1] + self.kernel.shape[1] // 2,
+        ]
+
+    def convolved_image_from_image_and_blurring_image(self, image, blurring_image):
+
+        if self.method == "direct":
+            return self.blurring_matrix.dot(
+                np.asarray(image, dtype="float64")
+            ) + self.blurring_region_matrix.dot(
+                np.asarray(blurring_image, dtype="float64")
+            )
+
+        return super(ConvolverFFT, self).convolved_image_from_image_and_blurring_image(
+            image=image, blurring_image=blurring_image
+        )
+
+    def convolve_mapping_matrix(self, mapping_matrix):
+
+        if self.method == "direct":
+            return np.asarray(
+                self.blurring_matrix.dot(np.asarray(mapping_matrix, dtype="float64"))
+            )
+
+        return super(ConvolverFFT, self).convolve_mapping_matrix(
+            mapping_matrix=mapping_matrix
+        )
+
+
+def separable_terms_from(kernel, rank=None, tolerance=1e-3):
+    """Decompose a 2D kernel via an SVD into rank-1 terms, kernel ~ sum_i outer(y_kernels[i], x_kernels[i]).
+
+    The truncation error is the Frobenius norm of the kernel minus its decomposition, relative to the Frobenius norm
+    of the kernel.
+
+    Parameters
+    ----------
+    kernel : ndarray
+        The 2D PSF kernel.
+    rank : int or None
+        The number of rank-1 terms. If None, the lowest rank whose truncation error is below the tolerance is used.
+    tolerance : float
+        The maximum truncation error if the rank is not input.
+
+    Returns
+    -------
+    y_kernels : ndarray
+        The 1D kernels of every term along the y axis, shape (rank, kernel_shape_2d[0]).
+    x_kernels : ndarray
+        The 1D kernels of every term along the x axis, shape (rank, kernel_shape_2d[1]).
+    truncation_error : float
+        The relative truncation error of the decomposition.
+    """
+
+    u, singular_values, vt = linalg.svd(np.asarray(kernel, dtype="float64"))
+
+    truncation_errors = np.sqrt(
+        np.maximum(
+            1.0 - np.cumsum(singular_values**2.0) / np.sum(singular_values**2.0), 0.0
+        )
+    )
+
+    if rank is None:
+        rank = int(np.argmax(truncation_errors <= tolerance)) + 1
+        if truncation_errors[rank - 1] > tolerance:
+            rank = singular_values.shape[0]
+
+    rank = min(rank, singular_values.shape[0])
+
+    y_kernels = (u[:, :rank] * np.sqrt(singular_values[:rank])).T
+    x_kernels = vt[:rank] * np.sqrt(singular_values[:rank])[:, None]
+
+    return y_kernels, x_kernels, truncation_errors[rank - 1]
+
+
+class ConvolverSeparable(AbstractConvolver):
+    def __init__(self, mask, kernel, rank=None, tolerance=1e-3, chunk_size=100):
+        """Convolve the images and mapping matrices of a masked imaging dataset with a PSF kernel decomposed into
+        separable rank-1 terms, each applied as a pair of 1D convolutions.
+
+        Parameters
+        ----------
+        mask : ndarray
+            The 2D mask, where True entries are masked and unmasked pixels are indexed in row-major order.
+        kernel : ndarray
+            The 2D PSF kernel, whose central pixel is at index (shape[0] // 2, shape[1] // 2).
+        rank : int or None
+            The number of rank-1 terms. If None, the lowest rank whose truncation error is below the tolerance is used.
+        tolerance : float
+            The maximum relative truncation error of the decomposition if the rank is not input.
+        chunk_size : int
+            The number of mapping matrix columns convolved in every batch, which sets their memory use.
+        """
+
+        super(ConvolverSeparable, self).__init__(
+            mask=mask, kernel=kernel, chunk_size=chunk_size
+        )
+
+        self.y_kernels, self.x_kernels, self.truncation_error = separable_terms_from(
+            kernel=self.kernel, rank=rank, tolerance=tolerance
+        )
+
+    @classmethod
+    def from_masked_imaging(cls, masked_imaging, rank=None, tolerance=1e-3):
+        return ConvolverSeparable(
+            mask=masked_imaging.mask,
+            kernel=masked_imaging.psf.in_2d,
+            rank=rank,
+            tolerance=tolerance,
+        )
+
+    @property
+    def rank(self):
+        return self.y_kernels.shape[0]
+
+    def convolved_images_from(self, region_images):
+
+        convolved_images = np.zeros(shape=region_images.shape)
+
+        for y_kernel, x_kernel in zip(self.y_kernels, self.x_kernels):
+            convolved_images += convolved_1d_from(
+                images=convolved_1d_from(images=region_images, kernel=y_kernel, axis=1),
+                kernel=x_kernel,
+                axis=2,
+            )
+
+        return convolved_images[
+            :,
+            self.image_pixels_2d[0] - self.region_origin[0],
+            self.image_pixels_2d[1] - self.region_origin[1],
+        ]
+
+
+def convolved_1d_from(images, kernel, axis):
+    """Convolve images along one axis with a 1D kernel whose central pixel is at index kernel.shape[0] // 2, treating
+    pixels outside the images as zero."""
+
+    kernel = kernel[::-1]
+
+    return ndimage.correlate1d(
+        images,
+        weights=kernel,
+        axis=axis,
+        mode="constant",
+        cval=0.0,
+        origin=(kernel.shape[0] - 1) // 2 - kernel.shape[0] // 2,
+    )
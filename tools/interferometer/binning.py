@@ -0,0 +1,262 @@
+"""
+Compress an interferometer dataset by binning its visibilities onto a lattice of cells in the uv-plane.
+
+The run-time of an interferometer fit scales with the number of visibilities, many of which sample near-identical
+(u,v) coordinates (e.g. adjacent integrations and channels of the same baseline). Binning replaces all visibilities
+in a uv-cell with their inverse-variance weighted mean, whose noise is propagated from the noise-map, such that the
+early phases of a pipeline can fit a compressed dataset and only the final phase fits every visibility.
+
+Binning a visibility to the weighted mean (u,v) coordinate of its cell introduces a phase error for emission away from
+the phase centre, which decorrelates (reduces the amplitude of) the binned visibilities of emission at the edge of the
+real-space mask. The cell size is therefore chosen from the radius of the real-space mask and a maximum phase error,
+and the decorrelation is reported after binning.
+"""
+
+import numpy as np
+
+radians_per_arcsec = np.pi / 648000.0
+
+
+def cell_size_from(real_space_radius, max_phase_error=0.1):
+    """The size of a uv-cell in wavelengths, such that the phase of emission at the input real-space radius changes
+    by at most 'max_phase_error' radians across half the cell.
+
+    Parameters
+    ----------
+    real_space_radius : float
+        The radius of the real-space mask in arc-seconds.
+    max_phase_error : float
+        The maximum phase error in radians of a visibility binned to the centre of its cell.
+    """
+    return max_phase_error / (np.pi * real_space_radius * radians_per_arcsec)
+
+
+def hermitian_folded_from(visibilities, uv_wavelengths):
+    """Fold every visibility onto the half of the uv-plane with v >= 0, using V(-u,-v) = V*(u,v) for the visibilities
+    of a real image, such that visibilities measured at (u,v) and (-u,-v) are binned together.
+    """
+
+    visibilities = np.array(visibilities, dtype="float64")
+    uv_wavelengths = np.array(uv_wavelengths, dtype="float64")
+
+    flip = (uv_wavelengths[:, 1] < 0.0) | (
+        (uv_wavelengths[:, 1] == 0.0) & (uv_wavelengths[:, 0] < 0.0)
+    )
+
+    uv_wavelengths[flip] *= -1.0
+    visibilities[flip, 1] *= -1.0
+
+    return visibilities, uv_wavelengths
+
+
+class BinnedVisibilities(object):
+    def __init__(
+        self,
+        visibilities,
+        noise_map,
+        uv_wavelengths,
+        bin_indexes,
+        raw_uv_wavelengths,
+        raw_weights,
+    ):
+        """The visibilities, noise-map and uv-wavelengths of a binned interferometer dataset.
+
+        Parameters
+        ----------
+        visibilities : ndarray
+            The real and imaginary binned visibilities, shape (total_bins, 2).
+        noise_map : ndarray
+            The real and imaginary noise-map values of the binned visibilities, shape (total_bins, 2).
+        uv_wavelengths : ndarray
+            The weighted mean (u,v) coordinates of every bin in wavelengths, shape (total_bins, 2).
+        bin_indexes : ndarray
+            The index of the bin every raw visibility is binned into.
+        raw_uv_wavelengths : ndarray
+            The (hermitian folded) (u,v) coordinates of every raw visibility.
+        raw_weights : ndarray
+            The weight of every raw visibility in the weighted mean (u,v) coordinate of its bin.
+        """
+        self.visibilities = visibilities
+        self.noise_map = noise_map
+        self.uv_wavelengths = uv_wavelengths
+        self.bin_indexes = bin_indexes
+        self.raw_uv_wavelengths = raw_uv_wavelengths
+        self.raw_weights = raw_weights
+
+    @property
+    def total_raw_visibilities(self):
+        return self.bin_indexes.shape[0]
+
+    @property
+    def total_binned_visibilities(self):
+        return self.visibilities.shape[0]
+
+    @property
+    def compression(self):
+        return self.total_raw_visibilities / self.total_binned_visibilities
+
+    @property
+    def max_uv_offset(self):
+        """The largest distance in wavelengths between a raw visibility and the (u,v) coordinate of its bin."""
+        offsets = self.raw_uv_wavelengths - self.uv_wavelengths[self.bin_indexes]
+        return np.max(np.sqrt(np.sum(offsets**2.0, axis=1)))
+
+    def decorrelation_from(self, real_space_radius):
+        """The amplitude of the binned visibilities of a point source at the input real-space radius (arc-seconds),
+        relative to their unbinned amplitude, for sources offset along the y and x axes.
+
+        For every bin this is |sum_k w_k exp(2 pi i theta . (uv_k - uv_bin))| / sum_k w_k, which is 1 for no
+        decorrelation. Returns the minimum over all bins and the weighted mean over all raw visibilities, for whichever
+        of the two axes is worse.
+        """
+
+        offsets = self.raw_uv_wavelengths - self.uv_wavelengths[self.bin_indexes]
+
+        total_weights = np.bincount(
+            self.bin_indexes,
+            weights=self.raw_weights,
+            minlength=self.total_binned_visibilities,
+        )
+
+        minimum = 1.0
+        mean = 1.0
+
+        for axis in range(2):
+
+            phases = (
+                2.0 * np.pi * real_space_radius * radians_per_arcsec * offsets[:, axis]
+            )
+
+            real = np.bincount(
+                self.bin_indexes,
+                weights=self.raw_weights * np.cos(phases),
+                minlength=self.total_binned_visibilities,
+            )
+            imag = np.bincount(
+                self.bin_indexes,
+                weights=self.raw_weights * np.sin(phases),
+                minlength=self.total_binned_visibilities,
+            )
+
+            decorrelation = np.sqrt(real**2.0 + imag**2.0) / total_weights
+
+            minimum = min(minimum, np.min(decorrelation))
+            mean = min(
+                mean, np.sum(decorrelation * total_weights) / np.sum(total_weights)
+            )
+
+        return minimum, mean
+
+    def report_from(self, real_space_radius):
+        """A summary of the compression of the binned dataset and the information lost binning it, for emission
+        within the input real-space radius (arc-seconds)."""
+
+        minimum_decorrelation, mean_decorrelation = self.decorrelation_from(
+            real_space_radius=real_space_radius
+        )
+
+        return "\n".join(
+            [
+                "Raw visibilities = {}".format(self.total_raw_visibilities),
+                "Binned visibilities = {}".format(self.total_binned_visibilities),
+                "Compression = {:.2f}".format(self.compression),
+                "Maximum uv offset from bin centre (wavelengths) = {:.2f}".format(
+                    self.max_uv_offset
+                ),
+                'Minimum amplitude at radius {}" = {:.5f}'.format(
+                    real_space_radius, minimum_decorrelation
+                ),
+                'Mean amplitude at radius {}" = {:.5f}'.format(
+                    real_space_radius, mean_decorrelation
+                ),
+            ]
+        )
+
+
+def binned_visibilities_from(
+    visibilities, noise_map, uv_wavelengths, cell_size, hermitian=True
+):
+    """Bin the visibilities of an interferometer dataset onto a lattice of uv-cells of the input size.
+
+    The real and imaginary components of every bin are the inverse-variance weighted means of the visibilities in
+    its cell, with noise-map values 1 / sqrt(sum of inverse variances). The (u,v) coordinate of every bin is the
+    weighted mean of its visibilities' coordinates.
+
+    Parameters
+    ----------
+    visibilities : ndarray
+        The real and imaginary visibilities, shape (total_visibilities, 2).
+    noise_map : ndarray
+        The real and imaginary noise-map values, shape (total_visibilities, 2).
+    uv_wavelengths : ndarray
+        The (u,v) coordinates of every visibility in wavelengths, shape (total_visibilities, 2).
+    cell_size : float
+        The size of every uv-cell in wavelengths (see 'cell_size_from').
+    hermitian : bool
+        If True, visibilities are folded onto the v >= 0 half of the uv-plane before binning.
+    """
+
+    noise_map = np.asarray(noise_map, dtype="float64")
+
+    if hermitian:
+        visibilities, uv_wavelengths = hermitian_folded_from(
+            visibilities=visibilities, uv_wavelengths=uv_wavelengths
+        )
+    else:
+        visibilities = np.asarray(visibilities, dtype="float64")
+        uv_wavelengths = np.asarray(uv_wavelengths, dtype="float64")
+
+    cells = np.floor(uv_wavelengths / cell_size).astype("int64")
+
+    _, bin_indexes = np.unique(cells, axis=0, return_inverse=True)
+    bin_indexes = bin_indexes.reshape(-1)
+
+    total_bins = np.max(bin_indexes) + 1
+
+    weights = 1.0 / noise_map**2.0
+
+    binned_visibilities = np.zeros(shape=(total_bins, 2))
+    binned_noise_map = np.zeros(shape=(total_bins, 2))
+
+    for component in range(2):
+
+        total_weights = np.bincount(
+            bin_indexes, weights=weights[:, component], minlength=total_bins
+        )
+
+        binned_visibilities[:, component] = (
+            np.bincount(
+                bin_indexes,
+                weights=weights[:, component] * visibilities[:, component],
+                minlength=total_bins,
+            )
+            / total_weights
+        )
+        binned_noise_map[:, component] = 1.0 / np.sqrt(total_weights)
+
+    raw_weights = np.sum(weights, axis=1)
+
+    total_raw_weights = np.bincount(
+        bin_indexes, weights=raw_weights, minlength=total_bins
+    )
+
+    binned_uv_wavelengths = np.zeros(shape=(total_bins, 2))
+
+    for axis in range(2):
+        binned_uv_wavelengths[:, axis] = (
+            np.bincount(
+                bin_indexes,
+                weights=raw_weights * uv_wavelengths[:, axis],
+                minlength=total_bins,
+            )
+            / total_raw_weights
+        )
+
+    return BinnedVisibilities(
+        visibilities=binned_visibilities,
+        noise_map=binned_noise_map,
+        uv_wavelengths=binned_uv_wavelengths,
+        bin_indexes=bin_indexes,
+        raw_uv_wavelengths=uv_wavelengths,
+        raw_weights=raw_weights,
+    )
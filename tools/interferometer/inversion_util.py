@@ -0,0 +1,91 @@
+import numpy as np
+
+
+def curvature_matrix_from_transformed_mapping_matrix(
+    transformed_mapping_matrix, noise_map, chunk_size=10000
+):
+    """Compute the curvature matrix F of a transformed mapping matrix and the 1D noise-map of its visibilities
+    (see Warren & Dye 2003), accumulated in float64 irrespective of the precision the transformed mapping matrix is
+    stored in.
+
+    The transformed mapping matrix is converted to float64 one chunk of visibilities at a time, such that a float32
+    transformed mapping matrix is never copied to float64 in full.
+
+    Parameters
+    ----------
+    transformed_mapping_matrix : ndarray
+        The real or imaginary transformed mapping matrix, shape (total_visibilities, source_pixels).
+    noise_map : ndarray
+        The real or imaginary noise-map values of every visibility.
+    chunk_size : int
+        The number of visibilities converted to float64 at once.
+    """
+
+    source_pixels = transformed_mapping_matrix.shape[1]
+
+    curvature_matrix = np.zeros(shape=(source_pixels, source_pixels))
+
+    for vis_1d_start in range(0, transformed_mapping_matrix.shape[0], chunk_size):
+
+        vis_1d_end = vis_1d_start + chunk_size
+
+        weighted_chunk = (
+            np.asarray(
+                transformed_mapping_matrix[vis_1d_start:vis_1d_end], dtype="float64"
+            )
+            / np.asarray(noise_map[vis_1d_start:vis_1d_end], dtype="float64")[:, None]
+        )
+
+        curvature_matrix += np.dot(weighted_chunk.T, weighted_chunk)
+
+    return curvature_matrix
+
+
+def data_vector_from_transformed_mapping_matrix_and_data(
+    transformed_mapping_matrix, visibilities, noise_map, chunk_size=10000
+):
+    """Compute the data vector D of a transformed mapping matrix and the 1D visibilities and noise-map, accumulated
+    in float64 irrespective of the precision the transformed mapping matrix is stored in.
+    """
+
+    data_vector = np.zeros(shape=transformed_mapping_matrix.shape[1])
+
+    for vis_1d_start in range(0, transformed_mapping_matrix.shape[0], chunk_size):
+
+        vis_1d_end = vis_1d_start + chunk_size
+
+        data_vector += np.dot(
+            np.asarray(visibilities[vis_1d_start:vis_1d_end], dtype="float64")
+            / np.asarray(noise_map[vis_1d_start:vis_1d_end], dtype="float64") ** 2,
+            np.asarray(
+                transformed_mapping_matrix[vis_1d_start:vis_1d_end], dtype="float64"
+            ),
+        )
+
+    return data_vector
+
+
+def mapped_reconstructed_visibilities_from(
+    transformed_mapping_matrix, reconstruction, chunk_size=10000
+):
+    """Compute the reconstructed visibilities of an inversion in float64, converting the transformed mapping matrix
+    one chunk of visibilities at a time."""
+
+    reconstruction = np.asarray(reconstruction, dtype="float64")
+
+    mapped_reconstructed_visibilities = np.zeros(
+        shape=transformed_mapping_matrix.shape[0]
+    )
+
+    for vis_1d_start in range(0, transformed_mapping_matrix.shape[0], chunk_size):
+
+        vis_1d_end = vis_1d_start + chunk_size
+
+        mapped_reconstructed_visibilities[vis_1d_start:vis_1d_end] = np.dot(
+            np.asarray(
+                transformed_mapping_matrix[vis_1d_start:vis_1d_end], dtype="float64"
+            ),
+            reconstruction,
+        )
+
+    return mapped_reconstructed_visibilities
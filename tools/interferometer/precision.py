@@ -0,0 +1,232 @@
+import autofit as af
+import autolens as al
+import numpy as np
+
+import os
+import time
+
+from tools.interferometer import inversion_util
+from tools.interferometer import transformers
+
+# This tool checks the error that storing the transforms and transformed mapping matrices of an interferometer fit in
+# single precision (float32) introduces in its likelihood, compared to double precision (float64). In single precision
+# the curvature matrix, data vector and likelihood are still accumulated in float64 (see
+# 'tools/interferometer/inversion_util.py').
+
+# Setup the path to the autolens_workspace, using a relative directory name.
+workspace_path = "{}/../../".format(os.path.dirname(os.path.realpath(__file__)))
+
+# Use this path to explicitly set the config path and output path.
+af.conf.instance = af.conf.Config(
+    config_path=workspace_path + "config", output_path=workspace_path + "output"
+)
+
+dataset_label = "interferometer"
+dataset_name = "lens_sie__source_sersic"
+
+real_space_shape_2d = (151, 151)
+real_space_pixel_scales = 0.1
+real_space_radius = 3.0
+
+pixelization_shape_2d = (30, 30)
+
+dataset_path = af.path_util.make_and_return_path_from_path_and_folder_names(
+    path=workspace_path, folder_names=["dataset", dataset_label, dataset_name]
+)
+
+interferometer = al.interferometer.from_fits(
+    visibilities_path=dataset_path + "visibilities.fits",
+    noise_map_path=dataset_path + "noise_map.fits",
+    uv_wavelengths_path=dataset_path + "uv_wavelengths.fits",
+)
+
+real_space_mask = al.mask.circular(
+    shape_2d=real_space_shape_2d,
+    pixel_scales=real_space_pixel_scales,
+    radius=real_space_radius,
+)
+
+masked_interferometer = al.masked.interferometer(
+    interferometer=interferometer,
+    visibilities_mask=np.full(
+        fill_value=False, shape=interferometer.visibilities.shape
+    ),
+    real_space_mask=real_space_mask,
+)
+
+print("Number of visibilities = " + str(masked_interferometer.visibilities.shape_1d))
+print("Number of image pixels = " + str(masked_interferometer.grid.shape_1d) + "\n")
+
+lens_galaxy = al.Galaxy(
+    redshift=0.5,
+    mass=al.mp.EllipticalIsothermal(
+        centre=(0.0, 0.0), einstein_radius=1.6, axis_ratio=0.7, phi=45.0
+    ),
+)
+
+light_source_galaxy = al.Galaxy(
+    redshift=1.0,
+    light=al.lp.EllipticalSersic(
+        centre=(0.0, 0.0),
+        axis_ratio=0.8,
+        phi=60.0,
+        intensity=0.4,
+        effective_radius=0.5,
+        sersic_index=1.0,
+    ),
+)
+
+pixelization = al.pix.VoronoiMagnification(shape=pixelization_shape_2d)
+
+visibilities = np.asarray(masked_interferometer.visibilities)
+noise_map = np.asarray(masked_interferometer.noise_map)
+
+noise_normalization = np.sum(np.log(2 * np.pi * noise_map**2.0))
+
+# The profile image and mapper are computed once and shared by both precisions.
+
+profile_image = al.Tracer.from_galaxies(
+    galaxies=[lens_galaxy, light_source_galaxy]
+).profile_image_from_grid(grid=masked_interferometer.grid)
+
+tracer = al.Tracer.from_galaxies(
+    galaxies=[
+        lens_galaxy,
+        al.Galaxy(
+            redshift=1.0,
+            pixelization=pixelization,
+            regularization=al.reg.Constant(coefficient=1.0),
+        ),
+    ]
+)
+
+mapper = pixelization.mapper_from_grid_and_sparse_grid(
+    grid=tracer.traced_grids_of_planes_from_grid(grid=masked_interferometer.grid)[-1],
+    sparse_grid=tracer.traced_sparse_grids_of_planes_from_grid(
+        grid=masked_interferometer.grid
+    )[-1],
+    inversion_uses_border=True,
+)
+
+regularization_matrix = (
+    al.util.regularization.constant_regularization_matrix_from_pixel_neighbors(
+        coefficient=1.0,
+        pixel_neighbors=mapper.pixelization_grid.pixel_neighbors,
+        pixel_neighbors_size=mapper.pixelization_grid.pixel_neighbors_size,
+    )
+)
+
+
+def profile_log_likelihood_from(transformer):
+
+    model_visibilities = np.stack(
+        (
+            transformer.real_visibilities_from_image(image=profile_image),
+            transformer.imag_visibilities_from_image(image=profile_image),
+        ),
+        axis=-1,
+    )
+
+    chi_squared = np.sum(((visibilities - model_visibilities) / noise_map) ** 2.0)
+
+    return -0.5 * (chi_squared + noise_normalization)
+
+
+def inversion_log_evidence_from(transformer):
+
+    transformed_mapping_matrices = (
+        transformer.transformed_mapping_matrices_from_mapping_matrix(
+            mapping_matrix=mapper.mapping_matrix
+        )
+    )
+
+    curvature_matrix = np.zeros(shape=regularization_matrix.shape)
+    data_vector = np.zeros(shape=regularization_matrix.shape[0])
+
+    for index in range(2):
+        curvature_matrix += (
+            inversion_util.curvature_matrix_from_transformed_mapping_matrix(
+                transformed_mapping_matrix=transformed_mapping_matrices[index],
+                noise_map=noise_map[:, index],
+            )
+        )
+        data_vector += (
+            inversion_util.data_vector_from_transformed_mapping_matrix_and_data(
+                transformed_mapping_matrix=transformed_mapping_matrices[index],
+                visibilities=visibilities[:, index],
+                noise_map=noise_map[:, index],
+            )
+        )
+
+    # As in the library's InversionInterferometer, the real and imaginary visibilities are each regularized, thus the
+    # reconstruction solves (F + 2H) s = D whereas the evidence uses log|H| and s^T H s.
+
+    curvature_reg_matrix = curvature_matrix + 2.0 * regularization_matrix
+
+    reconstruction = np.linalg.solve(curvature_reg_matrix, data_vector)
+
+    chi_squared = 0.0
+
+    for index in range(2):
+        mapped_visibilities = inversion_util.mapped_reconstructed_visibilities_from(
+            transformed_mapping_matrix=transformed_mapping_matrices[index],
+            reconstruction=reconstruction,
+        )
+        chi_squared += np.sum(
+            ((visibilities[:, index] - mapped_visibilities) / noise_map[:, index])
+            ** 2.0
+        )
+
+    regularization_term = np.dot(
+        reconstruction, np.dot(regularization_matrix, reconstruction)
+    )
+
+    return -0.5 * (
+        chi_squared
+        + regularization_term
+        + np.linalg.slogdet(curvature_reg_matrix)[1]
+        - np.linalg.slogdet(regularization_matrix)[1]
+        + noise_normalization
+    )
+
+
+results = {}
+
+for precision in ["double", "single"]:
+
+    transformer = transformers.TransformerChunked(
+        uv_wavelengths=masked_interferometer.uv_wavelengths,
+        grid_radians=masked_interferometer.grid.in_radians.in_1d_binned,
+        precision=precision,
+    )
+
+    start = time.time()
+    profile_log_likelihood = profile_log_likelihood_from(transformer=transformer)
+    profile_time = time.time() - start
+
+    start = time.time()
+    inversion_log_evidence = inversion_log_evidence_from(transformer=transformer)
+    inversion_time = time.time() - start
+
+    results[precision] = (profile_log_likelihood, inversion_log_evidence)
+
+    print("Precision = " + precision)
+    print("Chunk memory use (GB) = " + str(transformer.chunk_memory))
+    print(
+        "Profile log likelihood = {} ({}s)".format(profile_log_likelihood, profile_time)
+    )
+    print(
+        "Inversion log evidence = {} ({}s)".format(
+            inversion_log_evidence, inversion_time
+        )
+    )
+    print()
+
+print(
+    "Profile log likelihood error (single - double) = ",
+    results["single"][0] - results["double"][0],
+)
+print(
+    "Inversion log evidence error (single - double) = ",
+    results["single"][1] - results["double"][1],
+)
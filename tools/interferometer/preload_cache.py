@@ -0,0 +1,278 @@
+"""
+A persistent on-disk cache of the preloaded real and imaginary transforms of an interferometer dataset.
+
+The preloaded transforms depend only on the uv_wavelengths of the dataset and the real-space grid they transform,
+which are the same for every phase of every pipeline fitting that dataset. The cache stores them in the output
+folder as .npy files in a folder named after a hash of the uv_wavelengths, grid and sub-size, so that every phase,
+pipeline and restart of an analysis fitting the same dataset loads them (memory-mapped) as opposed to recomputing
+them. For example:
+
+    transformer = preload_cache.TransformerCached.from_masked_interferometer(
+        masked_interferometer=masked_interferometer
+    )
+
+Cached preloads are written to a temporary file which is renamed once complete, so an analysis which is interrupted
+mid-write never loads a partially written preload.
+"""
+
+import autofit as af
+import autolens as al
+import numpy as np
+
+import hashlib
+import os
+
+from tools.interferometer import transformer_util
+from tools.interferometer import transformers
+
+
+def preload_hash_from(uv_wavelengths, grid_radians, sub_size, precision="double"):
+    """A hash of the uv-coverage, real-space grid, sub-size and precision that a preload is computed for, which is
+    the name of the folder the preload is cached in."""
+
+    sha = hashlib.sha1()
+
+    for array in (uv_wavelengths, grid_radians):
+        array = np.ascontiguousarray(array, dtype="float64")
+        sha.update(str(array.shape).encode())
+        sha.update(array.tobytes())
+
+    sha.update(str(sub_size).encode())
+    sha.update(precision.encode())
+
+    return sha.hexdigest()
+
+
+def preloads_path_from_config():
+    return "{}/preloads".format(af.conf.instance.output_path)
+
+
+class PreloadCache(object):
+    def __init__(self, path=None):
+        """A folder of cached preloads, where every preload is a memory-mapped .npy file in a sub-folder named after
+        the hash of its inputs.
+
+        Parameters
+        ----------
+        path : str or None
+            The folder preloads are cached in, which defaults to 'preloads' in the output path of the config.
+        """
+        self.path = preloads_path_from_config() if path is None else path
+
+    def file_path_from(self, preload_hash, name):
+        return "{}/{}/{}.npy".format(self.path, preload_hash, name)
+
+    def exists(self, preload_hash, name):
+        return os.path.exists(self.file_path_from(preload_hash=preload_hash, name=name))
+
+    def load(self, preload_hash, name):
+        """Load a cached preload, memory-mapped read-only such that it is only read from disk as it is used."""
+        return np.load(
+            self.file_path_from(preload_hash=preload_hash, name=name), mmap_mode="r"
+        )
+
+    def open_for_write(self, preload_hash, name, shape, dtype="float64"):
+        """Create a memory-mapped .npy file for a preload that is written in-place, returning the array and the
+        temporary path it is written to, which is passed to 'commit' once the preload is complete.
+        """
+
+        file_path = self.file_path_from(preload_hash=preload_hash, name=name)
+
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        temporary_path = "{}.{}.tmp".format(file_path, os.getpid())
+
+        array = np.lib.format.open_memmap(
+            temporary_path, mode="w+", dtype=dtype, shape=shape
+        )
+
+        return array, temporary_path
+
+    def commit(self, preload_hash, name, array, temporary_path):
+
+        array.flush()
+        del array
+
+        os.replace(
+            temporary_path, self.file_path_from(preload_hash=preload_hash, name=name)
+        )
+
+    def preloaded_transforms_from(
+        self,
+        uv_wavelengths,
+        grid_radians,
+        sub_size=1,
+        chunk_size=None,
+        precision=None,
+    ):
+        """The real and imaginary transforms of every visibility and image pixel, each of shape
+        (total_visibilities, image_pixels), loaded from the cache if present and otherwise computed in chunks,
+        written straight to disk and then loaded.
+
+        Parameters
+        ----------
+        uv_wavelengths : ndarray
+            The (u,v) coordinates of every visibility in wavelengths.
+        grid_radians : Grid
+            The binned real-space grid (in radians) that is transformed.
+        sub_size : int
+            The sub-size of the real-space mask, which is included in the hash of the preload.
+        chunk_size : int or None
+            The number of visibilities computed per chunk when the preload is computed, which defaults to the chunk
+            memory limit of the general.ini config.
+        precision : str or None
+            The precision the preload is stored in ('double' or 'single'), which defaults to 'precision' in the
+            [interferometer] section of the general.ini config.
+        """
+        if precision is None:
+            precision = transformers.precision_from_config()
+
+        uv_wavelengths = np.asarray(uv_wavelengths)
+        grid_radians = np.asarray(grid_radians)
+
+        preload_hash = preload_hash_from(
+            uv_wavelengths=uv_wavelengths,
+            grid_radians=grid_radians,
+            sub_size=sub_size,
+            precision=precision,
+        )
+
+        names = ("real_transforms", "imag_transforms")
+
+        if not all(self.exists(preload_hash=preload_hash, name=name) for name in names):
+
+            if chunk_size is None:
+                chunk_size = transformers.chunk_size_from(
+                    image_pixels=grid_radians.shape[0], precision="double"
+                )
+
+            chunk_size = min(chunk_size, uv_wavelengths.shape[0])
+
+            shape = (uv_wavelengths.shape[0], grid_radians.shape[0])
+
+            dtype = transformers.dtype_from_precision[precision]
+
+            real_transforms, real_path = self.open_for_write(
+                preload_hash=preload_hash, name=names[0], shape=shape, dtype=dtype
+            )
+            imag_transforms, imag_path = self.open_for_write(
+                preload_hash=preload_hash, name=names[1], shape=shape, dtype=dtype
+            )
+
+            real_buffer = np.zeros(shape=(chunk_size, grid_radians.shape[0]))
+            imag_buffer = np.zeros(shape=(chunk_size, grid_radians.shape[0]))
+
+            for vis_1d_start in range(0, uv_wavelengths.shape[0], chunk_size):
+
+                total_chunk_visibilities = transformer_util.transforms_of_chunk_jit(
+                    grid_radians=grid_radians,
+                    uv_wavelengths=uv_wavelengths,
+                    vis_1d_start=vis_1d_start,
+                    real_transforms=real_buffer,
+                    imag_transforms=imag_buffer,
+                )
+
+                vis_1d_end = vis_1d_start + total_chunk_visibilities
+
+                real_transforms[vis_1d_start:vis_1d_end] = real_buffer[
+                    :total_chunk_visibilities
+                ]
+                imag_transforms[vis_1d_start:vis_1d_end] = imag_buffer[
+                    :total_chunk_visibilities
+                ]
+
+            self.commit(
+                preload_hash=preload_hash,
+                name=names[0],
+                array=real_transforms,
+                temporary_path=real_path,
+            )
+            self.commit(
+                preload_hash=preload_hash,
+                name=names[1],
+                array=imag_transforms,
+                temporary_path=imag_path,
+            )
+
+        return tuple(self.load(preload_hash=preload_hash, name=name) for name in names)
+
+
+class TransformerCached(object):
+    def __init__(
+        self, uv_wavelengths, grid_radians, sub_size=1, cache=None, precision=None
+    ):
+        """A transformer using preloaded transforms which are loaded from (or computed and written to) a persistent
+        on-disk cache, such that they are computed once for all phases and pipelines fitting the same dataset.
+
+        Parameters
+        ----------
+        uv_wavelengths : ndarray
+            The (u,v) coordinates of every visibility in wavelengths.
+        grid_radians : Grid
+            The binned real-space grid (in radians) that is transformed.
+        sub_size : int
+            The sub-size of the real-space mask, which is included in the hash of the preload.
+        cache : PreloadCache or None
+            The cache the preloads are stored in, which defaults to 'preloads' in the output path of the config.
+        precision : str or None
+            The precision the preloads are stored in ('double' or 'single'), which defaults to 'precision' in the
+            [interferometer] section of the general.ini config. Visibilities are returned in float64.
+        """
+        if precision is None:
+            precision = transformers.precision_from_config()
+
+        self.cache = PreloadCache() if cache is None else cache
+        self.dtype = transformers.dtype_from_precision[precision]
+
+        self.real_transforms, self.imag_transforms = (
+            self.cache.preloaded_transforms_from(
+                uv_wavelengths=uv_wavelengths,
+                grid_radians=grid_radians,
+                sub_size=sub_size,
+                precision=precision,
+            )
+        )
+
+    @classmethod
+    def from_masked_interferometer(
+        cls, masked_interferometer, cache=None, precision=None
+    ):
+        return TransformerCached(
+            uv_wavelengths=masked_interferometer.uv_wavelengths,
+            grid_radians=masked_interferometer.grid.in_radians.in_1d_binned,
+            sub_size=masked_interferometer.grid.sub_size,
+            cache=cache,
+            precision=precision,
+        )
+
+    def image_1d_from(self, image):
+        return transformers.image_1d_from(image=image).astype(self.dtype)
+
+    def real_visibilities_from_image(self, image):
+        return np.dot(self.real_transforms, self.image_1d_from(image=image)).astype(
+            "float64"
+        )
+
+    def imag_visibilities_from_image(self, image):
+        return np.dot(self.imag_transforms, self.image_1d_from(image=image)).astype(
+            "float64"
+        )
+
+    def visibilities_from_image(self, image):
+        return al.visibilities.manual_1d(
+            visibilities=np.stack(
+                (
+                    self.real_visibilities_from_image(image=image),
+                    self.imag_visibilities_from_image(image=image),
+                ),
+                axis=-1,
+            )
+        )
+
+    def transformed_mapping_matrices_from_mapping_matrix(self, mapping_matrix):
+        mapping_matrix = np.asarray(mapping_matrix, dtype=self.dtype)
+
+        return [
+            np.dot(self.real_transforms, mapping_matrix),
+            np.dot(self.imag_transforms, mapping_matrix),
+        ]
@@ -0,0 +1,173 @@
+import numba
+import numpy as np
+
+
+def lattice_from_grid_radians(grid_radians):
+    """For a masked real-space grid (in radians) whose (y,x) coordinates lie on a uniform lattice, compute the 2D
+    lattice index of every coordinate, the shape and pixel scales of the lattice and the (y,x) coordinate of the
+    lattice pixel at index (shape[0] // 2, shape[1] // 2), which is used as the origin of the non-uniform FFT.
+
+    Parameters
+    ----------
+    grid_radians : ndarray
+        The (y,x) coordinates of the real-space grid in radians, shape (total_image_pixels, 2).
+    """
+    grid_radians = np.asarray(grid_radians)
+
+    lattice_indexes = np.zeros(shape=grid_radians.shape, dtype="int")
+    shape = [1, 1]
+    pixel_scales = [1.0, 1.0]
+    centre = [0.0, 0.0]
+
+    for axis in range(2):
+
+        coordinates = grid_radians[:, axis]
+        minimum = np.min(coordinates)
+        extent = np.max(coordinates) - minimum
+
+        if extent > 0.0:
+            differences = np.diff(np.unique(coordinates))
+            pixel_scales[axis] = np.min(differences[differences > 1.0e-6 * extent])
+
+        lattice_indexes[:, axis] = np.round(
+            (coordinates - minimum) / pixel_scales[axis]
+        ).astype("int")
+
+        shape[axis] = int(np.max(lattice_indexes[:, axis])) + 1
+        centre[axis] = minimum + (shape[axis] // 2) * pixel_scales[axis]
+
+    return lattice_indexes, tuple(shape), tuple(pixel_scales), tuple(centre)
+
+
+def kaiser_bessel_beta_from(kernel_width, oversampling_factor):
+    """The shape parameter of the Kaiser-Bessel gridding kernel which minimizes the aliasing error for a given kernel
+    width and oversampling factor (Beatty, Nishimura & Pauly 2005)."""
+    return np.pi * np.sqrt(
+        (kernel_width / oversampling_factor) ** 2 * (oversampling_factor - 0.5) ** 2
+        - 0.8
+    )
+
+
+def kaiser_bessel_kernel_from(distances, kernel_width, beta):
+    """The Kaiser-Bessel gridding kernel evaluated at distances (in oversampled grid cells) from a non-uniform
+    uv-coordinate, which is zero beyond half the kernel width."""
+    argument = 1.0 - (2.0 * distances / kernel_width) ** 2
+    return np.where(
+        argument >= 0.0, np.i0(beta * np.sqrt(np.clip(argument, 0.0, None))), 0.0
+    )
+
+
+def kaiser_bessel_fourier_transform_from(frequencies, kernel_width, beta):
+    """The Fourier transform of the Kaiser-Bessel gridding kernel, which is used to correct the image for the
+    apodization the gridding kernel introduces."""
+    argument = np.sqrt(
+        (beta**2 - (np.pi * kernel_width * frequencies) ** 2).astype("complex")
+    )
+    return np.real(kernel_width * np.sinh(argument) / argument)
+
+
+def oversampled_size_from(size, oversampling_factor, kernel_width):
+    """The size of one dimension of the oversampled FFT grid, which is even and at least as large as the kernel."""
+    oversampled_size = int(np.ceil(oversampling_factor * size))
+    oversampled_size += oversampled_size % 2
+    return max(oversampled_size, 2 * kernel_width)
+
+
+def interpolation_indexes_and_weights_from(
+    frequencies, oversampled_size, kernel_width, beta
+):
+    """For every non-uniform frequency (in cycles per lattice pixel) compute the indexes of the 'kernel_width'
+    oversampled FFT grid cells it is interpolated from and their Kaiser-Bessel kernel weights.
+
+    Parameters
+    ----------
+    frequencies : ndarray
+        The frequency of every visibility along one axis, in cycles per lattice pixel.
+    oversampled_size : int
+        The size of the oversampled FFT grid along this axis.
+    kernel_width : int
+        The number of oversampled grid cells the kernel spans.
+    beta : float
+        The shape parameter of the Kaiser-Bessel kernel.
+    """
+    positions = oversampled_size * frequencies
+    first_indexes = np.floor(positions - kernel_width / 2.0).astype("int") + 1
+    indexes = first_indexes[:, None] + np.arange(kernel_width)[None, :]
+
+    weights = kaiser_bessel_kernel_from(
+        distances=positions[:, None] - indexes, kernel_width=kernel_width, beta=beta
+    )
+
+    return np.mod(indexes, oversampled_size), weights
+
+
+@numba.jit(nopython=True, cache=True)
+def visibilities_from_oversampled_fft_jit(
+    oversampled_fft, y_indexes, y_weights, x_indexes, x_weights
+):
+    """Interpolate the oversampled FFT of an image to the non-uniform uv-coordinates of every visibility, by summing
+    the FFT values in the kernel_width x kernel_width cells around each coordinate weighted by the gridding kernel.
+    """
+
+    total_visibilities = y_indexes.shape[0]
+    kernel_width = y_indexes.shape[1]
+
+    visibilities = np.zeros(total_visibilities, dtype=np.complex128)
+
+    for vis_1d_index in range(total_visibilities):
+
+        value = 0.0 + 0.0j
+
+        for y_kernel_index in range(kernel_width):
+
+            y_weight = y_weights[vis_1d_index, y_kernel_index]
+            y_index = y_indexes[vis_1d_index, y_kernel_index]
+
+            for x_kernel_index in range(kernel_width):
+                value += (
+                    y_weight
+                    * x_weights[vis_1d_index, x_kernel_index]
+                    * oversampled_fft[y_index, x_indexes[vis_1d_index, x_kernel_index]]
+                )
+
+        visibilities[vis_1d_index] = value
+
+    return visibilities
+
+
+@numba.jit(nopython=True, cache=True, parallel=True)
+def transforms_of_chunk_jit(
+    grid_radians, uv_wavelengths, vis_1d_start, real_transforms, imag_transforms
+):
+    """Compute the real and imaginary transforms of a chunk of visibilities, starting at index 'vis_1d_start', in
+    the scratch buffers real_transforms and imag_transforms of shape (chunk_size, image_pixels).
+
+    The phase of every visibility and image pixel pair is computed once and both its cosine and sine are taken from
+    it, as opposed to computing the phase separately for the real and imaginary transforms. Buffer rows beyond the
+    last visibility of the final chunk are left untouched.
+    """
+
+    total_chunk_visibilities = min(
+        real_transforms.shape[0], uv_wavelengths.shape[0] - vis_1d_start
+    )
+
+    for chunk_index in numba.prange(total_chunk_visibilities):
+
+        u = uv_wavelengths[vis_1d_start + chunk_index, 0]
+        v = uv_wavelengths[vis_1d_start + chunk_index, 1]
+
+        for image_1d_index in range(grid_radians.shape[0]):
+
+            phase = (
+                -2.0
+                * np.pi
+                * (
+                    grid_radians[image_1d_index, 1] * u
+                    + grid_radians[image_1d_index, 0] * v
+                )
+            )
+
+            real_transforms[chunk_index, image_1d_index] = np.cos(phase)
+            imag_transforms[chunk_index, image_1d_index] = np.sin(phase)
+
+    return total_chunk_visibilities
@@ -0,0 +1,600 @@
+"""
+Transformers for performing the Fourier transform of an image to the uv-plane visibilities of an interferometer,
+which complement the transformer PyAutoLens uses by default (created via 'al.transformer').
+
+The default transformer can preload the real and imaginary transforms as two matrices of shape
+(total_visibilities, image_pixels), which for large uv-coverages can require more memory than is available. The
+functions below estimate the memory use of the preload up front, so that the transformer can refuse to preload or
+fall back to a chunked transform when the preload would exceed a memory limit.
+
+The chunked transformer computes the transforms for tiles of visibilities in scratch buffers which are reused for
+every tile, such that its memory use is bounded by the chunk size as opposed to the number of visibilities.
+"""
+
+import autofit as af
+import autolens as al
+import numpy as np
+
+from tools.interferometer import transformer_util
+
+bytes_per_float = {"double": 8, "single": 4}
+dtype_from_precision = {"double": "float64", "single": "float32"}
+
+
+def preload_memory_from(total_visibilities, image_pixels, precision="double"):
+    """The memory in GB used by the preloaded real and imaginary transforms of a transformer.
+
+    Parameters
+    ----------
+    total_visibilities : int
+        The number of visibilities in the interferometer dataset.
+    image_pixels : int
+        The number of image pixels in the real-space grid that is transformed.
+    precision : str
+        The precision the transforms are stored in ('double' or 'single').
+    """
+    return 2 * total_visibilities * image_pixels * bytes_per_float[precision] * 1.0e-9
+
+
+def transformed_mapping_matrices_memory_from(
+    total_visibilities, source_pixels, precision="double"
+):
+    """The memory in GB used by the real and imaginary transformed mapping matrices of an inversion."""
+    return 2 * total_visibilities * source_pixels * bytes_per_float[precision] * 1.0e-9
+
+
+def preload_memory_limit_from_config():
+    return af.conf.instance.general.get("interferometer", "preload_memory_limit", float)
+
+
+def precision_from_config():
+    return af.conf.instance.general.get("interferometer", "precision", str)
+
+
+def chunk_memory_limit_from_config():
+    return af.conf.instance.general.get("interferometer", "chunk_memory_limit", float)
+
+
+def chunk_size_from(image_pixels, memory_limit=None, precision=None):
+    """The number of visibilities a chunked transformer transforms per chunk, such that its real and imaginary
+    scratch buffers of shape (chunk_size, image_pixels) fit within a memory limit in GB. The memory limit and
+    precision default to the values in the general.ini config.
+    """
+    if memory_limit is None:
+        memory_limit = chunk_memory_limit_from_config()
+
+    if precision is None:
+        precision = precision_from_config()
+
+    return max(
+        1,
+        int(memory_limit * 1.0e9 / (2 * image_pixels * bytes_per_float[precision])),
+    )
+
+
+def check_preload_memory(total_visibilities, image_pixels, memory_limit=None):
+    """Raise a MemoryError if the preloaded transforms of a transformer would exceed the memory limit, which
+    defaults to the value in the general.ini config. This is performed before any memory is allocated.
+    """
+
+    if memory_limit is None:
+        memory_limit = preload_memory_limit_from_config()
+
+    preload_memory = preload_memory_from(
+        total_visibilities=total_visibilities, image_pixels=image_pixels
+    )
+
+    if preload_memory > memory_limit:
+        raise MemoryError(
+            "The preloaded transforms require {} GB, which exceeds the memory limit of {} GB".format(
+                preload_memory, memory_limit
+            )
+        )
+
+
+class TransformerPlan(object):
+    def __init__(
+        self, preload_transform, preload_memory, memory_limit, chunk_size=None
+    ):
+        """The decision of whether a transformer preloads its transforms, given the memory the preload uses and the
+        memory limit, and if not whether it computes them in chunks.
+
+        Parameters
+        ----------
+        preload_transform : bool
+            Whether the transformer preloads its transforms.
+        preload_memory : float
+            The memory in GB the preloaded transforms use.
+        memory_limit : float
+            The maximum memory in GB the preloaded transforms may use.
+        chunk_size : int or None
+            The number of visibilities per chunk if the transforms are computed in chunks.
+        """
+        self.preload_transform = preload_transform
+        self.preload_memory = preload_memory
+        self.memory_limit = memory_limit
+        self.chunk_size = chunk_size
+
+    def __str__(self):
+
+        if self.preload_transform:
+            return "Preloading transforms (PreLoad Memory Use (GB) = {} <= limit of {})".format(
+                self.preload_memory, self.memory_limit
+            )
+
+        if self.chunk_size is not None:
+            return "Computing transforms in chunks of {} visibilities (PreLoad Memory Use (GB) = {} > limit of {})".format(
+                self.chunk_size, self.preload_memory, self.memory_limit
+            )
+
+        return "Computing transforms on-the-fly (PreLoad Memory Use (GB) = {} > limit of {})".format(
+            self.preload_memory, self.memory_limit
+        )
+
+
+def transformer_plan_from(
+    uv_wavelengths,
+    grid_radians,
+    preload_transform=True,
+    memory_limit=None,
+    chunked=False,
+    chunk_memory_limit=None,
+    precision=None,
+):
+    """Plan whether a transformer can preload its transforms within a memory limit and, if it cannot and chunking is
+    requested, the chunk size that keeps its scratch buffers within the chunk memory limit.
+
+    Parameters
+    ----------
+    uv_wavelengths : ndarray
+        The (u,v) coordinates of every visibility in wavelengths.
+    grid_radians : Grid
+        The real-space grid (in radians) that is transformed.
+    preload_transform : bool
+        Whether the preload is requested. If False the plan never preloads.
+    memory_limit : float or None
+        The maximum memory in GB the preload may use, which defaults to 'preload_memory_limit' in the [interferometer]
+        section of the general.ini config.
+    chunked : bool
+        Whether a transformer which does not preload computes its transforms in chunks.
+    chunk_memory_limit : float or None
+        The maximum memory in GB of the chunked transformer's scratch buffers, which defaults to 'chunk_memory_limit'
+        in the [interferometer] section of the general.ini config.
+    precision : str or None
+        The precision of the chunked transformer's scratch buffers ('double' or 'single'), which defaults to
+        'precision' in the [interferometer] section of the general.ini config.
+    """
+    if memory_limit is None:
+        memory_limit = preload_memory_limit_from_config()
+
+    preload_memory = preload_memory_from(
+        total_visibilities=uv_wavelengths.shape[0], image_pixels=grid_radians.shape[0]
+    )
+
+    preload_transform = preload_transform and preload_memory <= memory_limit
+
+    chunk_size = None
+
+    if chunked and not preload_transform:
+        chunk_size = min(
+            uv_wavelengths.shape[0],
+            chunk_size_from(
+                image_pixels=grid_radians.shape[0],
+                memory_limit=chunk_memory_limit,
+                precision=precision,
+            ),
+        )
+
+    return TransformerPlan(
+        preload_transform=preload_transform,
+        preload_memory=preload_memory,
+        memory_limit=memory_limit,
+        chunk_size=chunk_size,
+    )
+
+
+def transformer_from_memory_limit(
+    uv_wavelengths,
+    grid_radians,
+    preload_transform=True,
+    memory_limit=None,
+    fallback=True,
+    chunked=True,
+    chunk_memory_limit=None,
+    precision=None,
+    output=True,
+):
+    """Create a transformer which preloads its transforms only if they fit within a memory limit.
+
+    If the preload exceeds the limit, the transformer either falls back to computing the transforms in chunks (or
+    on-the-fly if 'chunked' is False) or, if 'fallback' is False, a MemoryError is raised before any memory is
+    allocated.
+
+    Parameters
+    ----------
+    uv_wavelengths : ndarray
+        The (u,v) coordinates of every visibility in wavelengths.
+    grid_radians : Grid
+        The real-space grid (in radians) that is transformed.
+    preload_transform : bool
+        Whether the preload is requested.
+    memory_limit : float or None
+        The maximum memory in GB the preload may use, which defaults to the value in the general.ini config.
+    fallback : bool
+        If True, a transformer computing the transforms on-the-fly is returned when the preload exceeds the limit.
+    chunked : bool
+        If True, the fallback transformer is a TransformerChunked as opposed to the on-the-fly al.transformer.
+    chunk_memory_limit : float or None
+        The maximum memory in GB of the chunked transformer's scratch buffers.
+    precision : str or None
+        The precision of the chunked transformer ('double' or 'single'), which defaults to the general.ini config.
+    output : bool
+        If True, the decision is printed.
+    """
+    plan = transformer_plan_from(
+        uv_wavelengths=uv_wavelengths,
+        grid_radians=grid_radians,
+        preload_transform=preload_transform,
+        memory_limit=memory_limit,
+        chunked=chunked,
+        chunk_memory_limit=chunk_memory_limit,
+        precision=precision,
+    )
+
+    if preload_transform and not fallback:
+        check_preload_memory(
+            total_visibilities=uv_wavelengths.shape[0],
+            image_pixels=grid_radians.shape[0],
+            memory_limit=plan.memory_limit,
+        )
+
+    if output:
+        print(plan)
+
+    if plan.chunk_size is not None:
+        return TransformerChunked(
+            uv_wavelengths=uv_wavelengths,
+            grid_radians=grid_radians,
+            chunk_size=plan.chunk_size,
+            precision=precision,
+        )
+
+    return al.transformer(
+        uv_wavelengths=uv_wavelengths,
+        grid_radians=grid_radians,
+        preload_transform=plan.preload_transform,
+    )
+
+
+class TransformerNUFFT(object):
+    def __init__(
+        self, uv_wavelengths, grid_radians, kernel_width=6, oversampling_factor=2.0
+    ):
+        """A transformer which computes the visibilities of an image using a non-uniform FFT, as opposed to the
+        direct Fourier transform of the default transformer, such that its run-time scales as O(N log N) as opposed
+        to O(N_image_pixels x N_visibilities).
+
+        The image is placed on the uniform lattice of the real-space grid, corrected for the apodization of the
+        gridding kernel, zero-padded by the oversampling factor and FFT'd. The FFT is then interpolated to the
+        non-uniform uv-coordinates of every visibility using a Kaiser-Bessel kernel.
+
+        The accuracy is controlled by the kernel width and oversampling factor. For an oversampling factor of 2, a
+        kernel width of 4 gives fractional errors of ~1e-3 and a kernel width of 6 of ~1e-5 to ~1e-6, relative to
+        the direct Fourier transform.
+
+        Parameters
+        ----------
+        uv_wavelengths : ndarray
+            The (u,v) coordinates of every visibility in wavelengths.
+        grid_radians : Grid
+            The real-space grid (in radians) that is transformed, whose coordinates must lie on a uniform lattice.
+        kernel_width : int
+            The number of oversampled FFT grid cells the Kaiser-Bessel kernel spans in each dimension.
+        oversampling_factor : float
+            The factor by which the FFT grid is larger than the real-space lattice.
+        """
+        self.uv_wavelengths = np.asarray(uv_wavelengths)
+        self.grid_radians = np.asarray(grid_radians)
+        self.kernel_width = kernel_width
+        self.oversampling_factor = oversampling_factor
+
+        self.total_visibilities = self.uv_wavelengths.shape[0]
+
+        lattice_indexes, self.lattice_shape, pixel_scales, centre = (
+            transformer_util.lattice_from_grid_radians(grid_radians=self.grid_radians)
+        )
+
+        self.oversampled_shape = tuple(
+            transformer_util.oversampled_size_from(
+                size=size,
+                oversampling_factor=oversampling_factor,
+                kernel_width=kernel_width,
+            )
+            for size in self.lattice_shape
+        )
+
+        beta = transformer_util.kaiser_bessel_beta_from(
+            kernel_width=kernel_width, oversampling_factor=oversampling_factor
+        )
+
+        # The lattice indexes of every image pixel relative to the lattice origin, wrapped into the oversampled grid.
+
+        centred_indexes = lattice_indexes - np.array(
+            [self.lattice_shape[0] // 2, self.lattice_shape[1] // 2]
+        )
+
+        self.oversampled_y_indexes = np.mod(
+            centred_indexes[:, 0], self.oversampled_shape[0]
+        )
+        self.oversampled_x_indexes = np.mod(
+            centred_indexes[:, 1], self.oversampled_shape[1]
+        )
+
+        self.apodization_correction = 1.0 / (
+            transformer_util.kaiser_bessel_fourier_transform_from(
+                frequencies=centred_indexes[:, 0] / self.oversampled_shape[0],
+                kernel_width=kernel_width,
+                beta=beta,
+            )
+            * transformer_util.kaiser_bessel_fourier_transform_from(
+                frequencies=centred_indexes[:, 1] / self.oversampled_shape[1],
+                kernel_width=kernel_width,
+                beta=beta,
+            )
+        )
+
+        # The grid's y coordinates pair with v (uv_wavelengths[:, 1]) and its x coordinates with u (uv_wavelengths[:, 0]).
+
+        self.y_indexes, self.y_weights = (
+            transformer_util.interpolation_indexes_and_weights_from(
+                frequencies=self.uv_wavelengths[:, 1] * pixel_scales[0],
+                oversampled_size=self.oversampled_shape[0],
+                kernel_width=kernel_width,
+                beta=beta,
+            )
+        )
+
+        self.x_indexes, self.x_weights = (
+            transformer_util.interpolation_indexes_and_weights_from(
+                frequencies=self.uv_wavelengths[:, 0] * pixel_scales[1],
+                oversampled_size=self.oversampled_shape[1],
+                kernel_width=kernel_width,
+                beta=beta,
+            )
+        )
+
+        self.phase_shifts = np.exp(
+            -2.0j
+            * np.pi
+            * (
+                centre[1] * self.uv_wavelengths[:, 0]
+                + centre[0] * self.uv_wavelengths[:, 1]
+            )
+        )
+
+    def complex_visibilities_from_image_1d(self, image_1d):
+
+        oversampled_image = np.zeros(shape=self.oversampled_shape, dtype="complex")
+
+        oversampled_image[self.oversampled_y_indexes, self.oversampled_x_indexes] = (
+            image_1d * self.apodization_correction
+        )
+
+        oversampled_fft = np.fft.fft2(oversampled_image)
+
+        return (
+            transformer_util.visibilities_from_oversampled_fft_jit(
+                oversampled_fft=oversampled_fft,
+                y_indexes=self.y_indexes,
+                y_weights=self.y_weights,
+                x_indexes=self.x_indexes,
+                x_weights=self.x_weights,
+            )
+            * self.phase_shifts
+        )
+
+    def real_visibilities_from_image(self, image):
+        return np.real(
+            self.complex_visibilities_from_image_1d(image_1d=image_1d_from(image=image))
+        )
+
+    def imag_visibilities_from_image(self, image):
+        return np.imag(
+            self.complex_visibilities_from_image_1d(image_1d=image_1d_from(image=image))
+        )
+
+    def visibilities_from_image(self, image):
+
+        visibilities = self.complex_visibilities_from_image_1d(
+            image_1d=image_1d_from(image=image)
+        )
+
+        return al.visibilities.manual_1d(
+            visibilities=np.stack(
+                (np.real(visibilities), np.imag(visibilities)), axis=-1
+            )
+        )
+
+    def transformed_mapping_matrices_from_mapping_matrix(self, mapping_matrix):
+        """The real and imaginary transformed mapping matrices of an inversion, computed by transforming every
+        column (source pixel) of the mapping matrix with the non-uniform FFT."""
+
+        real_transformed_mapping_matrix = np.zeros(
+            shape=(self.total_visibilities, mapping_matrix.shape[1])
+        )
+        imag_transformed_mapping_matrix = np.zeros(
+            shape=(self.total_visibilities, mapping_matrix.shape[1])
+        )
+
+        for source_index in range(mapping_matrix.shape[1]):
+
+            visibilities = self.complex_visibilities_from_image_1d(
+                image_1d=mapping_matrix[:, source_index]
+            )
+
+            real_transformed_mapping_matrix[:, source_index] = np.real(visibilities)
+            imag_transformed_mapping_matrix[:, source_index] = np.imag(visibilities)
+
+        return [real_transformed_mapping_matrix, imag_transformed_mapping_matrix]
+
+
+class TransformerChunked(object):
+    def __init__(self, uv_wavelengths, grid_radians, chunk_size=None, precision=None):
+        """A transformer which computes the direct Fourier transform in chunks of visibilities, as opposed to
+        preloading the transforms of every visibility (which uses memory scaling with total_visibilities x
+        image_pixels) or recomputing them one visibility at a time.
+
+        For every chunk the real and imaginary transforms are computed in one pass into scratch buffers of shape
+        (chunk_size, image_pixels), which are allocated once and reused for every chunk and every call. The
+        visibilities (or transformed mapping matrices) of the chunk are then computed as a matrix multiplication of
+        the buffers with the image (or mapping matrix).
+
+        In 'single' precision the scratch buffers and transformed mapping matrices are stored as float32, halving
+        their memory and bandwidth, whereas the phases are computed and the visibilities returned in float64.
+
+        Parameters
+        ----------
+        uv_wavelengths : ndarray
+            The (u,v) coordinates of every visibility in wavelengths.
+        grid_radians : Grid
+            The real-space grid (in radians) that is transformed.
+        chunk_size : int or None
+            The number of visibilities transformed per chunk, which defaults to the number whose scratch buffers fit
+            within 'chunk_memory_limit' in the general.ini config.
+        precision : str or None
+            The precision the transforms are stored in ('double' or 'single'), which defaults to 'precision' in the
+            general.ini config.
+        """
+        if precision is None:
+            precision = precision_from_config()
+
+        self.precision = precision
+        self.dtype = dtype_from_precision[precision]
+
+        self.uv_wavelengths = np.asarray(uv_wavelengths)
+        self.grid_radians = np.asarray(grid_radians)
+
+        self.total_visibilities = self.uv_wavelengths.shape[0]
+        self.image_pixels = self.grid_radians.shape[0]
+
+        if chunk_size is None:
+            chunk_size = chunk_size_from(
+                image_pixels=self.image_pixels, precision=precision
+            )
+
+        self.chunk_size = min(chunk_size, self.total_visibilities)
+
+        self.real_transforms = np.zeros(
+            shape=(self.chunk_size, self.image_pixels), dtype=self.dtype
+        )
+        self.imag_transforms = np.zeros(
+            shape=(self.chunk_size, self.image_pixels), dtype=self.dtype
+        )
+
+    @property
+    def chunk_memory(self):
+        """The memory in GB used by the scratch buffers."""
+        return preload_memory_from(
+            total_visibilities=self.chunk_size,
+            image_pixels=self.image_pixels,
+            precision=self.precision,
+        )
+
+    def transformed_from_values(self, values):
+        """The real and imaginary transforms of a 1D image (shape [image_pixels]) or of every column of a mapping
+        matrix (shape [image_pixels, source_pixels]), in the precision of the transformer.
+        """
+
+        values = np.asarray(values, dtype=self.dtype)
+
+        real_transformed = np.zeros(
+            shape=(self.total_visibilities,) + values.shape[1:], dtype=self.dtype
+        )
+        imag_transformed = np.zeros(
+            shape=(self.total_visibilities,) + values.shape[1:], dtype=self.dtype
+        )
+
+        for vis_1d_start in range(0, self.total_visibilities, self.chunk_size):
+
+            total_chunk_visibilities = transformer_util.transforms_of_chunk_jit(
+                grid_radians=self.grid_radians,
+                uv_wavelengths=self.uv_wavelengths,
+                vis_1d_start=vis_1d_start,
+                real_transforms=self.real_transforms,
+                imag_transforms=self.imag_transforms,
+            )
+
+            vis_1d_end = vis_1d_start + total_chunk_visibilities
+
+            np.dot(
+                self.real_transforms[:total_chunk_visibilities],
+                values,
+                out=real_transformed[vis_1d_start:vis_1d_end],
+            )
+            np.dot(
+                self.imag_transforms[:total_chunk_visibilities],
+                values,
+                out=imag_transformed[vis_1d_start:vis_1d_end],
+            )
+
+        return real_transformed, imag_transformed
+
+    def real_visibilities_from_image(self, image):
+        transformed = self.transformed_from_values(values=image_1d_from(image=image))
+        return transformed[0].astype("float64")
+
+    def imag_visibilities_from_image(self, image):
+        transformed = self.transformed_from_values(values=image_1d_from(image=image))
+        return transformed[1].astype("float64")
+
+    def visibilities_from_image(self, image):
+        """The visibilities of an image, where the real and imaginary visibilities are computed in the same pass."""
+
+        real_visibilities, imag_visibilities = self.transformed_from_values(
+            values=image_1d_from(image=image)
+        )
+
+        return al.visibilities.manual_1d(
+            visibilities=np.stack(
+                (real_visibilities, imag_visibilities), axis=-1
+            ).astype("float64")
+        )
+
+    def transformed_mapping_matrices_from_mapping_matrix(self, mapping_matrix):
+        """The real and imaginary transformed mapping matrices, stored in the precision of the transformer. Their
+        curvature matrix and data vector should be computed via tools/interferometer/inversion_util.py, which
+        accumulates them in float64."""
+        return list(self.transformed_from_values(values=np.asarray(mapping_matrix)))
+
+
+def image_1d_from(image):
+    """The 1D binned values of an image input into a transformer."""
+    if hasattr(image, "in_1d_binned"):
+        return np.asarray(image.in_1d_binned)
+    return np.asarray(image)
+
+
+def transformer_from(uv_wavelengths, grid_radians, transformer_class="dft", **kwargs):
+    """Create the transformer of an interferometer analysis, selected via a string so it can be set in a pipeline
+    setup:
+
+        - 'dft': the direct Fourier transform of al.transformer, whose preload is subject to the memory limit.
+        - 'chunked': the chunked direct Fourier transform of TransformerChunked.
+        - 'nufft': the non-uniform FFT of TransformerNUFFT.
+    """
+    if transformer_class == "dft":
+        return transformer_from_memory_limit(
+            uv_wavelengths=uv_wavelengths, grid_radians=grid_radians, **kwargs
+        )
+    elif transformer_class == "chunked":
+        return TransformerChunked(
+            uv_wavelengths=uv_wavelengths, grid_radians=grid_radians, **kwargs
+        )
+    elif transformer_class == "nufft":
+        return TransformerNUFFT(
+            uv_wavelengths=uv_wavelengths, grid_radians=grid_radians, **kwargs
+        )
+
+    raise ValueError(
+        "An invalid transformer_class was entered - {}".format(transformer_class)
+    )
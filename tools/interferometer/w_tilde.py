@@ -0,0 +1,158 @@
+"""
+The w-tilde formalism computes the data vector and curvature matrix of an interferometer inversion directly from the
+mapping matrix, without computing the transformed mapping matrices of shape (total_visibilities, source_pixels).
+
+Everything that depends on the visibilities (the w-tilde curvature kernel and the noise-weighted dirty image) depends
+only on the uv_wavelengths, visibilities and noise-map of the dataset, and is therefore computed once per dataset.
+Every likelihood evaluation then builds the curvature matrix from the sparse mapping matrix, at a cost which scales
+with the number of image pixels as opposed to the number of visibilities.
+"""
+
+import numpy as np
+
+from tools.interferometer import transformer_util
+from tools.interferometer import transformers
+from tools.interferometer import w_tilde_util
+
+
+class WTildeInterferometer(object):
+    def __init__(
+        self, uv_wavelengths, grid_radians, visibilities, noise_map, chunk_size=None
+    ):
+        """The w-tilde curvature kernel and noise-weighted dirty image of an interferometer dataset.
+
+        If the real and imaginary noise-maps are equal, the kernel is stored for every offset between two pixels of
+        the real-space lattice, using memory of ~4 x image_pixels. Otherwise the dense w-tilde matrix of shape
+        (image_pixels, image_pixels) is computed.
+
+        Parameters
+        ----------
+        uv_wavelengths : ndarray
+            The (u,v) coordinates of every visibility in wavelengths.
+        grid_radians : Grid
+            The binned real-space grid (in radians) of the real-space mask, whose coordinates lie on a uniform lattice.
+        visibilities : ndarray
+            The real and imaginary visibilities, shape (total_visibilities, 2).
+        noise_map : ndarray
+            The real and imaginary noise-map values, shape (total_visibilities, 2).
+        chunk_size : int or None
+            The number of visibilities whose transforms are held in memory at once when computing the dirty image
+            and dense w-tilde matrix, which defaults to the chunk memory limit of the general.ini config.
+        """
+        uv_wavelengths = np.asarray(uv_wavelengths)
+        grid_radians = np.asarray(grid_radians)
+        visibilities = np.asarray(visibilities)
+        noise_map = np.asarray(noise_map)
+
+        if chunk_size is None:
+            chunk_size = transformers.chunk_size_from(
+                image_pixels=grid_radians.shape[0], precision="double"
+            )
+
+        chunk_size = min(chunk_size, uv_wavelengths.shape[0])
+
+        self.image_pixels = grid_radians.shape[0]
+
+        self.lattice_indexes, shape, pixel_scales, _ = (
+            transformer_util.lattice_from_grid_radians(grid_radians=grid_radians)
+        )
+
+        if np.array_equal(noise_map[:, 0], noise_map[:, 1]):
+
+            self.w_tilde_offsets = w_tilde_util.w_tilde_offsets_from(
+                uv_wavelengths=uv_wavelengths,
+                noise_map_real=noise_map[:, 0].copy(),
+                shape=shape,
+                pixel_scales=pixel_scales,
+            )
+            self._w_tilde = None
+
+        else:
+
+            self.w_tilde_offsets = None
+            self._w_tilde = w_tilde_util.w_tilde_from(
+                grid_radians=grid_radians,
+                uv_wavelengths=uv_wavelengths,
+                noise_map=noise_map,
+                chunk_size=chunk_size,
+            )
+
+        self.dirty_image = w_tilde_util.dirty_image_from(
+            grid_radians=grid_radians,
+            uv_wavelengths=uv_wavelengths,
+            visibilities=visibilities,
+            noise_map=noise_map,
+            chunk_size=chunk_size,
+        )
+
+    @classmethod
+    def from_masked_interferometer(cls, masked_interferometer, chunk_size=None):
+        return WTildeInterferometer(
+            uv_wavelengths=masked_interferometer.uv_wavelengths,
+            grid_radians=masked_interferometer.grid.in_radians.in_1d_binned,
+            visibilities=masked_interferometer.visibilities,
+            noise_map=masked_interferometer.noise_map,
+            chunk_size=chunk_size,
+        )
+
+    @property
+    def w_tilde(self):
+        """The dense w-tilde matrix of shape (image_pixels, image_pixels), which is expanded from the kernel of every
+        pixel offset the first time it is used."""
+        if self._w_tilde is None:
+            self._w_tilde = w_tilde_util.w_tilde_via_offsets_from(
+                w_tilde_offsets=self.w_tilde_offsets,
+                lattice_indexes=self.lattice_indexes,
+            )
+        return self._w_tilde
+
+    def curvature_matrix_from_mapper(self, mapper):
+        """The curvature matrix of an inversion using the input mapper, computed from its sparse mappings if the
+        kernel is stored for every pixel offset and from its mapping matrix otherwise.
+        """
+
+        if self.w_tilde_offsets is None:
+            return self.curvature_matrix_from_mapping_matrix(
+                mapping_matrix=mapper.mapping_matrix
+            )
+
+        pix_indexes, pix_weights, pix_sizes = w_tilde_util.sparse_mapping_from(
+            pixelization_1d_index_for_sub_mask_1d_index=np.asarray(
+                mapper.pixelization_1d_index_for_sub_mask_1d_index
+            ),
+            sub_size=mapper.grid.sub_size,
+        )
+
+        return w_tilde_util.curvature_matrix_via_w_tilde_offsets_from(
+            w_tilde_offsets=self.w_tilde_offsets,
+            lattice_indexes=self.lattice_indexes,
+            pix_indexes=pix_indexes,
+            pix_weights=pix_weights,
+            pix_sizes=pix_sizes,
+            pixelization_pixels=mapper.pixels,
+        )
+
+    def curvature_matrix_from_mapping_matrix(self, mapping_matrix):
+        return w_tilde_util.curvature_matrix_via_w_tilde_from(
+            w_tilde=self.w_tilde, mapping_matrix=mapping_matrix
+        )
+
+    def data_vector_from_mapper(self, mapper):
+
+        pix_indexes, pix_weights, pix_sizes = w_tilde_util.sparse_mapping_from(
+            pixelization_1d_index_for_sub_mask_1d_index=np.asarray(
+                mapper.pixelization_1d_index_for_sub_mask_1d_index
+            ),
+            sub_size=mapper.grid.sub_size,
+        )
+
+        return w_tilde_util.data_vector_via_dirty_image_from(
+            dirty_image=self.dirty_image,
+            pix_indexes=pix_indexes,
+            pix_weights=pix_weights,
+            pix_sizes=pix_sizes,
+            pixelization_pixels=mapper.pixels,
+        )
+
+    def data_vector_from_mapping_matrix(self, mapping_matrix):
+        return np.dot(mapping_matrix.T, self.dirty_image)
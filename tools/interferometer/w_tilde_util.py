@@ -0,0 +1,311 @@
+import numba
+import numpy as np
+
+from tools.interferometer import transformer_util
+
+
+@numba.jit(nopython=True, cache=True, parallel=True)
+def w_tilde_offsets_from(uv_wavelengths, noise_map_real, shape, pixel_scales):
+    """Compute the w-tilde curvature kernel of an interferometer dataset for every (y,x) offset between two pixels of
+    a uniform real-space lattice of the input shape and pixel scales.
+
+    The curvature matrix of an inversion is F = M^T W M, where M is the mapping matrix and
+
+        W_ij = sum_k [cos(phase_ki) cos(phase_kj) / sigma_real_k^2 + sin(phase_ki) sin(phase_kj) / sigma_imag_k^2]
+
+    with phase_ki = -2 pi (x_i u_k + y_i v_k). If the real and imaginary noise-maps are equal, this reduces to
+    sum_k cos(phase_ki - phase_kj) / sigma_k^2, which depends only on the offset between pixels i and j. The kernel
+    is therefore stored for every offset, with shape (2 * shape[0] - 1, 2 * shape[1] - 1), where index
+    (shape[0] - 1, shape[1] - 1) is zero offset.
+
+    Parameters
+    ----------
+    uv_wavelengths : ndarray
+        The (u,v) coordinates of every visibility in wavelengths.
+    noise_map_real : ndarray
+        The real noise-map values of every visibility, which must equal the imaginary noise-map values.
+    shape : (int, int)
+        The shape of the real-space lattice.
+    pixel_scales : (float, float)
+        The (y,x) pixel scales of the real-space lattice in radians.
+    """
+
+    w_tilde_offsets = np.zeros(shape=(2 * shape[0] - 1, 2 * shape[1] - 1))
+
+    for y_offset_index in numba.prange(2 * shape[0] - 1):
+
+        y_offset = (y_offset_index - shape[0] + 1) * pixel_scales[0]
+
+        for x_offset_index in range(2 * shape[1] - 1):
+
+            x_offset = (x_offset_index - shape[1] + 1) * pixel_scales[1]
+
+            value = 0.0
+
+            for vis_1d_index in range(uv_wavelengths.shape[0]):
+                value += np.cos(
+                    2.0
+                    * np.pi
+                    * (
+                        x_offset * uv_wavelengths[vis_1d_index, 0]
+                        + y_offset * uv_wavelengths[vis_1d_index, 1]
+                    )
+                ) / (noise_map_real[vis_1d_index] ** 2)
+
+            w_tilde_offsets[y_offset_index, x_offset_index] = value
+
+    return w_tilde_offsets
+
+
+@numba.jit(nopython=True, cache=True)
+def w_tilde_via_offsets_from(w_tilde_offsets, lattice_indexes):
+    """Expand the w-tilde kernel for every pixel offset to the dense w-tilde matrix of shape
+    (image_pixels, image_pixels)."""
+
+    y_centre = (w_tilde_offsets.shape[0] - 1) // 2
+    x_centre = (w_tilde_offsets.shape[1] - 1) // 2
+
+    image_pixels = lattice_indexes.shape[0]
+
+    w_tilde = np.zeros(shape=(image_pixels, image_pixels))
+
+    for image_1d_index_0 in range(image_pixels):
+        for image_1d_index_1 in range(image_pixels):
+            w_tilde[image_1d_index_0, image_1d_index_1] = w_tilde_offsets[
+                lattice_indexes[image_1d_index_0, 0]
+                - lattice_indexes[image_1d_index_1, 0]
+                + y_centre,
+                lattice_indexes[image_1d_index_0, 1]
+                - lattice_indexes[image_1d_index_1, 1]
+                + x_centre,
+            ]
+
+    return w_tilde
+
+
+def w_tilde_from(grid_radians, uv_wavelengths, noise_map, chunk_size):
+    """Compute the dense w-tilde matrix of shape (image_pixels, image_pixels) for any real and imaginary noise-maps,
+    by accumulating the weighted products of the real and imaginary transforms over chunks of visibilities.
+
+    Parameters
+    ----------
+    grid_radians : ndarray
+        The real-space grid (in radians) of shape (image_pixels, 2).
+    uv_wavelengths : ndarray
+        The (u,v) coordinates of every visibility in wavelengths.
+    noise_map : ndarray
+        The real and imaginary noise-map values of every visibility, shape (total_visibilities, 2).
+    chunk_size : int
+        The number of visibilities whose transforms are held in memory at once.
+    """
+
+    image_pixels = grid_radians.shape[0]
+
+    real_transforms = np.zeros(shape=(chunk_size, image_pixels))
+    imag_transforms = np.zeros(shape=(chunk_size, image_pixels))
+
+    w_tilde = np.zeros(shape=(image_pixels, image_pixels))
+
+    for vis_1d_start in range(0, uv_wavelengths.shape[0], chunk_size):
+
+        total_chunk_visibilities = transformer_util.transforms_of_chunk_jit(
+            grid_radians=grid_radians,
+            uv_wavelengths=uv_wavelengths,
+            vis_1d_start=vis_1d_start,
+            real_transforms=real_transforms,
+            imag_transforms=imag_transforms,
+        )
+
+        vis_1d_end = vis_1d_start + total_chunk_visibilities
+
+        real_weighted = (
+            real_transforms[:total_chunk_visibilities]
+            / noise_map[vis_1d_start:vis_1d_end, 0, None]
+        )
+        imag_weighted = (
+            imag_transforms[:total_chunk_visibilities]
+            / noise_map[vis_1d_start:vis_1d_end, 1, None]
+        )
+
+        w_tilde += np.dot(real_weighted.T, real_weighted)
+        w_tilde += np.dot(imag_weighted.T, imag_weighted)
+
+    return w_tilde
+
+
+def dirty_image_from(grid_radians, uv_wavelengths, visibilities, noise_map, chunk_size):
+    """Compute the noise-weighted dirty image sum_k [cos(phase_ki) d_real_k / sigma_real_k^2 + sin(phase_ki)
+    d_imag_k / sigma_imag_k^2], from which the data vector of an inversion is D = M^T dirty_image.
+    """
+
+    image_pixels = grid_radians.shape[0]
+
+    real_transforms = np.zeros(shape=(chunk_size, image_pixels))
+    imag_transforms = np.zeros(shape=(chunk_size, image_pixels))
+
+    dirty_image = np.zeros(shape=image_pixels)
+
+    for vis_1d_start in range(0, uv_wavelengths.shape[0], chunk_size):
+
+        total_chunk_visibilities = transformer_util.transforms_of_chunk_jit(
+            grid_radians=grid_radians,
+            uv_wavelengths=uv_wavelengths,
+            vis_1d_start=vis_1d_start,
+            real_transforms=real_transforms,
+            imag_transforms=imag_transforms,
+        )
+
+        vis_1d_end = vis_1d_start + total_chunk_visibilities
+
+        dirty_image += np.dot(
+            visibilities[vis_1d_start:vis_1d_end, 0]
+            / noise_map[vis_1d_start:vis_1d_end, 0] ** 2,
+            real_transforms[:total_chunk_visibilities],
+        )
+        dirty_image += np.dot(
+            visibilities[vis_1d_start:vis_1d_end, 1]
+            / noise_map[vis_1d_start:vis_1d_end, 1] ** 2,
+            imag_transforms[:total_chunk_visibilities],
+        )
+
+    return dirty_image
+
+
+@numba.jit(nopython=True, cache=True)
+def sparse_mapping_from(pixelization_1d_index_for_sub_mask_1d_index, sub_size):
+    """Compress the mappings of every sub-pixel to a pixelization pixel into, for every image pixel, the pixelization
+    pixels it maps to and the fraction of its sub-pixels mapping to each, which are the non-zero entries of the
+    corresponding row of the mapping matrix.
+
+    Returns the pixelization indexes and weights, both of shape (image_pixels, sub_size**2), and the number of
+    entries of every image pixel.
+    """
+
+    sub_pixels = sub_size**2
+    sub_fraction = 1.0 / sub_pixels
+
+    image_pixels = pixelization_1d_index_for_sub_mask_1d_index.shape[0] // sub_pixels
+
+    pix_indexes = np.zeros(shape=(image_pixels, sub_pixels), dtype=np.int64)
+    pix_weights = np.zeros(shape=(image_pixels, sub_pixels))
+    pix_sizes = np.zeros(shape=image_pixels, dtype=np.int64)
+
+    for image_1d_index in range(image_pixels):
+        for sub_index in range(sub_pixels):
+
+            pix_index = pixelization_1d_index_for_sub_mask_1d_index[
+                image_1d_index * sub_pixels + sub_index
+            ]
+
+            found = False
+
+            for entry_index in range(pix_sizes[image_1d_index]):
+                if pix_indexes[image_1d_index, entry_index] == pix_index:
+                    pix_weights[image_1d_index, entry_index] += sub_fraction
+                    found = True
+
+            if not found:
+                pix_indexes[image_1d_index, pix_sizes[image_1d_index]] = pix_index
+                pix_weights[image_1d_index, pix_sizes[image_1d_index]] = sub_fraction
+                pix_sizes[image_1d_index] += 1
+
+    return pix_indexes, pix_weights, pix_sizes
+
+
+@numba.jit(nopython=True, cache=True, parallel=True)
+def curvature_matrix_via_w_tilde_offsets_from(
+    w_tilde_offsets,
+    lattice_indexes,
+    pix_indexes,
+    pix_weights,
+    pix_sizes,
+    pixelization_pixels,
+):
+    """Compute the curvature matrix F = M^T W M of an inversion from the w-tilde kernel for every pixel offset and
+    the sparse mapping matrix, without computing the transformed mapping matrix. The run-time scales with the square
+    of the number of image pixels and is independent of the number of visibilities.
+
+    Each row of the curvature matrix is computed in parallel from the image pixels mapping to that row's
+    pixelization pixel.
+    """
+
+    y_centre = (w_tilde_offsets.shape[0] - 1) // 2
+    x_centre = (w_tilde_offsets.shape[1] - 1) // 2
+
+    image_pixels = lattice_indexes.shape[0]
+
+    # For every pixelization pixel, the image pixels and entries which map to it.
+
+    pix_image_sizes = np.zeros(shape=pixelization_pixels, dtype=np.int64)
+
+    for image_1d_index in range(image_pixels):
+        for entry_index in range(pix_sizes[image_1d_index]):
+            pix_image_sizes[pix_indexes[image_1d_index, entry_index]] += 1
+
+    pix_image_starts = np.zeros(shape=pixelization_pixels + 1, dtype=np.int64)
+    pix_image_starts[1:] = np.cumsum(pix_image_sizes)
+
+    pix_image_indexes = np.zeros(shape=pix_image_starts[-1], dtype=np.int64)
+    pix_image_weights = np.zeros(shape=pix_image_starts[-1])
+    pix_image_fill = pix_image_starts[:-1].copy()
+
+    for image_1d_index in range(image_pixels):
+        for entry_index in range(pix_sizes[image_1d_index]):
+            pix_index = pix_indexes[image_1d_index, entry_index]
+            pix_image_indexes[pix_image_fill[pix_index]] = image_1d_index
+            pix_image_weights[pix_image_fill[pix_index]] = pix_weights[
+                image_1d_index, entry_index
+            ]
+            pix_image_fill[pix_index] += 1
+
+    curvature_matrix = np.zeros(shape=(pixelization_pixels, pixelization_pixels))
+
+    for pix_index_0 in numba.prange(pixelization_pixels):
+        for image_entry_index in range(
+            pix_image_starts[pix_index_0], pix_image_starts[pix_index_0 + 1]
+        ):
+
+            image_1d_index_0 = pix_image_indexes[image_entry_index]
+            weight_0 = pix_image_weights[image_entry_index]
+
+            y_0 = lattice_indexes[image_1d_index_0, 0] + y_centre
+            x_0 = lattice_indexes[image_1d_index_0, 1] + x_centre
+
+            for image_1d_index_1 in range(image_pixels):
+
+                w_tilde_value = (
+                    weight_0
+                    * w_tilde_offsets[
+                        y_0 - lattice_indexes[image_1d_index_1, 0],
+                        x_0 - lattice_indexes[image_1d_index_1, 1],
+                    ]
+                )
+
+                for entry_index in range(pix_sizes[image_1d_index_1]):
+                    curvature_matrix[
+                        pix_index_0, pix_indexes[image_1d_index_1, entry_index]
+                    ] += (w_tilde_value * pix_weights[image_1d_index_1, entry_index])
+
+    return curvature_matrix
+
+
+@numba.jit(nopython=True, cache=True)
+def data_vector_via_dirty_image_from(
+    dirty_image, pix_indexes, pix_weights, pix_sizes, pixelization_pixels
+):
+    """Compute the data vector D = M^T dirty_image of an inversion from the sparse mapping matrix."""
+
+    data_vector = np.zeros(shape=pixelization_pixels)
+
+    for image_1d_index in range(dirty_image.shape[0]):
+        for entry_index in range(pix_sizes[image_1d_index]):
+            data_vector[pix_indexes[image_1d_index, entry_index]] += (
+                pix_weights[image_1d_index, entry_index] * dirty_image[image_1d_index]
+            )
+
+    return data_vector
+
+
+def curvature_matrix_via_w_tilde_from(w_tilde, mapping_matrix):
+    """Compute the curvature matrix F = M^T W M of an inversion from the dense w-tilde matrix and mapping matrix."""
+    return np.dot(mapping_matrix.T, np.dot(w_tilde, mapping_matrix))
@@ -0,0 +1,411 @@
+"""
+Interpolate deflection angles from an interpolation grid whose spacing is chosen automatically from a target maximum
+deflection angle error.
+
+The library's 'Interpolator' computes deflection angles on a uniform grid of spacing 'pixel_scale_interpolation_grid'
+and linearly interpolates them (over a Delaunay triangulation of the interpolation grid) to the sub-grid, where the
+spacing is tuned by hand for every lens with 'tools/interpolation/precision.py'. The error of linear interpolation
+scales with the spacing squared times the curvature of the deflection angles, which for most mass profiles is largest
+near their centre. 'AutomaticInterpolator.from_deflections_func' therefore uses an interpolation grid which is refined
+in nested circles around the mass centre, where the spacing halves inside every circle, and:
+
+1) Computes the exact deflection angles of the grid once, and the interpolated deflection angles for a coarse spacing.
+2) Estimates how many times the spacing around every point above the target error must be halved (every halving
+   reduces its error by ~4), and extends every circle to enclose the points which need its spacing.
+3) Repeats 2) until the maximum error is below the target, or the interpolation grid would have more points than
+   the grid (in which case computing the grid's deflection angles directly is cheaper).
+
+The resulting interpolator can be reused for every mass model whose deflection angles are similarly smooth, e.g. the
+models sampled by a phase of a lens. 'pixel_scale_interpolation_grid_from' instead only halves the spacing everywhere,
+giving the uniform spacing to pass to the 'pixel_scale_interpolation_grid' of a phase.
+
+Both evaluate deflection angles with a function of an ndarray of (y,x) coordinates, where
+'deflections_func_from_mass_profile' gives the function of a library mass profile, which wraps the coordinates in a
+library grid.
+"""
+
+import numpy as np
+from scipy import spatial
+from scipy import sparse
+
+from tools.imaging import adaptive_sub_grid
+
+
+def uniform_interp_grid_from(grid, pixel_scale, buffer=2):
+    """The (y,x) coordinates of a uniform interpolation grid of the input spacing, which covers the bounding box of
+    the grid with a buffer of 'buffer' interpolation pixels on every side."""
+
+    grid_min = np.min(grid, axis=0) - buffer * pixel_scale
+    grid_max = np.max(grid, axis=0) + buffer * pixel_scale
+
+    y = np.arange(grid_max[0], grid_min[0] - pixel_scale, -pixel_scale)
+    x = np.arange(grid_min[1], grid_max[1] + pixel_scale, pixel_scale)
+
+    y, x = np.meshgrid(y, x, indexing="ij")
+
+    return np.stack((y.ravel(), x.ravel()), axis=1)
+
+
+def interp_grid_from(
+    grid, pixel_scale, centre=(0.0, 0.0), refinement_radii=(), buffer=2
+):
+    """The (y,x) coordinates of an interpolation grid of the input spacing, whose spacing is halved inside every
+    refinement radius around the centre, such that it is pixel_scale / 2**len(refinement_radii) inside the last
+    (smallest) radius.
+
+    Parameters
+    ----------
+    grid : ndarray
+        The (y,x) coordinates the deflection angles are interpolated to, shape (points, 2).
+    pixel_scale : float
+        The spacing of the interpolation grid outside the refinement radii.
+    centre : (float, float)
+        The (y,x) centre of the refined regions, e.g. the centre of the mass profile.
+    refinement_radii : (float,)
+        The decreasing radii of the circles the spacing is halved inside of.
+    buffer : int
+        The number of interpolation pixels the grid extends beyond the bounding box of the input grid.
+    """
+
+    interp_grid = uniform_interp_grid_from(
+        grid=grid, pixel_scale=pixel_scale, buffer=buffer
+    )
+
+    interp_grids = []
+    outer_radius = np.inf
+
+    for radius in refinement_radii:
+
+        radii = np.hypot(interp_grid[:, 0] - centre[0], interp_grid[:, 1] - centre[1])
+        interp_grids.append(interp_grid[(radii > radius) & (radii <= outer_radius)])
+
+        pixel_scale /= 2.0
+        outer_radius = radius
+
+        interp_grid = uniform_interp_grid_from(
+            grid=np.array(
+                [
+                    [centre[0] - radius, centre[1] - radius],
+                    [centre[0] + radius, centre[1] + radius],
+                ]
+            ),
+            pixel_scale=pixel_scale,
+            buffer=0,
+        )
+
+    radii = np.hypot(interp_grid[:, 0] - centre[0], interp_grid[:, 1] - centre[1])
+    interp_grids.append(interp_grid[radii <= outer_radius])
+
+    return np.concatenate(interp_grids, axis=0)
+
+
+def interpolation_matrix_from(grid, interp_grid):
+    """The sparse (CSR) matrix which linearly interpolates values on the interpolation grid to the grid, via the
+    barycentric weights of the Delaunay triangle of the interpolation grid enclosing every point.
+    """
+
+    delaunay = spatial.Delaunay(interp_grid)
+
+    simplex_indexes = delaunay.find_simplex(grid)
+
+    if np.any(simplex_indexes < 0):
+        raise ValueError(
+            "The interpolation grid does not cover every coordinate of the grid"
+        )
+
+    transforms = delaunay.transform[simplex_indexes]
+
+    barycentric = np.einsum(
+        "ijk,ik->ij", transforms[:, :2, :], grid - transforms[:, 2, :]
+    )
+
+    weights = np.concatenate(
+        (barycentric, 1.0 - np.sum(barycentric, axis=1, keepdims=True)), axis=1
+    )
+
+    return sparse.csr_matrix(
+        (
+            weights.ravel(),
+            (
+                np.repeat(np.arange(grid.shape[0]), 3),
+                delaunay.simplices[simplex_indexes].ravel(),
+            ),
+        ),
+        shape=(grid.shape[0], interp_grid.shape[0]),
+    )
+
+
+def deflections_func_from_mass_profile(mass_profile, pixel_scales):
+    """A function returning the (y,x) deflection angles of a mass profile (or galaxy) at an ndarray of (y,x)
+    coordinates, which are passed to the profile as a library grid. The pixel scales are only attached to the grid,
+    and do not change the deflection angles."""
+
+    return lambda coordinates: np.asarray(
+        mass_profile.deflections_from_grid(
+            grid=adaptive_sub_grid.grid_from_coordinates(
+                coordinates=coordinates, pixel_scales=pixel_scales
+            )
+        )
+    )
+
+
+def deflection_errors_from(deflections, true_deflections):
+    """The magnitude of the error of every interpolated (y,x) deflection angle."""
+    return np.hypot(
+        deflections[:, 0] - true_deflections[:, 0],
+        deflections[:, 1] - true_deflections[:, 1],
+    )
+
+
+def refinement_radii_from(radii, levels, refinement_radii, pixel_scale):
+    """The refinement radii which enclose every point inside the circles of its level of refinement (the number of
+    times the spacing around it is halved), with a margin of two interpolation pixels, and the input radii.
+
+    Parameters
+    ----------
+    radii : ndarray
+        The distance of every point from the centre of the refined regions.
+    levels : ndarray
+        The level of refinement of every point.
+    refinement_radii : (float,)
+        The current refinement radii, which are never decreased.
+    pixel_scale : float
+        The spacing of the interpolation grid outside the refinement radii.
+    """
+
+    return tuple(
+        max(
+            refinement_radii[level - 1] if level <= len(refinement_radii) else 0.0,
+            np.max(radii[levels >= level]) + 2.0 * pixel_scale / 2.0 ** (level - 1),
+        )
+        for level in range(1, np.max(levels, initial=0) + 1)
+    )
+
+
+class AutomaticInterpolator(object):
+    def __init__(self, grid, pixel_scale, centre=(0.0, 0.0), refinement_radii=()):
+        """Linearly interpolate values (e.g. deflection angles) from an interpolation grid, which may be refined
+        around a centre, to a grid.
+
+        Parameters
+        ----------
+        grid : ndarray
+            The (y,x) coordinates values are interpolated to, shape (points, 2).
+        pixel_scale : float
+            The spacing of the interpolation grid outside the refinement radii.
+        centre : (float, float)
+            The (y,x) centre of the refined regions.
+        refinement_radii : (float,)
+            The decreasing radii of the circles the spacing is halved inside of.
+        """
+
+        self.grid = np.asarray(grid, dtype="float64")
+        self.pixel_scale = pixel_scale
+        self.centre = centre
+        self.refinement_radii = tuple(refinement_radii)
+
+        self.interp_grid = interp_grid_from(
+            grid=self.grid,
+            pixel_scale=pixel_scale,
+            centre=centre,
+            refinement_radii=self.refinement_radii,
+        )
+
+        self.interpolation_matrix = interpolation_matrix_from(
+            grid=self.grid, interp_grid=self.interp_grid
+        )
+
+        self.max_error = None
+
+    @classmethod
+    def from_deflections_func(
+        cls,
+        grid,
+        deflections_func,
+        max_error,
+        centre=(0.0, 0.0),
+        pixel_scale=0.2,
+        min_pixel_scale=0.005,
+        inner_radius=0.0,
+    ):
+        """The interpolator whose interpolated deflection angles are within max_error of the exact deflection angles
+        at every coordinate of the grid, refining the interpolation grid around the centre where the error is largest.
+
+        If the error is still above max_error once the spacing reaches min_pixel_scale, or once refining it would
+        give more interpolation points than the grid has, the interpolator with the smallest maximum error is
+        returned and its max_error attribute gives its error.
+
+        Parameters
+        ----------
+        grid : ndarray
+            The (y,x) coordinates deflection angles are interpolated to, shape (points, 2).
+        deflections_func : callable
+            A function which returns the (y,x) deflection angles of an ndarray of (y,x) coordinates of shape
+            (points, 2), e.g. the function of a mass profile given by 'deflections_func_from_mass_profile'.
+        max_error : float
+            The target maximum error of the interpolated deflection angles, in arc-seconds.
+        centre : (float, float)
+            The (y,x) centre of the mass profile, around which the interpolation grid is refined.
+        pixel_scale : float
+            The spacing of the interpolation grid far from the centre.
+        min_pixel_scale : float
+            The minimum spacing of the interpolation grid.
+        inner_radius : float
+            Points within this radius of the centre are not checked against max_error, e.g. because the deflection
+            angles of a cuspy mass profile are discontinuous at its centre, where no spacing meets it.
+        """
+
+        grid = np.asarray(grid, dtype="float64")
+
+        true_deflections = np.asarray(deflections_func(grid))
+
+        radii = np.hypot(grid[:, 0] - centre[0], grid[:, 1] - centre[1])
+
+        max_levels = int(np.floor(np.log2(pixel_scale / min_pixel_scale)))
+
+        refinement_radii = ()
+
+        best_interpolator = None
+
+        while True:
+
+            interpolator = AutomaticInterpolator(
+                grid=grid,
+                pixel_scale=pixel_scale,
+                centre=centre,
+                refinement_radii=refinement_radii,
+            )
+
+            errors = deflection_errors_from(
+                deflections=interpolator.deflections_from_func(
+                    deflections_func=deflections_func
+                ),
+                true_deflections=true_deflections,
+            )
+
+            errors[radii < inner_radius] = 0.0
+
+            interpolator.max_error = np.max(errors)
+
+            if (
+                best_interpolator is None
+                or interpolator.max_error < best_interpolator.max_error
+            ):
+                best_interpolator = interpolator
+
+            if interpolator.max_error <= max_error:
+                return interpolator
+
+            # The number of times the spacing is halved around every point.
+
+            levels = np.sum(
+                radii[:, None] <= np.asarray(refinement_radii)[None, :], axis=1
+            )
+
+            # If refining every point to meet max_error at once gives more interpolation points than the grid, the
+            # points are refined to meet a looser error (4 times larger, i.e. one halving less, at a time), such that
+            # the points with the largest errors are refined first. Refinement stops once no error below the current
+            # maximum error can be met with fewer interpolation points than the grid.
+
+            target_error = max_error
+
+            while target_error < interpolator.max_error:
+
+                required_levels = levels + np.ceil(
+                    0.5 * np.log2(np.maximum(errors, target_error) / target_error)
+                ).astype("int")
+
+                new_refinement_radii = refinement_radii_from(
+                    radii=radii,
+                    levels=np.minimum(required_levels, max_levels),
+                    refinement_radii=refinement_radii,
+                    pixel_scale=pixel_scale,
+                )
+
+                if (
+                    new_refinement_radii != refinement_radii
+                    and interp_grid_from(
+                        grid=grid,
+                        pixel_scale=pixel_scale,
+                        centre=centre,
+                        refinement_radii=new_refinement_radii,
+                    ).shape[0]
+                    <= grid.shape[0]
+                ):
+                    break
+
+                target_error *= 4.0
+
+            else:
+                return best_interpolator
+
+            refinement_radii = new_refinement_radii
+
+    @property
+    def interp_points(self):
+        return self.interp_grid.shape[0]
+
+    def interpolated_values_from_values(self, values):
+        """Interpolate values on the interpolation grid to the grid."""
+        return self.interpolation_matrix.dot(values)
+
+    def deflections_from_func(self, deflections_func):
+        """The (y,x) deflection angles of the grid, interpolated from the deflection angles of the interpolation
+        grid returned by the input function."""
+
+        return self.interpolated_values_from_values(
+            values=np.asarray(deflections_func(self.interp_grid))
+        )
+
+
+def pixel_scale_interpolation_grid_from(
+    grid,
+    deflections_func,
+    max_error,
+    pixel_scale=0.2,
+    min_pixel_scale=0.005,
+    centre=(0.0, 0.0),
+    inner_radius=0.0,
+):
+    """The largest uniform interpolation spacing, from pixel_scale halved until min_pixel_scale, whose interpolated
+    deflection angles are within max_error of the exact deflection angles at every coordinate of the grid.
+
+    This can be passed as the 'pixel_scale_interpolation_grid' of a phase, whose library interpolator also linearly
+    interpolates deflection angles over a uniform grid. None (no interpolation) is returned if no spacing meets
+    max_error before the interpolation grid has more points than the grid.
+
+    Points within inner_radius of the centre are not checked against max_error, as for
+    'AutomaticInterpolator.from_deflections_func'.
+    """
+
+    grid = np.asarray(grid, dtype="float64")
+
+    true_deflections = np.asarray(deflections_func(grid))
+
+    is_checked = (
+        np.hypot(grid[:, 0] - centre[0], grid[:, 1] - centre[1]) >= inner_radius
+    )
+
+    while pixel_scale >= min_pixel_scale:
+
+        if (
+            uniform_interp_grid_from(grid=grid, pixel_scale=pixel_scale).shape[0]
+            > grid.shape[0]
+        ):
+            return None
+
+        interpolator = AutomaticInterpolator(grid=grid, pixel_scale=pixel_scale)
+
+        errors = deflection_errors_from(
+            deflections=interpolator.deflections_from_func(
+                deflections_func=deflections_func
+            ),
+            true_deflections=true_deflections,
+        )
+
+        if np.max(errors[is_checked], initial=0.0) <= max_error:
+            return pixel_scale
+
+        pixel_scale /= 2.0
+
+    return None
@@ -5,6 +5,8 @@ import numpy as np
 
 import os
 
+from tools.interpolation import interpolator as automatic_interpolator
+
 # Setup the path to the autolens_workspace, using a relative directory name.
 workspace_path = "{}/../".format(os.path.dirname(os.path.realpath(__file__)))
 
@@ -102,3 +104,39 @@ difference_x_2d = masked_imaging.grid.array_stored_1d_from_sub_array_1d(
 
 aplt.array(array=difference_y_2d)
 aplt.array(array=difference_x_2d)
+
+# Instead of choosing the interpolation pixel scale by hand, the automatic interpolator halves it (around the mass
+# profile's centre, where its deflection angles are steepest) until the interpolated deflection angles are within a
+# target maximum error. The isothermal's deflection angles are discontinuous at its centre, thus points within 0.1" of
+# it are not checked.
+
+max_error = 0.001
+
+automatic = automatic_interpolator.AutomaticInterpolator.from_deflections_func(
+    grid=masked_imaging.grid,
+    deflections_func=automatic_interpolator.deflections_func_from_mass_profile(
+        mass_profile=mass_profile, pixel_scales=imaging.pixel_scales
+    ),
+    max_error=max_error,
+    centre=mass_profile.centre,
+    inner_radius=0.1,
+)
+
+print()
+print("target max error: ", max_error)
+print("automatic interpolation pixel scale: ", automatic.pixel_scale)
+print("automatic refinement radii: ", automatic.refinement_radii)
+print("Number of automatic interpolation points = " + str(automatic.interp_points))
+print("automatic interpolation max error: ", automatic.max_error)
+print(
+    "uniform interpolation pixel scale: ",
+    automatic_interpolator.pixel_scale_interpolation_grid_from(
+        grid=masked_imaging.grid,
+        deflections_func=automatic_interpolator.deflections_func_from_mass_profile(
+            mass_profile=mass_profile, pixel_scales=imaging.pixel_scales
+        ),
+        max_error=max_error,
+        centre=mass_profile.centre,
+        inner_radius=0.1,
+    ),
+)
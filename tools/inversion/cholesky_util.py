@@ -0,0 +1,185 @@
+"""
+Solve for the reconstruction of an inversion and compute the log determinant terms of its Bayesian evidence from a
+single Cholesky factorization of the curvature + regularization matrix.
+
+The reconstruction s solves (F + H) s = D, and the evidence requires log|F + H| and log|H|. Solving with
+np.linalg.solve and computing each log determinant separately performs three O(N^3) factorizations of source-pixel
+sized matrices. Factoring F + H once via Cholesky gives both the solve (two triangular solves) and its log
+determinant (2 x the sum of the log of the factor's diagonal). The regularization matrix H is sparse and for a
+rectangular pixelization banded, so its log determinant is computed via a banded Cholesky or sparse LU factorization
+where possible.
+
+For interferometer data the real and imaginary visibilities are each regularized, thus the reconstruction solves
+(F + 2H) s = D (as in autoarray's InversionInterferometer), where the evidence uses log|F + 2H|, log|H| and s^T H s.
+"""
+
+import numpy as np
+from scipy import linalg
+from scipy import sparse
+from scipy.sparse import linalg as sparse_linalg
+
+from tools.inversion import regularization_util
+
+
+def cholesky_factor_from(matrix):
+    """The lower-triangular Cholesky factor of a symmetric positive definite matrix, in the form used by
+    scipy.linalg.cho_solve. A LinAlgError is raised if the matrix is not positive definite, as it is for
+    np.linalg.cholesky."""
+    return linalg.cho_factor(matrix, lower=True, check_finite=False)
+
+
+def reconstruction_from_cholesky_factor(cholesky_factor, data_vector):
+    return linalg.cho_solve(cholesky_factor, data_vector, check_finite=False)
+
+
+def log_determinant_from_cholesky_factor(cholesky_factor):
+    return 2.0 * np.sum(np.log(np.diag(cholesky_factor[0])))
+
+
+def bandwidth_from(matrix):
+    """The largest distance from the diagonal of a non-zero entry of a square matrix."""
+
+    if sparse.issparse(matrix):
+        matrix = matrix.tocoo()
+        rows, columns = matrix.row, matrix.col
+    else:
+        rows, columns = np.nonzero(matrix)
+
+    if rows.shape[0] == 0:
+        return 0
+
+    return int(np.max(np.abs(rows - columns)))
+
+
+def log_determinant_via_banded_cholesky_from(matrix, bandwidth):
+    """The log determinant of a symmetric positive definite banded matrix, via a banded Cholesky factorization which
+    is O(N x bandwidth^2) as opposed to O(N^3)."""
+
+    pixels = matrix.shape[0]
+
+    banded_matrix = np.zeros(shape=(bandwidth + 1, pixels))
+
+    if sparse.issparse(matrix):
+        matrix = matrix.tocoo()
+        matrix.sum_duplicates()
+        upper = matrix.col >= matrix.row
+        banded_matrix[
+            bandwidth + matrix.row[upper] - matrix.col[upper], matrix.col[upper]
+        ] = matrix.data[upper]
+    else:
+        for offset in range(bandwidth + 1):
+            banded_matrix[bandwidth - offset, offset:] = np.diag(matrix, k=offset)
+
+    cholesky_banded = linalg.cholesky_banded(
+        banded_matrix, lower=False, check_finite=False
+    )
+
+    return 2.0 * np.sum(np.log(cholesky_banded[bandwidth]))
+
+
+def log_determinant_via_sparse_lu_from(matrix):
+    """The log determinant of a sparse symmetric positive definite matrix, via a fill-reducing sparse LU
+    factorization."""
+
+    lu = sparse_linalg.splu(sparse.csc_matrix(matrix))
+
+    return np.sum(np.log(np.abs(lu.U.diagonal())))
+
+
+def log_determinant_of_regularization_matrix_from(
+    regularization_matrix, max_bandwidth_fraction=0.1
+):
+    """The log determinant of a regularization matrix, computed via a banded Cholesky factorization if its bandwidth is
+    small compared to its size (e.g. a rectangular pixelization), via a sparse LU factorization if it is a scipy
+    sparse matrix and via a dense Cholesky factorization otherwise."""
+
+    pixels = regularization_matrix.shape[0]
+
+    bandwidth = bandwidth_from(matrix=regularization_matrix)
+
+    if bandwidth <= max_bandwidth_fraction * pixels:
+        return log_determinant_via_banded_cholesky_from(
+            matrix=regularization_matrix, bandwidth=bandwidth
+        )
+
+    if sparse.issparse(regularization_matrix):
+        return log_determinant_via_sparse_lu_from(matrix=regularization_matrix)
+
+    return log_determinant_from_cholesky_factor(
+        cholesky_factor=cholesky_factor_from(matrix=regularization_matrix)
+    )
+
+
+class CholeskyInversion(object):
+    def __init__(
+        self,
+        curvature_matrix,
+        regularization_matrix,
+        data_vector,
+        regularization_multiplicity=1,
+    ):
+        """The reconstruction and evidence terms of an inversion, computed from one Cholesky factorization of its
+        curvature + regularization matrix.
+
+        Parameters
+        ----------
+        curvature_matrix : ndarray
+            The curvature matrix F of the inversion.
+        regularization_matrix : ndarray or scipy.sparse matrix
+            The regularization matrix H of the inversion.
+        data_vector : ndarray
+            The data vector D of the inversion.
+        regularization_multiplicity : int
+            The number of components of the data which are each regularized by H, such that the curvature +
+            regularization matrix is F + regularization_multiplicity x H (1 for imaging, 2 for the real and imaginary
+            visibilities of an interferometer).
+        """
+        self.regularization_matrix = regularization_matrix
+        self.regularization_multiplicity = regularization_multiplicity
+
+        if sparse.issparse(regularization_matrix):
+            curvature_reg_matrix = regularization_util.curvature_reg_matrix_from(
+                curvature_matrix=curvature_matrix,
+                regularization_matrix=regularization_multiplicity
+                * regularization_matrix,
+            )
+        else:
+            curvature_reg_matrix = (
+                curvature_matrix + regularization_multiplicity * regularization_matrix
+            )
+
+        self.cholesky_factor = cholesky_factor_from(matrix=curvature_reg_matrix)
+
+        self.reconstruction = reconstruction_from_cholesky_factor(
+            cholesky_factor=self.cholesky_factor, data_vector=data_vector
+        )
+
+    @property
+    def regularization_term(self):
+        """The regularization term s^T H s of the evidence."""
+        return np.dot(
+            self.reconstruction, self.regularization_matrix.dot(self.reconstruction)
+        )
+
+    @property
+    def log_det_curvature_reg_matrix_term(self):
+        return log_determinant_from_cholesky_factor(
+            cholesky_factor=self.cholesky_factor
+        )
+
+    @property
+    def log_det_regularization_matrix_term(self):
+        return log_determinant_of_regularization_matrix_from(
+            regularization_matrix=self.regularization_matrix
+        )
+
+    def log_evidence_from(self, chi_squared, noise_normalization):
+        """The Bayesian log evidence of the inversion, given the chi-squared of its fit and the noise normalization of
+        the data (see Suyu et al. 2006)."""
+        return -0.5 * (
+            chi_squared
+            + self.regularization_term
+            + self.log_det_curvature_reg_matrix_term
+            - self.log_det_regularization_matrix_term
+            + noise_normalization
+        )
@@ -0,0 +1,419 @@
+"""
+Fit an inversion to a lens model whose mass model is fixed, reusing everything upstream of the regularization.
+
+In phases where the lens mass is fixed (e.g. a mass model passed as 'af.last.instance', as in the
+'phase_1__source_inversion_magnification_initialization' phases of the advanced source inversion pipelines) only the
+pixelization and regularization parameters vary. Every likelihood evaluation nevertheless re-traces the grid,
+rebuilds the mapper, blurs (or Fourier transforms) the mapping matrix and recomputes the curvature matrix F and data
+vector D, even though these depend only on the fixed mass model, the pixelization and the data.
+
+This tool memoises:
+
+- The traced grid of the source-plane, keyed on the mass model.
+- The mapper, blurred / transformed mapping matrices, F and D, keyed on the mass model, pixelization and data.
+
+Each evaluation then only computes the regularization matrix (rescaling a cached unit matrix for constant
+regularization), one Cholesky factorization of F + H (F + 2H for an interferometer, whose real and imaginary
+visibilities are each regularized as in the library) and the evidence. The keys are computed from the values of the
+mass profiles and pixelization, so a varying mass model is still fitted correctly but never hits the cache.
+"""
+
+import autolens as al
+import numpy as np
+
+import collections
+import hashlib
+import inspect
+
+from tools.inversion import cholesky_util
+from tools.inversion import regularization_util
+
+
+def key_from_value(value):
+    """A hashable key of a parameter value, where arrays (e.g. hyper-images) are keyed on a hash of their data."""
+
+    if isinstance(value, np.ndarray):
+        return hashlib.sha1(np.ascontiguousarray(value).tobytes()).hexdigest()
+
+    return repr(value)
+
+
+def parameter_names_from(obj):
+    """The names of the constructor parameters of an object, or None if it does not store every one of them as an
+    attribute of the same name."""
+
+    try:
+        parameters = inspect.signature(type(obj).__init__).parameters
+    except (TypeError, ValueError):
+        return None
+
+    names = [
+        name
+        for name, parameter in parameters.items()
+        if name != "self"
+        and parameter.kind
+        not in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD)
+    ]
+
+    if all(hasattr(obj, name) for name in names):
+        return names
+
+    return None
+
+
+def key_from_object(obj):
+    """A hashable key of a mass profile, pixelization or regularization, from its class and constructor parameter
+    values.
+
+    Attributes set after construction are excluded, in particular the 'cache' dictionary autoastro's cache decorator
+    adds to a profile on its first deflections_from_grid call, which would otherwise change the key. If an object does
+    not store its constructor parameters, every attribute but 'cache' is used.
+    """
+
+    if obj is None:
+        return None
+
+    names = parameter_names_from(obj=obj)
+
+    if names is None:
+        names = [name for name in vars(obj) if name != "cache"]
+
+    return (type(obj).__name__,) + tuple(
+        (name, key_from_value(value=getattr(obj, name))) for name in sorted(names)
+    )
+
+
+def mass_key_from_tracer(tracer):
+    """A key of everything that determines how a tracer traces a grid to its source-plane, i.e. the redshifts of its
+    planes and the mass profiles of every plane in front of the source-plane."""
+
+    return tuple(
+        (
+            plane.redshift,
+            tuple(
+                tuple(key_from_object(obj=profile) for profile in galaxy.mass_profiles)
+                for galaxy in plane.galaxies
+            ),
+        )
+        for plane in tracer.planes[:-1]
+    ) + (tracer.planes[-1].redshift,)
+
+
+def source_key_from_tracer(tracer):
+    """A key of the pixelization of the source-plane and the hyper-images of its galaxies, which set its mapper."""
+
+    return (
+        key_from_object(obj=tracer.pixelizations_of_planes[-1]),
+        tuple(
+            key_from_value(value=getattr(galaxy, "hyper_galaxy_image", None))
+            for galaxy in tracer.planes[-1].galaxies
+        ),
+    )
+
+
+class InversionUpstream(object):
+    def __init__(self, mapper, mapping_matrices, curvature_matrix, data_vector):
+        """Everything of an inversion which does not depend on its regularization.
+
+        Parameters
+        ----------
+        mapper : Mapper
+            The mapper of the source-plane pixelization.
+        mapping_matrices : [ndarray]
+            The mapping matrices of each component of the data (the blurred mapping matrix of imaging, the real and
+            imaginary transformed mapping matrices of an interferometer).
+        curvature_matrix : ndarray
+            The curvature matrix F, summed over the components.
+        data_vector : ndarray
+            The data vector D, summed over the components.
+        """
+        self.mapper = mapper
+        self.mapping_matrices = mapping_matrices
+        self.curvature_matrix = curvature_matrix
+        self.data_vector = data_vector
+        self.regularization_cache = regularization_util.ConstantRegularizationCache(
+            sparse=False
+        )
+
+
+class AbstractFixedMassInversion(object):
+
+    # The number of components of the dataset which are each regularized, as in the library's inversions.
+    regularization_multiplicity = 1
+
+    def __init__(self, grid, inversion_uses_border=True, max_cached=20):
+        """Compute the log evidence of inversions fitted to a masked dataset, memoising the traced grid and
+        everything upstream of the regularization.
+
+        Parameters
+        ----------
+        grid : Grid
+            The grid of the masked dataset which is traced to the source-plane.
+        inversion_uses_border : bool
+            Whether the mapper relocates traced pixels outside the border of the mask to the border.
+        max_cached : int
+            The maximum number of mass model / pixelization combinations that are cached, where the least recently
+            used is discarded first. Each holds a curvature matrix of shape (source_pixels, source_pixels).
+        """
+        self.grid = grid
+        self.inversion_uses_border = inversion_uses_border
+        self.max_cached = max_cached
+
+        self.traced_grids = collections.OrderedDict()
+        self.upstreams = collections.OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def components_from(self, data, noise_map):
+        """The 1D data and noise-map of every component of the dataset that the inversion fits."""
+        raise NotImplementedError()
+
+    def mapping_matrices_from_mapper(self, mapper):
+        """The mapping matrices of every component of the dataset, e.g. the PSF blurred mapping matrix."""
+        raise NotImplementedError()
+
+    def curvature_matrix_from(self, mapping_matrix, noise_map):
+        """The curvature matrix F of one component of the dataset."""
+        raise NotImplementedError()
+
+    def data_vector_from(self, mapping_matrix, data, noise_map):
+        """The data vector D of one component of the dataset."""
+        raise NotImplementedError()
+
+    @staticmethod
+    def memoised(cache, key, func, max_size):
+
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+        cache[key] = func()
+
+        if len(cache) > max_size:
+            cache.popitem(last=False)
+
+        return cache[key]
+
+    def traced_grid_from_tracer(self, tracer, mass_key):
+        return self.memoised(
+            cache=self.traced_grids,
+            key=mass_key,
+            func=lambda: tracer.traced_grids_of_planes_from_grid(grid=self.grid)[-1],
+            max_size=self.max_cached,
+        )
+
+    def upstream_from_tracer(self, tracer, data, noise_map):
+
+        mass_key = mass_key_from_tracer(tracer=tracer)
+
+        key = (
+            mass_key,
+            source_key_from_tracer(tracer=tracer),
+            key_from_value(value=np.asarray(data)),
+            key_from_value(value=np.asarray(noise_map)),
+        )
+
+        if key in self.upstreams:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        def upstream():
+
+            # The mapper is built by the source-plane so that it is passed the hyper-image of the galaxy with the
+            # pixelization, which adaptive regularization schemes use.
+
+            mapper = tracer.planes[-1].mapper_from_grid_and_sparse_grid(
+                grid=self.traced_grid_from_tracer(tracer=tracer, mass_key=mass_key),
+                sparse_grid=tracer.traced_sparse_grids_of_planes_from_grid(
+                    grid=self.grid
+                )[-1],
+                inversion_uses_border=self.inversion_uses_border,
+            )
+
+            mapping_matrices = self.mapping_matrices_from_mapper(mapper=mapper)
+
+            curvature_matrix = np.zeros(shape=(mapper.pixels, mapper.pixels))
+            data_vector = np.zeros(shape=mapper.pixels)
+
+            for mapping_matrix, (component_data, component_noise_map) in zip(
+                mapping_matrices, self.components_from(data=data, noise_map=noise_map)
+            ):
+                curvature_matrix += self.curvature_matrix_from(
+                    mapping_matrix=mapping_matrix, noise_map=component_noise_map
+                )
+                data_vector += self.data_vector_from(
+                    mapping_matrix=mapping_matrix,
+                    data=component_data,
+                    noise_map=component_noise_map,
+                )
+
+            return InversionUpstream(
+                mapper=mapper,
+                mapping_matrices=mapping_matrices,
+                curvature_matrix=curvature_matrix,
+                data_vector=data_vector,
+            )
+
+        return self.memoised(
+            cache=self.upstreams, key=key, func=upstream, max_size=self.max_cached
+        )
+
+    @staticmethod
+    def regularization_matrix_from(regularization, upstream):
+
+        if isinstance(regularization, al.reg.Constant):
+            return upstream.regularization_cache.regularization_matrix_from_mapper(
+                coefficient=regularization.coefficient, mapper=upstream.mapper
+            )
+
+        return regularization.regularization_matrix_from_mapper(mapper=upstream.mapper)
+
+    def inversion_from_tracer(self, tracer, data, noise_map):
+        """The Cholesky inversion of the tracer's source-plane pixelization and regularization, and the upstream
+        quantities it was computed from."""
+
+        upstream = self.upstream_from_tracer(
+            tracer=tracer, data=data, noise_map=noise_map
+        )
+
+        regularization_matrix = self.regularization_matrix_from(
+            regularization=tracer.regularizations_of_planes[-1], upstream=upstream
+        )
+
+        inversion = cholesky_util.CholeskyInversion(
+            curvature_matrix=upstream.curvature_matrix,
+            regularization_matrix=regularization_matrix,
+            data_vector=upstream.data_vector,
+            regularization_multiplicity=self.regularization_multiplicity,
+        )
+
+        return inversion, upstream
+
+    def log_evidence_from_tracer(self, tracer, data, noise_map):
+        """The Bayesian log evidence of the inversion of a tracer fitted to the input data, which for imaging with a
+        (fixed) lens light model is the lens light subtracted image."""
+
+        inversion, upstream = self.inversion_from_tracer(
+            tracer=tracer, data=data, noise_map=noise_map
+        )
+
+        chi_squared = 0.0
+        noise_normalization = 0.0
+
+        for mapping_matrix, (component_data, component_noise_map) in zip(
+            upstream.mapping_matrices,
+            self.components_from(data=data, noise_map=noise_map),
+        ):
+            mapped_reconstructed_data = np.dot(mapping_matrix, inversion.reconstruction)
+
+            chi_squared += np.sum(
+                ((component_data - mapped_reconstructed_data) / component_noise_map)
+                ** 2.0
+            )
+            noise_normalization += np.sum(np.log(2 * np.pi * component_noise_map**2.0))
+
+        return inversion.log_evidence_from(
+            chi_squared=chi_squared, noise_normalization=noise_normalization
+        )
+
+
+class FixedMassInversionImaging(AbstractFixedMassInversion):
+    def __init__(self, masked_imaging, inversion_uses_border=True, max_cached=20):
+        """Memoise the inversions of a masked imaging dataset, blurring mapping matrices with its convolver."""
+
+        super(FixedMassInversionImaging, self).__init__(
+            grid=masked_imaging.grid,
+            inversion_uses_border=inversion_uses_border,
+            max_cached=max_cached,
+        )
+
+        self.masked_imaging = masked_imaging
+
+    def components_from(self, data, noise_map):
+        return [(np.asarray(data), np.asarray(noise_map))]
+
+    def mapping_matrices_from_mapper(self, mapper):
+        return [
+            self.masked_imaging.convolver.convolve_mapping_matrix(
+                mapping_matrix=mapper.mapping_matrix
+            )
+        ]
+
+    def curvature_matrix_from(self, mapping_matrix, noise_map):
+        return al.util.inversion.curvature_matrix_from_blurred_mapping_matrix(
+            blurred_mapping_matrix=mapping_matrix, noise_map=noise_map
+        )
+
+    def data_vector_from(self, mapping_matrix, data, noise_map):
+        return al.util.inversion.data_vector_from_blurred_mapping_matrix_and_data(
+            blurred_mapping_matrix=mapping_matrix, image=data, noise_map=noise_map
+        )
+
+    def log_evidence_from_tracer(self, tracer, data=None, noise_map=None):
+
+        data = self.masked_imaging.image if data is None else data
+        noise_map = self.masked_imaging.noise_map if noise_map is None else noise_map
+
+        return super(FixedMassInversionImaging, self).log_evidence_from_tracer(
+            tracer=tracer, data=data, noise_map=noise_map
+        )
+
+
+class FixedMassInversionInterferometer(AbstractFixedMassInversion):
+
+    # autoarray's InversionInterferometer adds H to the curvature matrix of both the real and imaginary visibilities.
+    regularization_multiplicity = 2
+
+    def __init__(
+        self, masked_interferometer, inversion_uses_border=True, max_cached=20
+    ):
+        """Memoise the inversions of a masked interferometer dataset, whose real and imaginary visibilities are
+        separate components with their own transformed mapping matrices."""
+
+        super(FixedMassInversionInterferometer, self).__init__(
+            grid=masked_interferometer.grid,
+            inversion_uses_border=inversion_uses_border,
+            max_cached=max_cached,
+        )
+
+        self.masked_interferometer = masked_interferometer
+
+    def components_from(self, data, noise_map):
+
+        data = np.asarray(data)
+        noise_map = np.asarray(noise_map)
+
+        return [(data[:, 0], noise_map[:, 0]), (data[:, 1], noise_map[:, 1])]
+
+    def mapping_matrices_from_mapper(self, mapper):
+        return self.masked_interferometer.transformer.transformed_mapping_matrices_from_mapping_matrix(
+            mapping_matrix=mapper.mapping_matrix
+        )
+
+    def curvature_matrix_from(self, mapping_matrix, noise_map):
+
+        # The blurred mapping matrix functions skip non-positive entries, which transformed mapping matrices have.
+
+        return al.util.inversion.curvature_matrix_from_transformed_mapping_matrix(
+            transformed_mapping_matrix=mapping_matrix, noise_map=noise_map
+        )
+
+    def data_vector_from(self, mapping_matrix, data, noise_map):
+        return al.util.inversion.data_vector_from_transformed_mapping_matrix_and_data(
+            transformed_mapping_matrix=mapping_matrix,
+            visibilities=data,
+            noise_map=noise_map,
+        )
+
+    def log_evidence_from_tracer(self, tracer, data=None, noise_map=None):
+
+        data = self.masked_interferometer.visibilities if data is None else data
+        noise_map = (
+            self.masked_interferometer.noise_map if noise_map is None else noise_map
+        )
+
+        return super(FixedMassInversionInterferometer, self).log_evidence_from_tracer(
+            tracer=tracer, data=data, noise_map=noise_map
+        )
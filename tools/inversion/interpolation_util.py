@@ -0,0 +1,188 @@
+"""
+Interpolated mappings between the traced sub-pixels of an inversion and its source pixels.
+
+Rectangular and Voronoi mappers pair every traced sub-pixel wholly with the one source pixel it lands in, thus the
+mapping matrix changes discontinuously as the lens model moves sub-pixels across pixel boundaries. A large sub_size
+(e.g. 4) is needed to keep the resulting discretisation noise in the likelihood small.
+
+An interpolated mapping instead distributes every traced sub-pixel over the source pixels around it, with weights
+that vary smoothly with its position:
+
+- 'bilinear': the 4 rectangular pixel centres around the sub-pixel, with bilinear weights.
+- 'barycentric': the 3 Voronoi pixel centres of the Delaunay triangle enclosing the sub-pixel, with barycentric
+  weights. Sub-pixels outside the hull of the centres are paired with their nearest centre.
+
+The mapping matrix then varies continuously with the lens model, so a smaller sub_size (e.g. 1 or 2) gives the same
+likelihood smoothness on a 4-16x smaller grid. The mappings are returned as the (image pixel, source pixel, weight)
+triplets of 'tools/inversion/sparse_util.py'.
+"""
+
+import numpy as np
+from scipy import spatial
+
+from tools.inversion import sparse_util
+from tools.pixelization import mapper_util
+
+
+def image_indexes_and_sub_weights_from(sub_pixels, sub_size, vertices):
+    """The image pixel index and sub-pixel weight of every entry of an interpolated mapping, where every sub-pixel
+    has 'vertices' entries."""
+
+    image_indexes = np.repeat(np.arange(sub_pixels) // sub_size**2, vertices)
+    sub_weights = np.full(fill_value=1.0 / sub_size**2, shape=sub_pixels * vertices)
+
+    return image_indexes, sub_weights
+
+
+def bilinear_mapping_triplets_from(grid, shape_2d, pixel_scales, origin, sub_size):
+    """The (image pixel, source pixel, weight) triplets of a bilinear interpolated mapping to a rectangular
+    pixelization, whose pixels are indexed in row-major order from the top-left (highest y, lowest x) pixel.
+
+    Sub-pixels beyond the centres of the edge pixels use the weights of the nearest point on the edge.
+
+    Parameters
+    ----------
+    grid : ndarray
+        The (y,x) coordinates of the traced sub-pixels, shape (sub_pixels, 2).
+    shape_2d : (int, int)
+        The number of rows and columns of the rectangular pixelization.
+    pixel_scales : (float, float)
+        The (y,x) size of every rectangular pixel.
+    origin : (float, float)
+        The (y,x) centre of the rectangular pixelization.
+    sub_size : int
+        The sub-size of the grid.
+    """
+
+    grid = np.asarray(grid, dtype="float64")
+
+    rows = (origin[0] - grid[:, 0]) / pixel_scales[0] + 0.5 * shape_2d[0] - 0.5
+    columns = (grid[:, 1] - origin[1]) / pixel_scales[1] + 0.5 * shape_2d[1] - 0.5
+
+    rows = np.clip(rows, 0.0, shape_2d[0] - 1.0)
+    columns = np.clip(columns, 0.0, shape_2d[1] - 1.0)
+
+    rows_0 = np.minimum(np.floor(rows).astype("int"), max(shape_2d[0] - 2, 0))
+    columns_0 = np.minimum(np.floor(columns).astype("int"), max(shape_2d[1] - 2, 0))
+
+    row_fractions = rows - rows_0
+    column_fractions = columns - columns_0
+
+    rows_1 = np.minimum(rows_0 + 1, shape_2d[0] - 1)
+    columns_1 = np.minimum(columns_0 + 1, shape_2d[1] - 1)
+
+    pix_indexes = np.stack(
+        (
+            rows_0 * shape_2d[1] + columns_0,
+            rows_0 * shape_2d[1] + columns_1,
+            rows_1 * shape_2d[1] + columns_0,
+            rows_1 * shape_2d[1] + columns_1,
+        ),
+        axis=1,
+    )
+
+    weights = np.stack(
+        (
+            (1.0 - row_fractions) * (1.0 - column_fractions),
+            (1.0 - row_fractions) * column_fractions,
+            row_fractions * (1.0 - column_fractions),
+            row_fractions * column_fractions,
+        ),
+        axis=1,
+    )
+
+    image_indexes, sub_weights = image_indexes_and_sub_weights_from(
+        sub_pixels=grid.shape[0], sub_size=sub_size, vertices=4
+    )
+
+    return image_indexes, pix_indexes.ravel(), sub_weights * weights.ravel()
+
+
+def barycentric_mapping_triplets_from(grid, pixelization_grid, sub_size):
+    """The (image pixel, source pixel, weight) triplets of a barycentric interpolated mapping to a Voronoi
+    pixelization, over the Delaunay triangle of pixel centres enclosing every traced sub-pixel.
+
+    Parameters
+    ----------
+    grid : ndarray
+        The (y,x) coordinates of the traced sub-pixels, shape (sub_pixels, 2).
+    pixelization_grid : ndarray
+        The (y,x) coordinates of the Voronoi pixel centres, shape (pixels, 2).
+    sub_size : int
+        The sub-size of the grid.
+    """
+
+    grid = np.asarray(grid, dtype="float64")
+    pixelization_grid = np.asarray(pixelization_grid, dtype="float64")
+
+    delaunay = spatial.Delaunay(pixelization_grid)
+
+    simplex_indexes = delaunay.find_simplex(grid)
+    outside = simplex_indexes < 0
+    simplex_indexes[outside] = 0
+
+    transforms = delaunay.transform[simplex_indexes]
+
+    barycentric = np.einsum(
+        "ijk,ik->ij", transforms[:, :2, :], grid - transforms[:, 2, :]
+    )
+
+    pix_indexes = delaunay.simplices[simplex_indexes]
+    weights = np.concatenate(
+        (barycentric, 1.0 - np.sum(barycentric, axis=1, keepdims=True)), axis=1
+    )
+
+    if np.any(outside):
+
+        pix_indexes[outside] = (
+            mapper_util.pixelization_1d_index_for_sub_mask_1d_index_via_kdtree_from(
+                grid=grid[outside], pixelization_grid=pixelization_grid
+            )[:, None]
+        )
+        weights[outside] = np.array([1.0, 0.0, 0.0])
+
+    image_indexes, sub_weights = image_indexes_and_sub_weights_from(
+        sub_pixels=grid.shape[0], sub_size=sub_size, vertices=3
+    )
+
+    return image_indexes, pix_indexes.ravel(), sub_weights * weights.ravel()
+
+
+def interpolated_sparse_mapping_matrix_from_mapper(mapper, method):
+    """The sparse (CSR) interpolated mapping matrix of a mapper, using the 'bilinear' method for a rectangular mapper
+    and the 'barycentric' method for a Voronoi mapper.
+
+    This can be used in place of 'sparse_util.sparse_mapping_matrix_from_mapper', e.g. to compute the sparse blurred
+    mapping matrix, data vector and curvature matrix of the inversion.
+    """
+
+    sub_size = mapper.grid.sub_size
+
+    if method == "bilinear":
+        image_indexes, pix_indexes, weights = bilinear_mapping_triplets_from(
+            grid=mapper.grid,
+            shape_2d=mapper.pixelization_grid.shape_2d,
+            pixel_scales=mapper.pixelization_grid.pixel_scales,
+            origin=mapper.pixelization_grid.origin,
+            sub_size=sub_size,
+        )
+    elif method == "barycentric":
+        image_indexes, pix_indexes, weights = barycentric_mapping_triplets_from(
+            grid=mapper.grid,
+            pixelization_grid=mapper.pixelization_grid,
+            sub_size=sub_size,
+        )
+    else:
+        raise ValueError(
+            "The interpolation method {} is not 'bilinear' or 'barycentric'".format(
+                method
+            )
+        )
+
+    return sparse_util.sparse_mapping_matrix_from(
+        image_indexes=image_indexes,
+        pix_indexes=pix_indexes,
+        weights=weights,
+        image_pixels=mapper.grid.shape[0] // sub_size**2,
+        pixels=mapper.pixels,
+    )
@@ -0,0 +1,148 @@
+"""
+Evaluate the Bayesian evidence of an inversion with constant regularization for many regularization coefficients at
+once, reusing its curvature matrix and data vector.
+
+For constant regularization H = c^2 L + eps I, where L is the unit regularization matrix and eps = 1e-8. Writing
+F_eps = F + eps I, a single generalized eigendecomposition L V = F_eps V Lambda (with V^T F_eps V = I) diagonalizes
+F + H = F_eps + c^2 L for every coefficient c. With b = V^T D every term of the evidence is then O(source_pixels) per
+coefficient:
+
+- chi^2 + s^T H s = d^T W d - sum_i b_i^2 / (1 + c^2 lambda_i), where d^T W d is the chi-squared of a zero model.
+- log|F + H| = log|F_eps| + sum_i log(1 + c^2 lambda_i).
+- log|H| = sum_i log(c^2 mu_i + eps), where mu_i are the eigenvalues of L.
+
+This makes scans of the evidence over the coefficient (e.g. 'howtolens/chapter_4_inversions/scripts/
+tutorial_4_bayesian_regularization.py') and phases where only the coefficient varies nearly free once F and D are
+computed.
+"""
+
+import numpy as np
+from scipy import linalg
+
+from tools.inversion import regularization_util
+
+
+class RegularizationScan(object):
+    def __init__(
+        self,
+        curvature_matrix,
+        unit_regularization_matrix,
+        data_vector,
+        data_chi_squared,
+        diagonal_term=1e-8,
+    ):
+        """The Bayesian evidence of an inversion as a function of its constant regularization coefficient.
+
+        Parameters
+        ----------
+        curvature_matrix : ndarray
+            The curvature matrix F of the inversion.
+        unit_regularization_matrix : ndarray or scipy.sparse matrix
+            The constant regularization matrix for a coefficient of 1 without its diagonal term, L.
+        data_vector : ndarray
+            The data vector D of the inversion.
+        data_chi_squared : float
+            The chi-squared of a model of zeros, sum((data / noise_map) ** 2.0).
+        diagonal_term : float
+            The term added to the diagonal of the regularization matrix.
+        """
+
+        if hasattr(unit_regularization_matrix, "toarray"):
+            unit_regularization_matrix = unit_regularization_matrix.toarray()
+
+        self.data_chi_squared = data_chi_squared
+        self.diagonal_term = diagonal_term
+
+        curvature_matrix_diagonal = curvature_matrix + diagonal_term * np.eye(
+            curvature_matrix.shape[0]
+        )
+
+        self.log_det_curvature_matrix_diagonal = 2.0 * np.sum(
+            np.log(np.diag(linalg.cholesky(curvature_matrix_diagonal, lower=True)))
+        )
+
+        self.eigenvalues, self.eigenvectors = linalg.eigh(
+            unit_regularization_matrix, curvature_matrix_diagonal
+        )
+        self.eigenvalues = np.maximum(self.eigenvalues, 0.0)
+
+        # The unit regularization matrix has zero eigenvalues (e.g. a constant source), which are set to exactly zero
+        # so that their round-off error is not amplified by large coefficients in log|H|.
+
+        self.regularization_eigenvalues = linalg.eigvalsh(unit_regularization_matrix)
+        self.regularization_eigenvalues[
+            self.regularization_eigenvalues
+            < unit_regularization_matrix.shape[0]
+            * np.finfo("float64").eps
+            * np.max(np.abs(self.regularization_eigenvalues))
+        ] = 0.0
+
+        self.projected_data_vector = np.dot(self.eigenvectors.T, data_vector)
+
+    @classmethod
+    def from_mapper(cls, curvature_matrix, data_vector, mapper, data_chi_squared):
+        """Compute the scan of an inversion whose unit regularization matrix is computed from its mapper's
+        pixelization grid."""
+
+        pattern = regularization_util.RegularizationPattern.from_pixelization_grid(
+            pixelization_grid=mapper.pixelization_grid
+        )
+
+        return cls(
+            curvature_matrix=curvature_matrix,
+            unit_regularization_matrix=pattern.constant_regularization_matrix_from(
+                coefficient=1.0, diagonal_term=0.0
+            ),
+            data_vector=data_vector,
+            data_chi_squared=data_chi_squared,
+        )
+
+    def reconstruction_from(self, coefficient):
+        return np.dot(
+            self.eigenvectors,
+            self.projected_data_vector / (1.0 + coefficient**2.0 * self.eigenvalues),
+        )
+
+    def log_evidences_from(self, coefficients, noise_normalization):
+        """The Bayesian log evidence of the inversion for every input regularization coefficient, which match the
+        evidence of 'tools/inversion/cholesky_util.CholeskyInversion' for each coefficient.
+        """
+
+        regularization_coefficients = (
+            np.asarray(coefficients, dtype="float64")[:, None] ** 2.0
+        )
+
+        curvature_reg_eigenvalues = 1.0 + regularization_coefficients * self.eigenvalues
+
+        chi_squared_and_regularization_term = self.data_chi_squared - np.sum(
+            self.projected_data_vector**2.0 / curvature_reg_eigenvalues, axis=1
+        )
+
+        log_det_curvature_reg_matrix_term = (
+            self.log_det_curvature_matrix_diagonal
+            + np.sum(np.log(curvature_reg_eigenvalues), axis=1)
+        )
+
+        log_det_regularization_matrix_term = np.sum(
+            np.log(
+                regularization_coefficients * self.regularization_eigenvalues
+                + self.diagonal_term
+            ),
+            axis=1,
+        )
+
+        return -0.5 * (
+            chi_squared_and_regularization_term
+            + log_det_curvature_reg_matrix_term
+            - log_det_regularization_matrix_term
+            + noise_normalization
+        )
+
+    def max_log_evidence_coefficient_from(self, coefficients, noise_normalization):
+        """The coefficient of the input coefficients which gives the highest Bayesian log evidence."""
+
+        log_evidences = self.log_evidences_from(
+            coefficients=coefficients, noise_normalization=noise_normalization
+        )
+
+        return np.asarray(coefficients)[np.argmax(log_evidences)]
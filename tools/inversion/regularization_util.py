@@ -0,0 +1,270 @@
+"""
+Build the regularization matrix of an inversion as a scipy sparse (CSR) matrix.
+
+al.util.regularization returns the regularization matrix H as a dense (source_pixels x source_pixels) array, even
+though every row only has non-zero entries for a pixel and its ~4-8 neighbours. Its memory therefore grows
+quadratically with the number of source pixels and its construction loops over a dense array.
+
+Every entry of H is a sum of terms over the (pixel, neighbor) pairs of the pixelization grid. The positions of these
+terms in H only depend on the grid's neighbor structure, thus a 'RegularizationPattern' precomputes the CSR sparsity
+pattern of H and where every term is summed to once per pixelization grid. Each regularization matrix is then built
+from the coefficient (constant) or regularization weights (adaptive) in O(source_pixels x neighbors) operations.
+"""
+
+import numpy as np
+from scipy import sparse
+
+
+def neighbor_pairs_from(pixel_neighbors, pixel_neighbors_size):
+    """The (pixel, neighbor) index pairs of a pixelization grid, from its pixel_neighbors array (which is padded with
+    -1 entries beyond each pixel's pixel_neighbors_size)."""
+
+    pixel_neighbors = np.asarray(pixel_neighbors, dtype="int")
+    pixel_neighbors_size = np.asarray(pixel_neighbors_size, dtype="int")
+
+    is_neighbor = (
+        np.arange(pixel_neighbors.shape[1])[None, :] < pixel_neighbors_size[:, None]
+    )
+
+    pixel_indexes = np.repeat(np.arange(pixel_neighbors.shape[0]), pixel_neighbors_size)
+
+    return pixel_indexes, pixel_neighbors[is_neighbor]
+
+
+class RegularizationPattern(object):
+    def __init__(self, pixel_neighbors, pixel_neighbors_size):
+        """The sparsity pattern of the regularization matrix of a pixelization grid, computed once from the grid's
+        neighbor structure and reused for every regularization matrix of that grid.
+
+        The terms of the regularization matrix are ordered as:
+
+        - A term on the diagonal of every pixel.
+        - For every (pixel, neighbor) pair, terms at [pixel, pixel], [neighbor, neighbor], [pixel, neighbor] and
+          [neighbor, pixel].
+
+        Parameters
+        ----------
+        pixel_neighbors : ndarray
+            The indexes of the neighbors of every pixel, padded with -1 entries.
+        pixel_neighbors_size : ndarray
+            The number of neighbors of every pixel.
+        """
+        self.pixels = np.asarray(pixel_neighbors_size).shape[0]
+
+        self.pixel_indexes, self.neighbor_indexes = neighbor_pairs_from(
+            pixel_neighbors=pixel_neighbors, pixel_neighbors_size=pixel_neighbors_size
+        )
+
+        diagonal = np.arange(self.pixels)
+
+        rows = np.concatenate(
+            (
+                diagonal,
+                self.pixel_indexes,
+                self.neighbor_indexes,
+                self.pixel_indexes,
+                self.neighbor_indexes,
+            )
+        )
+        columns = np.concatenate(
+            (
+                diagonal,
+                self.pixel_indexes,
+                self.neighbor_indexes,
+                self.neighbor_indexes,
+                self.pixel_indexes,
+            )
+        )
+
+        unique_entries, self.term_indexes = np.unique(
+            rows * self.pixels + columns, return_inverse=True
+        )
+        self.term_indexes = self.term_indexes.reshape(-1)
+
+        self.rows = unique_entries // self.pixels
+        self.columns = unique_entries % self.pixels
+        self.indptr = np.searchsorted(self.rows, np.arange(self.pixels + 1))
+        self.diagonal_entries = np.searchsorted(
+            unique_entries, diagonal * self.pixels + diagonal
+        )
+
+    @classmethod
+    def from_pixelization_grid(cls, pixelization_grid):
+        return RegularizationPattern(
+            pixel_neighbors=pixelization_grid.pixel_neighbors,
+            pixel_neighbors_size=pixelization_grid.pixel_neighbors_size,
+        )
+
+    @property
+    def nnz(self):
+        return self.rows.shape[0]
+
+    def regularization_matrix_from_terms(self, terms):
+        """The sparse (CSR) regularization matrix whose entries are the sums of the input terms, ordered as
+        described in the class docstring."""
+
+        data = np.bincount(self.term_indexes, weights=terms, minlength=self.nnz)
+
+        return sparse.csr_matrix(
+            (data, self.columns, self.indptr), shape=(self.pixels, self.pixels)
+        )
+
+    def constant_regularization_matrix_from(self, coefficient, diagonal_term=1e-8):
+        """The sparse constant regularization matrix, which matches
+        al.util.regularization.constant_regularization_matrix_from_pixel_neighbors for the default diagonal_term, the
+        small value added to the diagonal to make the matrix positive definite."""
+
+        regularization_coefficient = coefficient**2.0
+
+        pairs = self.pixel_indexes.shape[0]
+
+        terms = np.concatenate(
+            (
+                np.full(fill_value=diagonal_term, shape=self.pixels),
+                np.full(fill_value=regularization_coefficient, shape=pairs),
+                np.zeros(shape=pairs),
+                np.full(fill_value=-regularization_coefficient, shape=pairs),
+                np.zeros(shape=pairs),
+            )
+        )
+
+        return self.regularization_matrix_from_terms(terms=terms)
+
+    def adaptive_regularization_matrix_from(self, regularization_weights):
+        """The sparse adaptive regularization matrix, which matches
+        al.util.regularization.weighted_regularization_matrix_from_pixel_neighbors, where every neighbor term is the
+        square of the neighbor's regularization weight."""
+
+        neighbor_weights = (
+            np.asarray(regularization_weights)[self.neighbor_indexes] ** 2.0
+        )
+
+        terms = np.concatenate(
+            (
+                np.full(fill_value=1e-8, shape=self.pixels),
+                neighbor_weights,
+                neighbor_weights,
+                -neighbor_weights,
+                -neighbor_weights,
+            )
+        )
+
+        return self.regularization_matrix_from_terms(terms=terms)
+
+
+def curvature_reg_matrix_from(curvature_matrix, regularization_matrix):
+    """Add a sparse regularization matrix to a dense curvature matrix, updating only the non-zero entries of the
+    regularization matrix as opposed to densifying it."""
+
+    regularization_matrix = regularization_matrix.tocoo()
+    regularization_matrix.sum_duplicates()
+
+    curvature_reg_matrix = np.array(curvature_matrix, dtype="float64")
+    curvature_reg_matrix[
+        regularization_matrix.row, regularization_matrix.col
+    ] += regularization_matrix.data
+
+    return curvature_reg_matrix
+
+
+class ConstantRegularizationCache(object):
+    def __init__(self, sparse=True):
+        """Compute constant regularization matrices, reusing the coefficient-independent part of the matrix for as
+        long as the neighbor structure of the pixelization grid is unchanged.
+
+        The constant regularization matrix is H = coefficient^2 x L + 1e-8 x I, where the 'unit' regularization
+        matrix L only depends on pixel_neighbors and pixel_neighbors_size. When the source pixelization grid is fixed
+        (e.g. the lens mass model is fixed and only the regularization coefficient is varied) L is computed once and
+        every later call only rescales it.
+
+        Parameters
+        ----------
+        sparse : bool
+            If True the regularization matrices are scipy sparse (CSR) matrices, else they are dense arrays.
+        """
+        self.sparse = sparse
+
+        self.pixel_neighbors = None
+        self.pixel_neighbors_size = None
+        self.pattern = None
+        self.unit_regularization_matrix = None
+
+    def is_cached(self, pixel_neighbors, pixel_neighbors_size):
+        """Whether the input neighbor structure is the one the cached unit regularization matrix was computed from."""
+
+        if self.pixel_neighbors is None:
+            return False
+
+        if (
+            pixel_neighbors is self.pixel_neighbors
+            and pixel_neighbors_size is self.pixel_neighbors_size
+        ):
+            return True
+
+        return np.array_equal(pixel_neighbors, self.pixel_neighbors) and np.array_equal(
+            pixel_neighbors_size, self.pixel_neighbors_size
+        )
+
+    def unit_regularization_matrix_from(self, pixel_neighbors, pixel_neighbors_size):
+
+        if not self.is_cached(
+            pixel_neighbors=pixel_neighbors, pixel_neighbors_size=pixel_neighbors_size
+        ):
+
+            self.pattern = RegularizationPattern(
+                pixel_neighbors=pixel_neighbors,
+                pixel_neighbors_size=pixel_neighbors_size,
+            )
+
+            unit_regularization_matrix = (
+                self.pattern.constant_regularization_matrix_from(
+                    coefficient=1.0, diagonal_term=0.0
+                )
+            )
+
+            if not self.sparse:
+                unit_regularization_matrix = unit_regularization_matrix.toarray()
+
+            self.unit_regularization_matrix = unit_regularization_matrix
+            self.pixel_neighbors = np.array(pixel_neighbors)
+            self.pixel_neighbors_size = np.array(pixel_neighbors_size)
+
+        return self.unit_regularization_matrix
+
+    def constant_regularization_matrix_from(
+        self, coefficient, pixel_neighbors, pixel_neighbors_size
+    ):
+        """The constant regularization matrix of the input coefficient and neighbor structure, which matches
+        al.util.regularization.constant_regularization_matrix_from_pixel_neighbors."""
+
+        unit_regularization_matrix = self.unit_regularization_matrix_from(
+            pixel_neighbors=pixel_neighbors, pixel_neighbors_size=pixel_neighbors_size
+        )
+
+        regularization_coefficient = coefficient**2.0
+
+        if self.sparse:
+
+            data = regularization_coefficient * unit_regularization_matrix.data
+            data[self.pattern.diagonal_entries] += 1e-8
+
+            return sparse.csr_matrix(
+                (
+                    data,
+                    unit_regularization_matrix.indices,
+                    unit_regularization_matrix.indptr,
+                ),
+                shape=unit_regularization_matrix.shape,
+            )
+
+        regularization_matrix = regularization_coefficient * unit_regularization_matrix
+        regularization_matrix[np.diag_indices_from(regularization_matrix)] += 1e-8
+
+        return regularization_matrix
+
+    def regularization_matrix_from_mapper(self, coefficient, mapper):
+        return self.constant_regularization_matrix_from(
+            coefficient=coefficient,
+            pixel_neighbors=mapper.pixelization_grid.pixel_neighbors,
+            pixel_neighbors_size=mapper.pixelization_grid.pixel_neighbors_size,
+        )
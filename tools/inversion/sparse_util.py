@@ -0,0 +1,161 @@
+"""
+Sparse representations of the mapping matrix, PSF blurring and blurred mapping matrix of an imaging inversion.
+
+Every sub-pixel of the mask maps to one (e.g. rectangular, Voronoi) or a few (interpolated) source pixels, thus the
+mapping matrix of shape (image_pixels, source_pixels) is almost entirely zeros, as is its PSF-blurred counterpart for
+a compact PSF. Storing them as scipy sparse (CSR) matrices, and blurring with a sparse matrix operator built once per
+mask and PSF, means the memory and run-time of the blurred mapping matrix, data vector and curvature matrix scale
+with the number of non-zero entries as opposed to image_pixels x source_pixels.
+
+Every mapping is described as triplets of (image pixel index, source pixel index, weight), which are summed when an
+image pixel and source pixel pair appear more than once (e.g. multiple sub-pixels of one image pixel mapping to the
+same source pixel).
+"""
+
+import numpy as np
+from scipy import sparse
+
+
+def mapping_triplets_from(pixelization_1d_index_for_sub_mask_1d_index, sub_size):
+    """The (image pixel, source pixel, weight) triplets of a mapper, where every sub-pixel maps to one source pixel
+    with weight 1 / sub_size**2.
+
+    Parameters
+    ----------
+    pixelization_1d_index_for_sub_mask_1d_index : ndarray
+        The source pixel index every sub-pixel of the mask maps to, where the sub-pixels of each image pixel are
+        contiguous.
+    sub_size : int
+        The sub-size of the grid the mapper is computed from.
+    """
+    pix_indexes = np.asarray(pixelization_1d_index_for_sub_mask_1d_index, dtype="int")
+
+    image_indexes = np.arange(pix_indexes.shape[0]) // sub_size**2
+    weights = np.full(
+        fill_value=1.0 / sub_size**2, shape=pix_indexes.shape[0], dtype="float64"
+    )
+
+    return image_indexes, pix_indexes, weights
+
+
+def sparse_mapping_matrix_from(
+    image_indexes, pix_indexes, weights, image_pixels, pixels
+):
+    """The sparse (CSR) mapping matrix of shape (image_pixels, source_pixels) from a mapper's triplets, where the
+    weights of repeated (image pixel, source pixel) pairs are summed."""
+    return sparse.csr_matrix(
+        (weights, (image_indexes, pix_indexes)), shape=(image_pixels, pixels)
+    )
+
+
+def sparse_mapping_matrix_from_mapper(mapper):
+    """The sparse mapping matrix of a mapper, using its sub-pixel to source pixel mappings."""
+
+    sub_size = mapper.grid.sub_size
+
+    image_indexes, pix_indexes, weights = mapping_triplets_from(
+        pixelization_1d_index_for_sub_mask_1d_index=mapper.pixelization_1d_index_for_sub_mask_1d_index,
+        sub_size=sub_size,
+    )
+
+    return sparse_mapping_matrix_from(
+        image_indexes=image_indexes,
+        pix_indexes=pix_indexes,
+        weights=weights,
+        image_pixels=image_indexes.shape[0] // sub_size**2,
+        pixels=mapper.pixels,
+    )
+
+
+def sparse_blurring_matrix_from(mask, kernel):
+    """The sparse (CSR) matrix of shape (image_pixels, image_pixels) which convolves a 1D image of the unmasked
+    pixels of a mask with a PSF kernel, where only light blurred into unmasked pixels is kept. This matches how a
+    convolver blurs a mapping matrix.
+
+    Entry [i, j] is the fraction of the light of unmasked pixel j that the kernel blurs into unmasked pixel i.
+
+    Parameters
+    ----------
+    mask : ndarray
+        The 2D mask, where True entries are masked and unmasked pixels are indexed in row-major order.
+    kernel : ndarray
+        The 2D PSF kernel, whose central pixel is at index (shape[0] // 2, shape[1] // 2).
+    """
+    mask = np.asarray(mask, dtype="bool")
+    kernel = np.asarray(kernel, dtype="float64")
+
+    image_1d_indexes = np.full(fill_value=-1, shape=mask.shape, dtype="int")
+    unmasked_y, unmasked_x = np.nonzero(~mask)
+    image_1d_indexes[unmasked_y, unmasked_x] = np.arange(unmasked_y.shape[0])
+
+    rows = []
+    columns = []
+    values = []
+
+    kernel_centre_y = kernel.shape[0] // 2
+    kernel_centre_x = kernel.shape[1] // 2
+
+    for kernel_y, kernel_x in zip(*np.nonzero(kernel)):
+
+        target_y = unmasked_y + kernel_y - kernel_centre_y
+        target_x = unmasked_x + kernel_x - kernel_centre_x
+
+        inside = (
+            (target_y >= 0)
+            & (target_y < mask.shape[0])
+            & (target_x >= 0)
+            & (target_x < mask.shape[1])
+        )
+
+        target_1d_indexes = np.full(
+            fill_value=-1, shape=unmasked_y.shape[0], dtype="int"
+        )
+        target_1d_indexes[inside] = image_1d_indexes[target_y[inside], target_x[inside]]
+
+        keep = target_1d_indexes >= 0
+
+        rows.append(target_1d_indexes[keep])
+        columns.append(np.nonzero(keep)[0])
+        values.append(
+            np.full(fill_value=kernel[kernel_y, kernel_x], shape=np.sum(keep))
+        )
+
+    image_pixels = unmasked_y.shape[0]
+
+    return sparse.csr_matrix(
+        (np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+        shape=(image_pixels, image_pixels),
+    )
+
+
+def sparse_blurred_mapping_matrix_from(blurring_matrix, mapping_matrix):
+    return (blurring_matrix @ mapping_matrix).tocsr()
+
+
+def data_vector_from_sparse_blurred_mapping_matrix_and_data(
+    blurred_mapping_matrix, image, noise_map
+):
+    """Compute the data vector D of an inversion from its sparse blurred mapping matrix, the 1D image and noise-map
+    (see Warren & Dye 2003)."""
+    return blurred_mapping_matrix.T.dot(
+        np.asarray(image) / np.asarray(noise_map) ** 2.0
+    )
+
+
+def curvature_matrix_from_sparse_blurred_mapping_matrix(
+    blurred_mapping_matrix, noise_map
+):
+    """Compute the (dense) curvature matrix F of an inversion from its sparse blurred mapping matrix and the 1D
+    noise-map (see Warren & Dye 2003)."""
+
+    weighted_mapping_matrix = sparse.diags(1.0 / np.asarray(noise_map)).dot(
+        blurred_mapping_matrix
+    )
+
+    return weighted_mapping_matrix.T.dot(weighted_mapping_matrix).toarray()
+
+
+def mapped_reconstructed_image_from_sparse_blurred_mapping_matrix(
+    blurred_mapping_matrix, reconstruction
+):
+    return blurred_mapping_matrix.dot(reconstruction)
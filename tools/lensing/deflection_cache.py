@@ -0,0 +1,121 @@
+"""
+Ray-trace grids through a tracer, memoising the deflection angles of every mass profile on every grid.
+
+Many phases fix part of the mass model as an instance (e.g. the lens mass of the 'source/inversion/from_parametric'
+pipelines and the lens of the subhalo pipelines, via 'af.last.instance.galaxies.lens'), yet every likelihood evaluation
+recomputes the deflection angles of these fixed profiles in 'tracer.traced_grids_of_planes_from_grid'. For profiles
+whose deflection angles require numerical integration (e.g. power-laws, NFWs) this dominates the run-time.
+
+'DeflectionCache' keys the deflection angles of every mass profile on its class and parameter values and on the data
+of the grid it is evaluated on, keeping the most recently used entries. Tracing a grid through a tracer whose lens is
+fixed and whose subhalo varies therefore only computes the subhalo's deflection angles (and those of any profile in a
+plane behind it, whose grids change with the subhalo).
+
+Profiles are keyed on their constructor parameters (see 'fixed_mass.key_from_object'), thus the deflection angles the
+library caches on a profile after its first evaluation do not change its key.
+"""
+
+import autolens as al
+import numpy as np
+
+import collections
+
+from tools.inversion import fixed_mass
+
+
+class DeflectionCache(object):
+    def __init__(self, max_cached=100):
+        """Memoise the deflection angles of mass profiles on grids.
+
+        Parameters
+        ----------
+        max_cached : int
+            The maximum number of (mass profile, grid) deflection angles that are cached, where the least recently
+            used is discarded first. Each holds an array of shape (sub_pixels, 2).
+        """
+        self.max_cached = max_cached
+
+        self.deflections = collections.OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def grid_key_from(grid):
+        """A key of the coordinates of a grid, such that (traced) grids with the same coordinates share a key."""
+        return np.shape(grid), fixed_mass.key_from_value(value=np.asarray(grid))
+
+    def deflections_from_mass_profile_and_grid(self, mass_profile, grid, grid_key=None):
+        """The deflection angles of a mass profile on a grid, computed if they are not in the cache.
+
+        The cached array is returned read-only, as it is shared by every evaluation with the same key.
+        """
+
+        grid_key = self.grid_key_from(grid=grid) if grid_key is None else grid_key
+
+        key = (fixed_mass.key_from_object(obj=mass_profile), grid_key)
+
+        if key in self.deflections:
+            self.hits += 1
+            self.deflections.move_to_end(key)
+            return self.deflections[key]
+
+        self.misses += 1
+
+        deflections = mass_profile.deflections_from_grid(grid=grid)
+        deflections.setflags(write=False)
+
+        self.deflections[key] = deflections
+
+        if len(self.deflections) > self.max_cached:
+            self.deflections.popitem(last=False)
+
+        return deflections
+
+    def deflections_from_plane_and_grid(self, plane, grid):
+        """The summed deflection angles of every mass profile of every galaxy in a plane."""
+
+        grid_key = self.grid_key_from(grid=grid)
+
+        deflections = np.zeros(shape=np.shape(grid))
+
+        for galaxy in plane.galaxies:
+            for mass_profile in galaxy.mass_profiles:
+                deflections += self.deflections_from_mass_profile_and_grid(
+                    mass_profile=mass_profile, grid=grid, grid_key=grid_key
+                )
+
+        return deflections
+
+    def traced_grids_of_planes_from_tracer_and_grid(self, tracer, grid):
+        """The grid traced to every plane of a tracer, as 'tracer.traced_grids_of_planes_from_grid', using the cached
+        deflection angles of every mass profile."""
+
+        plane_redshifts = [plane.redshift for plane in tracer.planes]
+
+        traced_grids = []
+        traced_deflections = []
+
+        for plane_index, plane in enumerate(tracer.planes):
+
+            traced_grid = grid.copy()
+
+            for previous_plane_index in range(plane_index):
+
+                scaling_factor = al.util.cosmology.scaling_factor_between_redshifts_from_redshifts_and_cosmology(
+                    redshift_0=plane_redshifts[previous_plane_index],
+                    redshift_1=plane.redshift,
+                    redshift_final=plane_redshifts[-1],
+                    cosmology=tracer.cosmology,
+                )
+
+                traced_grid -= scaling_factor * traced_deflections[previous_plane_index]
+
+            traced_grids.append(traced_grid)
+
+            if plane_index < len(tracer.planes) - 1:
+                traced_deflections.append(
+                    self.deflections_from_plane_and_grid(plane=plane, grid=traced_grid)
+                )
+
+        return traced_grids
@@ -0,0 +1,269 @@
+"""
+Faster alternatives to the weighted KMeans clustering of a VoronoiBrightnessImage pixelization.
+
+A VoronoiBrightnessImage pixelization computes its image-plane sparse grid by running a weighted KMeans on the masked
+grid, with weights computed from the hyper-galaxy image. This is performed on every likelihood evaluation and
+dominates the run-time of brightness-adaptive phases for high resolution (e.g. hst) data. This module provides
+alternative clustering engines:
+
+- 'kmeans': the weighted KMeans of the library (sklearn.cluster.KMeans).
+- 'mini_batch': a weighted mini-batch KMeans (sklearn.cluster.MiniBatchKMeans), which can be warm-started from the
+  centres of the previous call.
+- 'stratified': a deterministic weighted stratified sampling of the masked grid, which requires no iteration.
+
+Each engine is seed-stable, in that a fixed seed gives the same sparse grid for the same inputs, unless mini-batch
+warm-starting is used (in which case the result also depends on the previous call). The sparse grid is cached and
+reused whilst the hyper-image, grid and weight parameters of the pixelization are unchanged between calls.
+
+The sparse grid is returned as the library's GridIrregular (as 'VoronoiBrightnessImage.sparse_grid_from_grid'), thus it
+can be passed to a tracer as a preloaded sparse grid (see 'SparseGridClustering.sparse_grids_of_planes_from_tracer'),
+which traces it to the source-plane to build the mapper of a fit.
+"""
+
+import autolens as al
+import numpy as np
+from scipy import spatial
+from sklearn import cluster
+
+import hashlib
+
+
+def grid_1d_from(grid):
+    """The 1D (y,x) coordinates of the image-pixel centres of a (sub-)grid, which the clustering is performed on."""
+
+    if hasattr(grid, "in_1d_binned"):
+        grid = grid.in_1d_binned
+
+    return np.asarray(grid, dtype="float64")
+
+
+def inclusion_probabilities_from(weight_map, total_pixels):
+    """The probability every pixel is included in a weighted sample of 'total_pixels' pixels without replacement,
+    which is proportional to its weight and at most 1 (pixels whose weights exceed this are included with certainty
+    and the probabilities of the remaining pixels rescaled)."""
+
+    weight_map = np.asarray(weight_map, dtype="float64")
+
+    probabilities = np.zeros(shape=weight_map.shape[0])
+    certain = np.full(fill_value=False, shape=weight_map.shape[0])
+
+    while True:
+
+        remaining_pixels = total_pixels - np.sum(certain)
+        remaining_weights = np.sum(weight_map[~certain])
+
+        probabilities[~certain] = (
+            remaining_pixels * weight_map[~certain] / remaining_weights
+        )
+        probabilities[certain] = 1.0
+
+        exceeds = probabilities > 1.0
+
+        if not np.any(exceeds):
+            return probabilities
+
+        certain |= exceeds
+
+
+def stratified_sparse_grid_from(grid_1d, weight_map, total_pixels, seed=None):
+    """A sparse grid of 'total_pixels' image pixels, sampled with probability proportional to their weights via
+    systematic sampling along the (row-major) ordering of the masked grid.
+
+    The cumulative inclusion probabilities are split into 'total_pixels' strata of width 1 and the pixel at the same
+    offset within every stratum is selected, which spreads the sparse pixels across the mask with a density that
+    follows the weight map. The offset is 0.5 if seed is None, else drawn from the seed.
+
+    Returns the sparse grid and the index of the sparse pixel nearest every pixel of the grid.
+    """
+
+    if total_pixels > grid_1d.shape[0]:
+        raise ValueError(
+            "The number of sparse pixels ({}) exceeds the number of pixels in the mask ({})".format(
+                total_pixels, grid_1d.shape[0]
+            )
+        )
+
+    probabilities = inclusion_probabilities_from(
+        weight_map=weight_map, total_pixels=total_pixels
+    )
+
+    if seed is None:
+        offset = 0.5
+    else:
+        offset = np.random.RandomState(seed).uniform()
+
+    cumulative_probabilities = np.cumsum(probabilities)
+    cumulative_probabilities[-1] = total_pixels
+
+    sparse_indexes = np.searchsorted(
+        cumulative_probabilities, np.arange(total_pixels) + offset, side="right"
+    )
+
+    sparse_grid = grid_1d[sparse_indexes]
+
+    _, sparse_1d_index_for_mask_1d_index = spatial.cKDTree(sparse_grid).query(grid_1d)
+
+    return sparse_grid, sparse_1d_index_for_mask_1d_index
+
+
+class SparseGridClustering(object):
+    def __init__(
+        self,
+        pixelization,
+        method="mini_batch",
+        seed=1,
+        warm_start=True,
+        batch_size=1024,
+        max_iter=10,
+    ):
+        """Compute the sparse grid of a VoronoiBrightnessImage pixelization using a faster clustering engine, caching
+        it whilst the inputs are unchanged.
+
+        Parameters
+        ----------
+        pixelization : al.pix.VoronoiBrightnessImage
+            The pixelization whose number of pixels and weight map (via 'weight_map_from_hyper_image') are used. Its
+            parameters may be changed between calls (e.g. by a non-linear search).
+        method : str
+            The clustering engine, 'kmeans', 'mini_batch' or 'stratified'.
+        seed : int or None
+            The random seed of the clustering.
+        warm_start : bool
+            If True, mini-batch KMeans starts from the centres of the previous call when they have the same number of
+            pixels. Set to False for results which only depend on the seed.
+        batch_size : int
+            The number of grid pixels in each mini-batch.
+        max_iter : int
+            The maximum number of iterations of the KMeans engines.
+        """
+
+        if method not in ["kmeans", "mini_batch", "stratified"]:
+            raise ValueError(
+                "The clustering method {} is not 'kmeans', 'mini_batch' or 'stratified'".format(
+                    method
+                )
+            )
+
+        self.pixelization = pixelization
+        self.method = method
+        self.seed = seed
+        self.warm_start = warm_start
+        self.batch_size = batch_size
+        self.max_iter = max_iter
+
+        self.key = None
+        self.sparse_grid = None
+
+    def key_from(self, grid_1d, hyper_image):
+        return (
+            self.pixelization.pixels,
+            getattr(self.pixelization, "weight_floor", None),
+            getattr(self.pixelization, "weight_power", None),
+            hashlib.sha1(grid_1d.tobytes()).hexdigest(),
+            hashlib.sha1(
+                np.ascontiguousarray(hyper_image, dtype="float64").tobytes()
+            ).hexdigest(),
+        )
+
+    def centres_and_labels_from(self, grid_1d, weight_map):
+
+        total_pixels = self.pixelization.pixels
+
+        if self.method == "stratified":
+            return stratified_sparse_grid_from(
+                grid_1d=grid_1d,
+                weight_map=weight_map,
+                total_pixels=total_pixels,
+                seed=self.seed,
+            )
+
+        if self.method == "kmeans":
+            kmeans = cluster.KMeans(
+                n_clusters=total_pixels,
+                random_state=self.seed,
+                n_init=1,
+                max_iter=self.max_iter,
+            )
+        else:
+
+            init = "k-means++"
+
+            if (
+                self.warm_start
+                and self.sparse_grid is not None
+                and self.sparse_grid.shape[0] == total_pixels
+            ):
+                init = np.asarray(self.sparse_grid)
+
+            kmeans = cluster.MiniBatchKMeans(
+                n_clusters=total_pixels,
+                init=init,
+                n_init=1,
+                random_state=self.seed,
+                batch_size=self.batch_size,
+                max_iter=self.max_iter,
+            )
+
+        kmeans.fit(X=grid_1d, sample_weight=weight_map)
+
+        return kmeans.cluster_centers_, kmeans.labels_.astype("int")
+
+    def sparse_grid_from_grid(self, grid, hyper_image):
+        """The sparse grid of the pixelization for the input grid and hyper-image, which is only recomputed if they
+        or the parameters of the pixelization have changed since the previous call.
+
+        As for the library's pixelizations, this is a GridIrregular of the sparse pixels whose
+        'nearest_pixelization_1d_index_for_mask_1d_index' pairs every pixel of the grid with its sparse pixel.
+        """
+
+        grid_1d = grid_1d_from(grid=grid)
+
+        key = self.key_from(grid_1d=grid_1d, hyper_image=hyper_image)
+
+        if key == self.key:
+            return self.sparse_grid
+
+        weight_map = self.pixelization.weight_map_from_hyper_image(
+            hyper_image=hyper_image
+        )
+
+        sparse, sparse_1d_index_for_mask_1d_index = self.centres_and_labels_from(
+            grid_1d=grid_1d, weight_map=np.asarray(weight_map)
+        )
+
+        self.key = key
+        self.sparse_grid = al.grid_irregular(
+            grid=sparse,
+            nearest_pixelization_1d_index_for_mask_1d_index=sparse_1d_index_for_mask_1d_index,
+        )
+
+        return self.sparse_grid
+
+    def sparse_grids_of_planes_from_tracer(self, tracer, grid):
+        """The image-plane sparse grid of every plane of a tracer, which is this engine's sparse grid for the plane
+        with a pixelization (using the hyper-image of its galaxy) and None for every other plane.
+
+        The engine adopts the tracer's pixelization, whose parameters are part of the cache key, thus it can be reused
+        for the new instance of every likelihood evaluation. The result is passed as the
+        'preload_sparse_grids_of_planes' of the tracer (e.g. of 'tracer.traced_sparse_grids_of_planes_from_grid' or a
+        masked dataset), such that a fit uses this engine's clustering as opposed to the pixelization's KMeans.
+        """
+
+        sparse_grids_of_planes = []
+
+        for plane in tracer.planes:
+
+            if not plane.has_pixelization:
+                sparse_grids_of_planes.append(None)
+                continue
+
+            self.pixelization = plane.pixelization
+
+            sparse_grids_of_planes.append(
+                self.sparse_grid_from_grid(
+                    grid=grid,
+                    hyper_image=plane.hyper_galaxy_image_of_galaxy_with_pixelization,
+                )
+            )
+
+        return sparse_grids_of_planes
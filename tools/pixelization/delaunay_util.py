@@ -0,0 +1,206 @@
+"""
+Compute the neighbors of the pixels of a Voronoi pixelization from a Delaunay triangulation of its pixel centres.
+
+A Voronoi pixelization computes a scipy Voronoi tessellation of its traced sparse grid on every likelihood evaluation
+and derives pixel_neighbors from its ridges. Two Voronoi pixels are neighbors if and only if their centres share an
+edge of the Delaunay triangulation, which is cheaper to compute than the Voronoi tessellation and whose neighbors are
+available in vectorised (CSR) form via 'vertex_neighbor_vertices'.
+
+Between successive samples of a non-linear search the traced pixel centres often move only slightly, in which case
+the previous triangulation is still the Delaunay triangulation of the new centres. This is checked in O(pixels) by
+testing that no triangle has flipped, the hull is still convex and every interior edge is still locally Delaunay (the
+opposite vertex of the neighboring triangle is outside every triangle's circumcircle), in which case the previous
+neighbors are reused.
+"""
+
+import numpy as np
+from scipy import spatial
+
+
+def pixel_neighbors_from_indptr_and_indices(indptr, indices):
+    """Convert the CSR neighbors of a triangulation to the pixel_neighbors and pixel_neighbors_size arrays of a
+    pixelization grid, where pixel_neighbors is padded with -1 entries."""
+
+    pixel_neighbors_size = np.diff(indptr)
+
+    pixel_neighbors = np.full(
+        fill_value=-1,
+        shape=(pixel_neighbors_size.shape[0], np.max(pixel_neighbors_size)),
+        dtype="int",
+    )
+
+    pixel_indexes = np.repeat(
+        np.arange(pixel_neighbors_size.shape[0]), pixel_neighbors_size
+    )
+
+    pixel_neighbors[
+        pixel_indexes, np.arange(indices.shape[0]) - indptr[pixel_indexes]
+    ] = indices
+
+    return pixel_neighbors, pixel_neighbors_size
+
+
+def pixel_neighbors_from_delaunay(delaunay):
+    indptr, indices = delaunay.vertex_neighbor_vertices
+    return pixel_neighbors_from_indptr_and_indices(indptr=indptr, indices=indices)
+
+
+def orientations_from(points, simplices):
+    """Twice the signed area of every triangle, which is positive for anti-clockwise triangles."""
+
+    a = points[simplices[:, 0]]
+    b = points[simplices[:, 1]]
+    c = points[simplices[:, 2]]
+
+    return (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (
+        c[:, 0] - a[:, 0]
+    )
+
+
+def incircle_from(a, b, c, d):
+    """The incircle determinant of every point d relative to the triangle (a, b, c), which is positive if d is inside
+    the circumcircle of an anti-clockwise triangle."""
+
+    ad = a - d
+    bd = b - d
+    cd = c - d
+
+    return (
+        (ad[:, 0] ** 2 + ad[:, 1] ** 2) * (bd[:, 0] * cd[:, 1] - cd[:, 0] * bd[:, 1])
+        - (bd[:, 0] ** 2 + bd[:, 1] ** 2) * (ad[:, 0] * cd[:, 1] - cd[:, 0] * ad[:, 1])
+        + (cd[:, 0] ** 2 + cd[:, 1] ** 2) * (ad[:, 0] * bd[:, 1] - bd[:, 0] * ad[:, 1])
+    )
+
+
+class Triangulation(object):
+    def __init__(self, points):
+        """The Delaunay triangulation of a set of pixel centres, its pixel neighbors and the topology (triangles,
+        triangle neighbors and hull) used to check whether it is still the Delaunay triangulation of moved centres.
+
+        Parameters
+        ----------
+        points : ndarray
+            The (y,x) pixel centres, shape (pixels, 2).
+        """
+        points = np.asarray(points, dtype="float64")
+
+        delaunay = spatial.Delaunay(points)
+
+        self.pixels = points.shape[0]
+
+        self.pixel_neighbors, self.pixel_neighbors_size = pixel_neighbors_from_delaunay(
+            delaunay=delaunay
+        )
+
+        self.simplices = delaunay.simplices
+        self.orientation_signs = np.sign(
+            orientations_from(points=points, simplices=self.simplices)
+        )
+
+        # For every interior edge, the triangle either side of it and the vertex of the second triangle opposite the
+        # edge.
+
+        simplex_indexes, edge_indexes = np.nonzero(delaunay.neighbors >= 0)
+        neighbor_simplices = delaunay.neighbors[simplex_indexes, edge_indexes]
+
+        opposite_edges = np.argmax(
+            delaunay.neighbors[neighbor_simplices] == simplex_indexes[:, None], axis=1
+        )
+
+        self.edge_simplices = simplex_indexes
+        self.edge_opposite_vertices = self.simplices[neighbor_simplices, opposite_edges]
+
+        # The hull edges, ordered anti-clockwise, such that every hull edge (start, end) is followed by the hull edge
+        # starting at 'end'.
+
+        simplex_indexes, edge_indexes = np.nonzero(delaunay.neighbors < 0)
+
+        hull_starts = self.simplices[simplex_indexes, (edge_indexes + 1) % 3]
+        hull_ends = self.simplices[simplex_indexes, (edge_indexes + 2) % 3]
+
+        clockwise = self.orientation_signs[simplex_indexes] < 0
+        hull_starts[clockwise], hull_ends[clockwise] = (
+            hull_ends[clockwise],
+            hull_starts[clockwise].copy(),
+        )
+
+        hull_next = np.full(fill_value=-1, shape=self.pixels, dtype="int")
+        hull_next[hull_starts] = hull_ends
+
+        self.hull_starts = hull_starts
+        self.hull_ends = hull_ends
+        self.hull_nexts = hull_next[hull_ends]
+
+    def is_delaunay_for(self, points):
+        """Whether this triangulation is the Delaunay triangulation of the input (moved) pixel centres."""
+
+        points = np.asarray(points, dtype="float64")
+
+        if points.shape[0] != self.pixels:
+            return False
+
+        orientations = orientations_from(points=points, simplices=self.simplices)
+
+        if np.any(orientations * self.orientation_signs <= 0.0):
+            return False
+
+        hull_turns = orientations_from(
+            points=points,
+            simplices=np.stack(
+                (self.hull_starts, self.hull_ends, self.hull_nexts), axis=1
+            ),
+        )
+
+        if np.any(hull_turns <= 0.0):
+            return False
+
+        edge_simplices = self.simplices[self.edge_simplices]
+
+        incircle = incircle_from(
+            a=points[edge_simplices[:, 0]],
+            b=points[edge_simplices[:, 1]],
+            c=points[edge_simplices[:, 2]],
+            d=points[self.edge_opposite_vertices],
+        )
+
+        return not np.any(incircle * self.orientation_signs[self.edge_simplices] > 0.0)
+
+
+class DelaunayNeighbors(object):
+    def __init__(self, reuse_topology=True):
+        """Compute the pixel neighbors of a Voronoi pixelization's centres via a Delaunay triangulation, reusing the
+        previous triangulation when it is still the Delaunay triangulation of the new centres.
+
+        Parameters
+        ----------
+        reuse_topology : bool
+            If True, the previous triangulation is reused when it is valid for the new centres.
+        """
+        self.reuse_topology = reuse_topology
+
+        self.triangulation = None
+
+        self.reused = 0
+        self.computed = 0
+
+    def triangulation_from(self, points):
+
+        if (
+            self.reuse_topology
+            and self.triangulation is not None
+            and self.triangulation.is_delaunay_for(points=points)
+        ):
+            self.reused += 1
+            return self.triangulation
+
+        self.computed += 1
+        self.triangulation = Triangulation(points=points)
+
+        return self.triangulation
+
+    def pixel_neighbors_from(self, points):
+        """The pixel_neighbors (padded with -1 entries) and pixel_neighbors_size of the input pixel centres."""
+
+        triangulation = self.triangulation_from(points=points)
+
+        return triangulation.pixel_neighbors, triangulation.pixel_neighbors_size
@@ -0,0 +1,123 @@
+"""
+Pair every traced sub-pixel with its Voronoi source pixel in one batched query.
+
+A Voronoi mapper pairs every traced sub-pixel with the Voronoi pixel it lands in, which is the pixel whose centre is
+nearest to it. The library finds it by walking from the sub-pixel's nearest sparse image pixel through the neighbors
+of the pixelization, one sub-pixel at a time. This module instead resolves all sub-pixels at once, via either:
+
+- 'kdtree': a KD-tree of the pixel centres, queried for every sub-pixel (scipy.spatial.cKDTree, which is parallelised
+  over sub-pixels).
+- 'delaunay': the point location structure of the Delaunay triangulation of the pixel centres, followed by a
+  vectorised greedy walk over the pixel neighbors from the nearest vertex of every sub-pixel's triangle. A greedy walk
+  on the Delaunay graph always terminates at the nearest centre.
+"""
+
+import numpy as np
+from scipy import spatial
+
+from tools.pixelization import delaunay_util
+
+
+def pixelization_1d_index_for_sub_mask_1d_index_via_kdtree_from(
+    grid, pixelization_grid, workers=-1
+):
+    """The index of the nearest pixelization centre to every (traced) sub-pixel, via a KD-tree.
+
+    Parameters
+    ----------
+    grid : ndarray
+        The (y,x) coordinates of the traced sub-pixels, shape (sub_pixels, 2).
+    pixelization_grid : ndarray
+        The (y,x) coordinates of the pixelization centres, shape (pixels, 2).
+    workers : int
+        The number of processes the query is parallelised over, where -1 uses all CPUs.
+    """
+
+    _, indexes = spatial.cKDTree(np.asarray(pixelization_grid)).query(
+        np.asarray(grid), workers=workers
+    )
+
+    return indexes
+
+
+def pixelization_1d_index_for_sub_mask_1d_index_via_delaunay_from(
+    grid, pixelization_grid
+):
+    """The index of the nearest pixelization centre to every (traced) sub-pixel, via Delaunay point location followed
+    by a greedy walk over the Delaunay neighbors of the pixelization."""
+
+    grid = np.asarray(grid, dtype="float64")
+    pixelization_grid = np.asarray(pixelization_grid, dtype="float64")
+
+    delaunay = spatial.Delaunay(pixelization_grid)
+
+    pixel_neighbors, pixel_neighbors_size = delaunay_util.pixel_neighbors_from_delaunay(
+        delaunay=delaunay
+    )
+
+    simplex_indexes = delaunay.find_simplex(grid)
+
+    # Sub-pixels outside the hull of the pixelization start their walk from the first vertex of the triangulation.
+
+    candidates = delaunay.simplices[np.maximum(simplex_indexes, 0)]
+    candidates[simplex_indexes < 0] = 0
+
+    distances = np.sum(
+        (pixelization_grid[candidates] - grid[:, None, :]) ** 2.0, axis=2
+    )
+
+    indexes = candidates[np.arange(grid.shape[0]), np.argmin(distances, axis=1)]
+    nearest_distances = np.min(distances, axis=1)
+
+    walking = np.arange(grid.shape[0])
+
+    while walking.shape[0] > 0:
+
+        neighbors = pixel_neighbors[indexes[walking]]
+        is_neighbor = neighbors >= 0
+
+        distances = np.sum(
+            (pixelization_grid[neighbors] - grid[walking, None, :]) ** 2.0, axis=2
+        )
+        distances[~is_neighbor] = np.inf
+
+        nearest_neighbors = np.argmin(distances, axis=1)
+        nearest_neighbor_distances = distances[
+            np.arange(walking.shape[0]), nearest_neighbors
+        ]
+
+        moved = nearest_neighbor_distances < nearest_distances[walking]
+
+        walking = walking[moved]
+        indexes[walking] = neighbors[moved, nearest_neighbors[moved]]
+        nearest_distances[walking] = nearest_neighbor_distances[moved]
+
+    return indexes
+
+
+def pixelization_1d_index_for_sub_mask_1d_index_from(
+    grid, pixelization_grid, method="kdtree"
+):
+    """The index of the Voronoi pixel every traced sub-pixel lands in, using the 'kdtree' or 'delaunay' method."""
+
+    if method == "kdtree":
+        return pixelization_1d_index_for_sub_mask_1d_index_via_kdtree_from(
+            grid=grid, pixelization_grid=pixelization_grid
+        )
+    elif method == "delaunay":
+        return pixelization_1d_index_for_sub_mask_1d_index_via_delaunay_from(
+            grid=grid, pixelization_grid=pixelization_grid
+        )
+
+    raise ValueError(
+        "The nearest pixel method {} is not 'kdtree' or 'delaunay'".format(method)
+    )
+
+
+def pixelization_1d_index_for_sub_mask_1d_index_from_mapper(mapper, method="kdtree"):
+    """The index of the Voronoi pixel every traced sub-pixel of a Voronoi mapper lands in, which matches the mapper's
+    'pixelization_1d_index_for_sub_mask_1d_index'."""
+
+    return pixelization_1d_index_for_sub_mask_1d_index_from(
+        grid=mapper.grid, pixelization_grid=mapper.pixelization_grid, method=method
+    )